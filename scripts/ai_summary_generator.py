@@ -11,15 +11,22 @@ Generic interface supporting multiple AI providers:
 Usage:
     python scripts/ai_summary_generator.py --content "blog post content" --provider openai
     python scripts/ai_summary_generator.py --file content/blog/post.md --provider local
+    python scripts/ai_summary_generator.py --batch content/blog --manifest summaries.json
 """
 
 import asyncio
 import sys
 import os
+import re
+import glob
+import time
 import json
+import fnmatch
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List
 from enum import Enum
 from dataclasses import dataclass
 try:
@@ -45,6 +52,14 @@ except ImportError as e:
     logger.error(f"Could not import AI providers: {e}")
     sys.exit(1)
 
+# Default number of summary requests in flight in batch mode
+DEFAULT_BATCH_CONCURRENCY = 8
+
+# A summary key in TOML (summary = ...) or YAML (summary: ...) front matter
+SUMMARY_FRONT_MATTER_PATTERN = re.compile(r'^summary\s*[:=]', re.MULTILINE)
+# A TOML table header ([params], [[resources]]); keys after it belong to the table
+TOML_TABLE_HEADER_PATTERN = re.compile(r'^\[')
+
 class SummaryGenerator:
     """Main summary generation orchestrator"""
     
@@ -59,17 +74,23 @@ class SummaryGenerator:
         available_providers = SummaryProviderFactory.get_available_providers(provider_configs)
         
         for provider in available_providers:
-            self.providers[provider.provider_type.value] = provider
-            logger.info(f"Initialized {provider.provider_type.value} provider")
+            self.providers[provider.get_provider_type().value] = provider
+            logger.info(f"Initialized {provider.get_provider_type().value} provider")
     
     async def generate_summary(
         self, 
         content: str, 
         provider_name: Optional[str] = None,
         style: str = "concise",
-        max_length: int = 150
+        max_length: int = 150,
+        executor: Optional[ThreadPoolExecutor] = None
     ) -> SummaryResponse:
-        """Generate summary using preferred or fallback provider"""
+        """
+        Generate summary using preferred or fallback provider
+        
+        executor runs the providers' blocking HTTP calls (default: the
+        loop's default thread pool).
+        """
         
         # Determine provider preference
         target_provider = provider_name or self.config.get_default_provider()
@@ -79,7 +100,8 @@ class SummaryGenerator:
         if target_provider in self.providers:
             logger.info(f"Trying preferred provider: {target_provider}")
             response = await self.providers[target_provider].generate_summary(
-                SummaryRequest(content=content, style=style, max_length=max_length)
+                SummaryRequest(content=content, style=style, max_length=max_length),
+                executor
             )
             if response.error is None:
                 return response
@@ -90,7 +112,8 @@ class SummaryGenerator:
             if provider_name in self.providers and provider_name != target_provider:
                 logger.info(f"Trying fallback provider: {provider_name}")
                 response = await self.providers[provider_name].generate_summary(
-                    SummaryRequest(content=content, style=style, max_length=max_length)
+                    SummaryRequest(content=content, style=style, max_length=max_length),
+                    executor
                 )
                 if response.error is None:
                     return response
@@ -104,6 +127,75 @@ class SummaryGenerator:
             error="All AI providers failed"
         )
     
+    async def generate_batch(
+        self,
+        files: List[Path],
+        provider_name: Optional[str] = None,
+        style: str = "concise",
+        max_length: int = 150,
+        concurrency: int = DEFAULT_BATCH_CONCURRENCY
+    ) -> List[dict]:
+        """
+        Summarize many posts concurrently, at most `concurrency` at a time.
+        
+        Providers are initialized once for the whole batch. Returns one entry
+        per file, in input order: file, summary, provider, model, tokens_used,
+        cost, error (None on success) and seconds.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def summarize(file_path: Path, executor: ThreadPoolExecutor) -> dict:
+            entry = {
+                "file": str(file_path),
+                "summary": None,
+                "provider": None,
+                "model": None,
+                "tokens_used": None,
+                "cost": None,
+                "error": None,
+                "seconds": 0.0
+            }
+            try:
+                content = file_path.read_text(encoding='utf-8')
+            except Exception as e:
+                entry["error"] = f"Error reading file: {e}"
+                return entry
+            if file_path.suffix == '.md':
+                content = extract_hugo_content(content)
+            
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await self.generate_summary(
+                        content=content,
+                        provider_name=provider_name,
+                        style=style,
+                        max_length=max_length,
+                        executor=executor
+                    )
+                except Exception as e:
+                    response = SummaryResponse(summary="", provider="none", model="none", error=str(e))
+                entry["seconds"] = time.perf_counter() - start
+            
+            entry.update(
+                provider=response.provider,
+                model=response.model,
+                tokens_used=response.tokens_used,
+                cost=response.cost,
+                error=response.error
+            )
+            if response.error is None:
+                entry["summary"] = response.summary
+                logger.info(f"Summarized {file_path} using {response.provider} in {entry['seconds']:.1f}s")
+            else:
+                logger.error(f"Summary generation failed for {file_path}: {response.error}")
+            return entry
+        
+        # Threads for the providers' blocking HTTP calls; the loop's default
+        # pool would cap concurrency at min(32, CPUs + 4)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return await asyncio.gather(*(summarize(file_path, executor) for file_path in files))
+    
     def get_available_providers(self) -> list:
         """Get list of available provider names"""
         return list(self.providers.keys())
@@ -147,6 +239,176 @@ async def generate_for_file(
         logger.error(f"Summary generation failed: {response.error}")
         return None
 
+def find_posts(
+    source: str,
+    exclude: Optional[List[str]] = None,
+    skip_existing: bool = False
+) -> tuple:
+    """
+    Find the posts for a batch run.
+    
+    source is a directory (searched recursively for *.md) or a glob pattern.
+    Paths matching any exclude pattern (fnmatch) are dropped, and with
+    skip_existing so are posts whose front matter already has a summary.
+    
+    Returns (posts to summarize, skipped posts)
+    """
+    if os.path.isdir(source):
+        files = sorted(Path(source).rglob('*.md'))
+    else:
+        files = sorted(Path(path) for path in glob.glob(source, recursive=True))
+    
+    files = [
+        file_path for file_path in files
+        if file_path.is_file()
+        and not any(fnmatch.fnmatch(file_path.as_posix(), pattern) for pattern in exclude or [])
+    ]
+    
+    if not skip_existing:
+        return files, []
+    
+    posts, skipped = [], []
+    for file_path in files:
+        try:
+            text = file_path.read_text(encoding='utf-8')
+        except Exception:
+            # Let the batch report the read error
+            posts.append(file_path)
+            continue
+        if SUMMARY_FRONT_MATTER_PATTERN.search(extract_front_matter(text)):
+            skipped.append(file_path)
+        else:
+            posts.append(file_path)
+    return posts, skipped
+
+async def generate_batch_manifest(
+    generator: SummaryGenerator,
+    source: str,
+    manifest_path: str,
+    provider: Optional[str] = None,
+    style: str = "concise",
+    max_length: int = 150,
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    exclude: Optional[List[str]] = None,
+    skip_existing: bool = False
+) -> dict:
+    """Summarize all posts matching source and write a single JSON manifest"""
+    posts, skipped = find_posts(source, exclude, skip_existing)
+    logger.info(f"Summarizing {len(posts)} posts from {source} ({len(skipped)} skipped, concurrency {concurrency})")
+    
+    start = time.perf_counter()
+    entries = await generator.generate_batch(posts, provider, style, max_length, concurrency)
+    elapsed = time.perf_counter() - start
+    
+    succeeded = [entry for entry in entries if entry["error"] is None]
+    slowest = max((entry["seconds"] for entry in entries), default=0.0)
+    manifest = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "source": source,
+        "style": style,
+        "max_length": max_length,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "slowest_request_seconds": slowest,
+        "totals": {
+            "posts": len(entries),
+            "succeeded": len(succeeded),
+            "failed": len(entries) - len(succeeded),
+            "skipped": len(skipped),
+            "tokens_used": sum(entry["tokens_used"] or 0 for entry in succeeded),
+            "cost": sum(entry["cost"] or 0.0 for entry in succeeded)
+        },
+        "summaries": entries,
+        "skipped": [str(file_path) for file_path in skipped]
+    }
+    
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    
+    logger.info(
+        f"Summarized {len(succeeded)}/{len(entries)} posts in {elapsed:.1f}s "
+        f"(slowest request {slowest:.1f}s, sum of requests "
+        f"{sum(entry['seconds'] for entry in entries):.1f}s); manifest: {manifest_path}"
+    )
+    return manifest
+
+def extract_front_matter(content: str) -> str:
+    """Extract the TOML (+++) or YAML (---) front matter of a Hugo markdown file"""
+    lines = content.split('\n')
+    if not lines or lines[0].strip() not in ('+++', '---'):
+        return ''
+    delimiter = lines[0].strip()
+    for i, line in enumerate(lines[1:], 1):
+        if line.strip() == delimiter:
+            return '\n'.join(lines[1:i])
+    return ''
+
+def front_matter_string(value: str) -> str:
+    """
+    Quote a value as a TOML basic string, which is also a YAML double-quoted one.
+    
+    JSON's backslash escapes (quotes, backslashes, control characters) are
+    valid in both; TOML also forbids a raw DEL character.
+    """
+    return json.dumps(value, ensure_ascii=False).replace('\x7f', '\\u007f')
+
+def add_front_matter_summary(content: str, summary: str) -> Optional[str]:
+    """
+    Add a summary key at the end of a Hugo post's top-level front matter.
+    
+    Writes summary = "..." into TOML (+++) and summary: "..." into YAML (---)
+    front matter, just before the closing delimiter, or in TOML after the
+    last top-level key so it doesn't land in a [table]. Returns the updated
+    content, or None if the post has no front matter or already has a summary.
+    """
+    lines = content.split('\n')
+    if not lines or lines[0].strip() not in ('+++', '---'):
+        return None
+    delimiter = lines[0].strip()
+    for i, line in enumerate(lines[1:], 1):
+        if line.strip() == delimiter:
+            break
+    else:
+        return None
+    if delimiter == '+++':
+        for j in range(1, i):
+            if TOML_TABLE_HEADER_PATTERN.match(lines[j]):
+                i = j
+                break
+    # Only a top-level summary counts (not e.g. one in [params])
+    if SUMMARY_FRONT_MATTER_PATTERN.search('\n'.join(lines[1:i])):
+        return None
+    
+    # Keep the blank lines that separate the keys from the first table
+    while i > 1 and not lines[i - 1].strip():
+        i -= 1
+    separator = ' = ' if delimiter == '+++' else ': '
+    value = front_matter_string(' '.join(summary.split()))
+    lines.insert(i, f"summary{separator}{value}")
+    return '\n'.join(lines)
+
+def write_front_matter_summaries(entries: List[dict]) -> int:
+    """Add each successful batch summary to its post's front matter; returns posts updated"""
+    updated = 0
+    for entry in entries:
+        if not entry["summary"]:
+            logger.error(f"No summary for {entry['file']}: {entry['error']}")
+            continue
+        file_path = Path(entry["file"])
+        try:
+            content = file_path.read_text(encoding='utf-8')
+            new_content = add_front_matter_summary(content, entry["summary"])
+            if new_content is None:
+                logger.info(f"Summary already exists or no front matter in {file_path}, left unchanged")
+                continue
+            file_path.write_text(new_content, encoding='utf-8')
+        except OSError as e:
+            logger.error(f"Could not add summary to {file_path}: {e}")
+            continue
+        logger.info(f"Added summary to {file_path}")
+        updated += 1
+    return updated
+
 def extract_hugo_content(content: str) -> str:
     """Extract main content from Hugo markdown file"""
     lines = content.split('\n')
@@ -216,6 +478,45 @@ async def main():
         help='Markdown file to summarize'
     )
     
+    parser.add_argument(
+        '--batch', '-b',
+        type=str,
+        help='Directory or glob of markdown files to summarize concurrently (writes --manifest)'
+    )
+    
+    parser.add_argument(
+        '--manifest', '-m',
+        type=str,
+        default='ai_summaries.json',
+        help='JSON manifest for --batch results (default: ai_summaries.json)'
+    )
+    
+    parser.add_argument(
+        '--concurrency', '-j',
+        type=int,
+        default=DEFAULT_BATCH_CONCURRENCY,
+        help=f'Maximum concurrent summary requests in --batch mode (default: {DEFAULT_BATCH_CONCURRENCY})'
+    )
+    
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        default=[],
+        help='Glob of files to leave out of --batch; may be repeated'
+    )
+    
+    parser.add_argument(
+        '--skip-existing',
+        action='store_true',
+        help='In --batch mode, skip posts whose front matter already has a summary'
+    )
+    
+    parser.add_argument(
+        '--write-front-matter',
+        action='store_true',
+        help='In --batch mode, also add each summary to its post\'s front matter'
+    )
+    
     parser.add_argument(
         '--provider', '-p',
         type=str,
@@ -258,6 +559,9 @@ async def main():
     
     args = parser.parse_args()
     
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    
     # Create config file if requested
     if args.create_config:
         create_sample_config()
@@ -284,6 +588,26 @@ async def main():
         print(f"Fallback order: {' → '.join(generator.config.get_fallback_order())}")
         return
     
+    # Summarize a whole directory or glob in one process
+    if args.batch:
+        manifest = await generate_batch_manifest(
+            generator,
+            args.batch,
+            args.manifest,
+            provider=args.provider,
+            style=args.style,
+            max_length=args.max_length,
+            concurrency=args.concurrency,
+            exclude=args.exclude,
+            skip_existing=args.skip_existing
+        )
+        if args.write_front_matter:
+            updated = write_front_matter_summaries(manifest["summaries"])
+            logger.info(f"Added summaries to {updated} posts")
+        if manifest["totals"]["failed"]:
+            sys.exit(1)
+        return
+    
     # Generate summary
     content = None
     source = "stdin"
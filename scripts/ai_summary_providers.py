@@ -15,8 +15,11 @@ import sys
 import os
 import json
 import logging
+from concurrent.futures import Executor
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
+from enum import Enum
+from dataclasses import dataclass
 import argparse
 
 # Configure logging
@@ -72,8 +75,17 @@ class SimpleOpenAIProvider:
             "cost_per_1k_tokens": 0.002 if "3.5" in self.model else 0.01
         }
     
-    async def generate_summary(self, request: SummaryRequest) -> SummaryResponse:
-        """Generate summary using OpenAI API"""
+    async def generate_summary(
+        self,
+        request: SummaryRequest,
+        executor: Optional[Executor] = None
+    ) -> SummaryResponse:
+        """
+        Generate summary using OpenAI API
+        
+        The blocking HTTP call runs in executor (default: the loop's default
+        thread pool).
+        """
         try:
             import urllib.request
             import urllib.parse
@@ -107,28 +119,31 @@ class SimpleOpenAIProvider:
                 headers=headers
             )
             
-            with urllib.request.urlopen(req, timeout=30) as response:
-                if response.status == 200:
-                    result = json.loads(response.read().decode('utf-8'))
-                    summary = result["choices"][0]["message"]["content"]
-                    tokens = result.get("usage", {}).get("total_tokens", 0)
-                    
-                    return SummaryResponse(
-                        summary=summary.strip(),
-                        provider="openai",
-                        model=self.model,
-                        tokens_used=tokens,
-                        cost=self._calculate_cost(tokens),
-                        metadata={"response_time": response.headers.get("x-response-time")}
-                    )
-                else:
-                    error_text = response.read().decode('utf-8')
-                    return SummaryResponse(
-                        summary="",
-                        provider="openai",
-                        model=self.model,
-                        error=f"HTTP {response.status}: {error_text}"
-                    )
+            # urllib blocks, so run it in a thread to let concurrent
+            # requests (batch mode) overlap
+            status, body, response_time = await asyncio.get_running_loop().run_in_executor(
+                executor, self._post, req
+            )
+            if status == 200:
+                result = json.loads(body)
+                summary = result["choices"][0]["message"]["content"]
+                tokens = result.get("usage", {}).get("total_tokens", 0)
+                
+                return SummaryResponse(
+                    summary=summary.strip(),
+                    provider="openai",
+                    model=self.model,
+                    tokens_used=tokens,
+                    cost=self._calculate_cost(tokens),
+                    metadata={"response_time": response_time}
+                )
+            else:
+                return SummaryResponse(
+                    summary="",
+                    provider="openai",
+                    model=self.model,
+                    error=f"HTTP {status}: {body}"
+                )
         
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
@@ -139,6 +154,18 @@ class SimpleOpenAIProvider:
                 error=str(e)
             )
     
+    @staticmethod
+    def _post(req) -> Tuple[int, str, Optional[str]]:
+        """Send a request; returns (status, body, x-response-time header)"""
+        import urllib.request
+        
+        with urllib.request.urlopen(req, timeout=30) as response:
+            return (
+                response.status,
+                response.read().decode('utf-8'),
+                response.headers.get("x-response-time")
+            )
+    
     def _build_system_prompt(self, style: str, max_length: int) -> str:
         """Build system prompt based on style and length"""
         style_prompts = {
@@ -197,7 +224,11 @@ class SimpleLocalProvider:
             "max_tokens": 4096
         }
     
-    async def generate_summary(self, request: SummaryRequest) -> SummaryResponse:
+    async def generate_summary(
+        self,
+        request: SummaryRequest,
+        executor: Optional[Executor] = None
+    ) -> SummaryResponse:
         """Placeholder for local provider"""
         return SummaryResponse(
             summary="[Local provider not implemented yet - use OpenAI]",
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Local result cache for critical CSS extraction.
+
+Extracted CSS is stored per key, where the key hashes the prepared page
+(HTML with its stylesheets inlined, or the routed page and its stylesheets),
+the viewport, the extractor version and the Chromium build. Unchanged pages are served from the cache without starting a
+browser.
+
+Entries are files in one directory; reads refresh an entry's mtime and the
+least recently used entries are evicted once the total size exceeds the cap.
+"""
+
+import os
+import hashlib
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+
+# Default size cap for the cache directory
+DEFAULT_MAX_BYTES = 64 << 20
+
+
+def default_cache_dir() -> Path:
+    """Cache directory: $CRITICAL_CSS_CACHE_DIR, else the per-user cache."""
+    if os.environ.get('CRITICAL_CSS_CACHE_DIR'):
+        return Path(os.environ['CRITICAL_CSS_CACHE_DIR'])
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'critical-css'
+
+
+class ResultCache:
+    """Content-addressed LRU cache of extracted critical CSS."""
+
+    def __init__(self, cache_dir: Path, namespace: str = "", max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir: Directory holding the cache entries
+            namespace: Mixed into every key; change it when the extraction
+                itself changes (in-page script, browser build, wait strategy)
+            max_bytes: Size cap; least recently used entries are evicted above it
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key_for(
+        self,
+        prepared_url: str,
+        viewport_width: int,
+        viewport_height: int,
+        content_digest: Optional[bytes] = None
+    ) -> Optional[str]:
+        """
+        Cache key for a prepared page at a viewport.
+
+        The page is keyed by content_digest when given (pages served by
+        serve.SiteRouter), else by the bytes of a file:// page. Returns None
+        for other URLs (and unreadable files), which are then never cached.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{self.namespace}\0{viewport_width}x{viewport_height}\0".encode('utf-8'))
+        if content_digest is not None:
+            digest.update(content_digest)
+            return digest.hexdigest()
+        parsed = urlparse(prepared_url)
+        if parsed.scheme != 'file':
+            return None
+        try:
+            digest.update(Path(parsed.path).read_bytes())
+        except OSError:
+            return None
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.css"
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """Cached CSS for a key, or None (counted as a miss)."""
+        if key is None:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            css = path.read_text(encoding='utf-8')
+            # Mark as recently used
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return css
+
+    def put(self, key: Optional[str], css: str):
+        """Store CSS under a key, then evict down to the size cap."""
+        if key is None:
+            return
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(css, encoding='utf-8')
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️  Warning: Could not write cache entry {path}: {e}")
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob('*.css'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def size(self) -> int:
+        """Total bytes currently cached."""
+        return sum(path.stat().st_size for path in self.cache_dir.glob('*.css'))
+
+    def report(self):
+        """Print hit/miss counts."""
+        print(
+            f"💾 Cache: {self.hits} hits, {self.misses} misses, {self.evictions} evicted "
+            f"({self.size() / 1024:.1f} KB of {self.max_bytes / (1 << 20):.1f} MB, {self.cache_dir})"
+        )
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Group generated pages by layout before critical CSS extraction.
+
+Each page is fingerprinted by its tag/class skeleton: the distinct
+(tag, classes) pairs of its layout elements, with digits in class names
+normalized and unclassed content tags ignored. Rendered Markdown is left
+out entirely: the body of an element with an unclassed <p> child (the
+content container) and code blocks (pre, code, Chroma's div.highlight)
+would otherwise give every post its own fingerprint, since the site
+renders code fences with pygments classes. Pages rendered by the same
+Hugo layout (custompost.html, customgallery.html, customproject.html, ...)
+share a fingerprint even though their content differs, so critical CSS
+only needs to be extracted from one representative page per cluster.
+"""
+
+import re
+import hashlib
+from pathlib import Path
+from typing import Dict, List
+
+
+TAG_PATTERN = re.compile(r'<(/?)([a-zA-Z][a-zA-Z0-9-]*)\b([^>]*)>')
+CLASS_ATTR_PATTERN = re.compile(
+    r'''\sclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.IGNORECASE
+)
+DIGITS_PATTERN = re.compile(r'\d+')
+
+# Layout elements that are part of the skeleton even without a class;
+# other unclassed tags are usually Markdown content
+STRUCTURAL_TAGS = frozenset({
+    'html', 'head', 'body', 'header', 'nav', 'main', 'article', 'section',
+    'aside', 'footer', 'form',
+})
+
+# Elements without an end tag
+VOID_TAGS = frozenset({
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'source', 'track', 'wbr',
+})
+
+# Code blocks, left out with everything inside them
+CODE_TAGS = frozenset({'pre', 'code'})
+CODE_CLASSES = frozenset({'highlight', 'chroma'})
+
+RAW_TEXT_END_PATTERNS = {
+    name: re.compile(rf'</{name}\s*>', re.IGNORECASE) for name in ('script', 'style')
+}
+
+
+def skeleton_fingerprint(html_content: str) -> str:
+    """
+    Hash of a page's tag/class skeleton.
+
+    Only which (tag, classes) combinations occur counts, not how often or
+    in what order, so list pages with a different number of items still
+    match. The element nesting is tracked so the descendants of content
+    containers and code blocks can be dropped.
+    """
+    # Open elements: [tag, skeleton entries of its descendants, is content]
+    root = [None, [], False]
+    stack = [root]
+    pos = 0
+    while True:
+        match = TAG_PATTERN.search(html_content, pos)
+        if match is None:
+            break
+        pos = match.end()
+        tag = match.group(2).lower()
+
+        if match.group(1):
+            # End tag: close up to the matching element, tolerating unclosed ones
+            for depth in range(len(stack) - 1, 0, -1):
+                if stack[depth][0] == tag:
+                    while len(stack) > depth:
+                        name, entries, is_content = stack.pop()
+                        if not is_content:
+                            stack[-1][1].extend(entries)
+                    break
+            continue
+
+        class_attr = CLASS_ATTR_PATTERN.search(match.group(3))
+        classes = []
+        if class_attr:
+            value = next(group for group in class_attr.groups() if group is not None)
+            classes = sorted({DIGITS_PATTERN.sub('#', name) for name in value.split()})
+
+        if tag in RAW_TEXT_END_PATTERNS:
+            close = RAW_TEXT_END_PATTERNS[tag].search(html_content, pos)
+            pos = close.end() if close else len(html_content)
+        elif tag in CODE_TAGS or CODE_CLASSES.intersection(classes):
+            # Skip the whole block, including the element itself
+            if tag not in VOID_TAGS and not match.group(3).rstrip().endswith('/'):
+                stack.append([tag, [], True])
+            continue
+        elif tag == 'p' and not classes:
+            # Rendered Markdown: its container's body is content
+            stack[-1][2] = stack[-1] is not root
+
+        if classes:
+            stack[-1][1].append(tag + ''.join('.' + name for name in classes))
+        elif tag in STRUCTURAL_TAGS:
+            stack[-1][1].append(tag)
+        if tag not in VOID_TAGS and tag not in RAW_TEXT_END_PATTERNS \
+                and not match.group(3).rstrip().endswith('/'):
+            stack.append([tag, [], False])
+
+    while len(stack) > 1:
+        name, entries, is_content = stack.pop()
+        if not is_content:
+            stack[-1][1].extend(entries)
+    skeleton = set(root[1])
+    return hashlib.blake2b('\n'.join(sorted(skeleton)).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def cluster_pages(site_dir: Path, pattern: str = "**/*.html") -> Dict[str, List[str]]:
+    """
+    Group a site's pages by skeleton fingerprint.
+
+    Returns:
+        Mapping of fingerprint -> site-relative page paths (sorted), largest
+        cluster first; the first page of each cluster is its representative
+    """
+    clusters = {}
+    for path in sorted(site_dir.glob(pattern)):
+        try:
+            fingerprint = skeleton_fingerprint(path.read_text(encoding='utf-8'))
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"⚠️  Warning: Could not read {path}: {e}")
+            continue
+        clusters.setdefault(fingerprint, []).append(path.relative_to(site_dir).as_posix())
+    return dict(sorted(clusters.items(), key=lambda item: -len(item[1])))
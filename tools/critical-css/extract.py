@@ -6,17 +6,33 @@ This script loads a page in headless Chromium and extracts only the CSS
 rules that apply to elements visible in the initial viewport.
 
 For file:// URLs, this script automatically inlines external stylesheets
-to work around browser CORS restrictions.
+to work around browser CORS restrictions, or, with --serve route, serves the
+site to the browser from memory (see serve.py).
 """
 
 import sys
+import json
+import time
+import asyncio
+import hashlib
 import argparse
 import tempfile
+from contextlib import asynccontextmanager, contextmanager
+from importlib import metadata
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 from urllib.parse import urlparse, urljoin
+import playwright
+from playwright.async_api import async_playwright
 from playwright.sync_api import sync_playwright
 from bs4 import BeautifulSoup
 
+from cache import DEFAULT_MAX_BYTES, ResultCache, default_cache_dir
+from clusters import cluster_pages
+from manifest import ROOT_GROUP, template_groups, write_manifest
+from merge import merge_viewport_rules
+from serve import ORIGIN, SiteRouter
+
 
 def prepare_file_url_with_inlined_styles(file_url: str) -> str:
     """
@@ -122,188 +138,488 @@ def prepare_file_url_with_inlined_styles(file_url: str) -> str:
     return temp_url
 
 
-def extract_critical_css(
-    url: str,
-    viewport_width: int = 1920,
-    viewport_height: int = 1080,
-    output_path: Path = None
-) -> str:
+def prepare_url(url: str, router: Optional[SiteRouter] = None) -> str:
     """
-    Extract critical CSS for a given URL and viewport size.
+    URL to load for a page: its routed URL when a SiteRouter serves it, else
+    the result of prepare_file_url_with_inlined_styles.
+    """
+    if router is not None:
+        routed_url = router.url_for(url)
+        if routed_url is not None:
+            return routed_url
+    return prepare_file_url_with_inlined_styles(url)
+
+
+# Viewports extracted by --multi-viewport, as (width, height)
+DESKTOP_VIEWPORT = (1920, 1080)
+MOBILE_VIEWPORT = (375, 667)
+DEFAULT_VIEWPORTS = [DESKTOP_VIEWPORT, MOBILE_VIEWPORT]
+
+# Critical CSS size budget in KB
+CRITICAL_CSS_TARGET_KB = 10
+
+# Runs in the page: collects the rules that apply to elements in the viewport.
+# Returns {css, stats} with rule counts and in-page timings in milliseconds.
+EXTRACT_CRITICAL_CSS_JS = """() => {
+    const startTime = performance.now();
+
+    // Get all stylesheets
+    const getAllCSS = () => {
+        let allCSS = [];
+
+        // Process each stylesheet
+        for (let i = 0; i < document.styleSheets.length; i++) {
+            try {
+                const sheet = document.styleSheets[i];
+                const rules = sheet.cssRules || sheet.rules;
+
+                if (rules) {
+                    for (let j = 0; j < rules.length; j++) {
+                        try {
+                            const rule = rules[j];
+                            if (rule.cssText) {
+                                allCSS.push({
+                                    cssText: rule.cssText,
+                                    selector: rule.selectorText,
+                                    source: sheet.href || 'inline'
+                                });
+                            }
+                        } catch (e) {
+                            // Skip inaccessible rules
+                        }
+                    }
+                }
+            } catch (e) {
+                // CORS or other access error - skip stylesheet
+            }
+        }
+
+        return allCSS;
+    };
+
+    // Check if an element is in viewport
+    const isInViewport = (elem) => {
+        const rect = elem.getBoundingClientRect();
+        return (
+            rect.top < window.innerHeight &&
+            rect.bottom >= 0 &&
+            rect.left < window.innerWidth &&
+            rect.right >= 0
+        );
+    };
+
+    // Check display/visibility, without forcing a computed style where
+    // the browser can answer directly
+    const isVisible = (elem) => {
+        if (elem.checkVisibility) {
+            return elem.checkVisibility({ visibilityProperty: true });
+        }
+        const style = window.getComputedStyle(elem);
+        return style.display !== 'none' && style.visibility !== 'hidden';
+    };
+
+    // Get all elements in viewport, as a Set for O(1) membership tests
+    const getVisibleElements = () => {
+        const visible = new Set();
+        for (const el of document.querySelectorAll('*')) {
+            // Geometry first: most elements of a long page are below the fold
+            if (isInViewport(el) && isVisible(el)) {
+                visible.add(el);
+            }
+        }
+        return visible;
+    };
+
+    // Selectors repeat across stylesheets, so each is matched once
+    const selectorCache = new Map();
+
+    // Check if a selector matches any visible element: one
+    // querySelectorAll per selector, intersected with the visible Set
+    const selectorMatchesVisible = (selector, visibleElements) => {
+        let result = selectorCache.get(selector);
+        if (result !== undefined) {
+            return result;
+        }
+
+        result = false;
+        try {
+            for (const elem of document.querySelectorAll(selector)) {
+                if (visibleElements.has(elem)) {
+                    result = true;
+                    break;
+                }
+            }
+        } catch (e) {
+            // Invalid selector or matching error - keep the rule to be safe
+            result = true;
+        }
+        selectorCache.set(selector, result);
+        return result;
+    };
+
+    // Check if a CSS rule applies to any visible element
+    const ruleAppliesToVisibleElement = (rule, visibleElements) => {
+        if (!rule.selector) {
+            // Non-selector rules (like @media, @keyframes, etc.)
+            return true;  // Keep all non-selector rules for now
+        }
+        return selectorMatchesVisible(rule.selector, visibleElements);
+    };
+
+    // Main extraction logic
+    const allCSS = getAllCSS();
+    const collectedTime = performance.now();
+
+    const visibleElements = getVisibleElements();
+    const visibleTime = performance.now();
+
+    // Filter to only rules that apply to visible elements
+    const criticalRules = allCSS.filter(rule =>
+        ruleAppliesToVisibleElement(rule, visibleElements)
+    );
+    const matchedTime = performance.now();
+
+    // Group by source
+    const bySource = {};
+    for (const rule of criticalRules) {
+        const source = rule.source;
+        if (!bySource[source]) {
+            bySource[source] = [];
+        }
+        bySource[source].push(rule.cssText);
+    }
+
+    // Build final CSS output
+    let output = '';
+    for (const [source, rules] of Object.entries(bySource)) {
+        output += `/* Source: ${source} */\\n`;
+        output += rules.join('\\n');
+        output += '\\n\\n';
+    }
+
+    return {
+        css: output,
+        stats: {
+            rules: allCSS.length,
+            visibleElements: visibleElements.size,
+            uniqueSelectors: selectorCache.size,
+            criticalRules: criticalRules.length,
+            collectMs: collectedTime - startTime,
+            visibleMs: visibleTime - collectedTime,
+            matchMs: matchedTime - visibleTime,
+            totalMs: performance.now() - startTime
+        }
+    };
+}"""
+
+# Upper bound for waiting on the page to settle after networkidle; the fixed
+# sleep used before settle detection
+SETTLE_TIMEOUT_MS = 1000
+
+# Runs in the page: resolves once rendering has settled - web fonts loaded,
+# pending animation frames run and the layout unchanged between two
+# consecutive frames - or after maxMs. Returns timings in milliseconds.
+WAIT_FOR_SETTLE_JS = """async (maxMs) => {
+    const startTime = performance.now();
+    const deadline = startTime + maxMs;
+    const remaining = () => Math.max(0, deadline - performance.now());
+    const timeout = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+    const nextFrame = () => new Promise(resolve => requestAnimationFrame(() => resolve()));
+
+    // Web fonts change text metrics, and with them the layout
+    if (document.fonts && document.fonts.status !== 'loaded') {
+        await Promise.race([document.fonts.ready, timeout(remaining())]);
+    }
+    const fontsTime = performance.now();
+
+    // Cheap hash of the document size and every element's box
+    const layoutHash = () => {
+        const root = document.documentElement;
+        let hash = Math.imul(root.scrollWidth, 31) + root.scrollHeight;
+        for (const el of document.getElementsByTagName('*')) {
+            const rect = el.getBoundingClientRect();
+            hash = Math.imul(hash, 31) + Math.round(rect.top);
+            hash = Math.imul(hash, 31) + Math.round(rect.left);
+            hash = Math.imul(hash, 31) + Math.round(rect.width);
+            hash = Math.imul(hash, 31) + Math.round(rect.height) | 0;
+        }
+        return hash;
+    };
+
+    let previous = null;
+    let frames = 0;
+    let stable = false;
+    while (remaining() > 0) {
+        await Promise.race([nextFrame(), timeout(remaining())]);
+        frames++;
+        const current = layoutHash();
+        if (current === previous) {
+            stable = true;
+            break;
+        }
+        previous = current;
+    }
+
+    return {
+        stable: stable,
+        frames: frames,
+        fontsMs: fontsTime - startTime,
+        totalMs: performance.now() - startTime
+    };
+}"""
+
+# Part of every result cache key, so cached CSS is not reused after the
+# extraction logic changes
+EXTRACTOR_VERSION = hashlib.blake2b(
+    (EXTRACT_CRITICAL_CSS_JS + WAIT_FOR_SETTLE_JS).encode('utf-8'), digest_size=8
+).hexdigest()
+
+
+def browser_version() -> str:
+    """
+    Version of the Chromium build Playwright launches, for the cache namespace.
 
-    Args:
-        url: URL to extract critical CSS from (supports file:// URLs)
-        viewport_width: Viewport width in pixels
-        viewport_height: Viewport height in pixels
-        output_path: Optional path to save extracted CSS
+    Read from the browsers.json Playwright pins its browser builds in rather
+    than from browser.version, so a run served from the cache still never
+    launches Chromium. Includes the Playwright version, which is all that is
+    left if browsers.json cannot be read.
+    """
+    try:
+        version = f"playwright-{metadata.version('playwright')}"
+    except metadata.PackageNotFoundError:
+        version = "playwright-unknown"
+    browsers_file = Path(playwright.__file__).parent / "driver" / "package" / "browsers.json"
+    try:
+        browsers = json.loads(browsers_file.read_text())['browsers']
+    except (OSError, ValueError, KeyError):
+        return version
+    for browser in browsers:
+        if browser.get('name') == 'chromium':
+            return f"{version}:chromium-{browser.get('browserVersion')}-r{browser.get('revision')}"
+    return version
 
-    Returns:
-        Extracted critical CSS as string
+
+class BrowserPool:
     """
-    print(f"Extracting critical CSS for {url}")
-    print(f"Viewport: {viewport_width}x{viewport_height}")
+    One headless Chromium shared by many extractions.
 
-    # Prepare file:// URLs by inlining external stylesheets
-    prepared_url = prepare_file_url_with_inlined_styles(url)
-    if prepared_url != url:
-        print(f"Using prepared URL: {prepared_url}")
+    Browser contexts are pooled and reused across pages and viewports (each
+    page sets its own viewport size), so extracting N URLs x M viewports
+    pays for a single browser launch instead of N x M. Chromium is only
+    launched when the first page is opened, so a run served entirely from
+    the result cache never starts it.
 
-    with sync_playwright() as p:
-        # Launch headless Chromium
-        browser = p.chromium.launch(headless=True)
+    Usage:
+        with BrowserPool() as pool:
+            css = extract_critical_css(url, 1920, 1080, pool=pool)
+    """
 
-        # Create context with specified viewport
-        context = browser.new_context(
-            viewport={'width': viewport_width, 'height': viewport_height}
-        )
+    def __init__(
+        self,
+        max_contexts: int = 4,
+        cache: Optional[ResultCache] = None,
+        router: Optional[SiteRouter] = None,
+        settle: str = "auto",
+        settle_timeout_ms: int = SETTLE_TIMEOUT_MS
+    ):
+        self.max_contexts = max_contexts
+        self.cache = cache
+        self.router = router
+        self.settle = settle
+        self.settle_timeout_ms = settle_timeout_ms
+        self.browser = None
+        self.launch_seconds = 0.0
+        self.pages_opened = 0
+        self.settle_seconds = 0.0
+        self._playwright = None
+        self._idle_contexts = []
+
+    def start(self) -> "BrowserPool":
+        """Launch Chromium if it is not running yet."""
+        if self.browser is None:
+            start = time.perf_counter()
+            self._playwright = sync_playwright().start()
+            self.browser = self._playwright.chromium.launch(headless=True)
+            self.launch_seconds = time.perf_counter() - start
+            print(f"🚀 Launched headless Chromium ({self.launch_seconds * 1000:.0f} ms)")
+        return self
+
+    def close(self):
+        """Close pooled contexts, the browser and Playwright."""
+        for context in self._idle_contexts:
+            context.close()
+        self._idle_contexts.clear()
+        if self.browser is not None:
+            self.browser.close()
+            self.browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def page(self, viewport_width: int, viewport_height: int):
+        """Open a page with the given viewport in a pooled context."""
+        self.start()
+        viewport = {'width': viewport_width, 'height': viewport_height}
+        if self._idle_contexts:
+            context = self._idle_contexts.pop()
+        else:
+            context = self.browser.new_context(viewport=viewport)
+            if self.router is not None:
+                context.route(f"{ORIGIN}/**", self.router.handle)
 
         page = context.new_page()
+        page.set_viewport_size(viewport)
+        self.pages_opened += 1
+        reusable = False
+        try:
+            yield page
+            reusable = True
+        finally:
+            page.close()
+            # A context that saw an error may be in a bad state; don't reuse it
+            if reusable and len(self._idle_contexts) < self.max_contexts:
+                context.clear_cookies()
+                self._idle_contexts.append(context)
+            else:
+                context.close()
+
+
+def _cache_key(pool, url: str, viewport_width: int, viewport_height: int) -> Optional[str]:
+    """Result cache key for a prepared URL; routed pages are keyed by their content."""
+    content_digest = None
+    if pool.router is not None and url.startswith(ORIGIN + '/'):
+        content_digest = pool.router.content_digest(url)
+        if content_digest is None:
+            return None
+    return pool.cache.key_for(url, viewport_width, viewport_height, content_digest)
+
+
+def _extract_from_page(pool: BrowserPool, url: str, viewport_width: int, viewport_height: int) -> str:
+    """
+    Load an (already prepared) URL in a pooled page and collect its critical CSS.
 
-        # Navigate to URL (use prepared URL if different)
-        print(f"Navigating to {prepared_url}...")
-        page.goto(prepared_url, wait_until='networkidle')
+    With a result cache on the pool, unchanged pages are answered from the
+    cache without opening a page.
+    """
+    key = None
+    if pool.cache is not None:
+        key = _cache_key(pool, url, viewport_width, viewport_height)
+        cached_css = pool.cache.get(key)
+        if cached_css is not None:
+            print(f"💾 Cache hit for {viewport_width}x{viewport_height}")
+            return cached_css
+
+    with pool.page(viewport_width, viewport_height) as page:
+        print(f"Navigating to {url}...")
+        page.goto(url, wait_until='networkidle')
 
         # Wait for any dynamic content to settle
-        page.wait_for_timeout(1000)
+        start = time.perf_counter()
+        if pool.settle == "auto":
+            settle = page.evaluate(WAIT_FOR_SETTLE_JS, pool.settle_timeout_ms)
+            report_settle_stats(settle)
+        else:
+            page.wait_for_timeout(pool.settle_timeout_ms)
+        pool.settle_seconds += time.perf_counter() - start
 
-        # Extract critical CSS using JavaScript
         print("Extracting critical CSS rules...")
-        critical_css = page.evaluate("""() => {
-            // Get all stylesheets
-            const getAllCSS = () => {
-                let allCSS = [];
-
-                // Process each stylesheet
-                for (let i = 0; i < document.styleSheets.length; i++) {
-                    try {
-                        const sheet = document.styleSheets[i];
-                        const rules = sheet.cssRules || sheet.rules;
-
-                        if (rules) {
-                            for (let j = 0; j < rules.length; j++) {
-                                try {
-                                    const rule = rules[j];
-                                    if (rule.cssText) {
-                                        allCSS.push({
-                                            cssText: rule.cssText,
-                                            selector: rule.selectorText,
-                                            source: sheet.href || 'inline'
-                                        });
-                                    }
-                                } catch (e) {
-                                    // Skip inaccessible rules
-                                }
-                            }
-                        }
-                    } catch (e) {
-                        // CORS or other access error - skip stylesheet
-                    }
-                }
+        result = page.evaluate(EXTRACT_CRITICAL_CSS_JS)
+        report_in_page_stats(result['stats'], viewport_width, viewport_height)
 
-                return allCSS;
-            };
-
-            // Check if an element is in viewport
-            const isInViewport = (elem) => {
-                const rect = elem.getBoundingClientRect();
-                return (
-                    rect.top < window.innerHeight &&
-                    rect.bottom >= 0 &&
-                    rect.left < window.innerWidth &&
-                    rect.right >= 0
-                );
-            };
-
-            // Get all elements in viewport
-            const getVisibleElements = () => {
-                const all = document.querySelectorAll('*');
-                return Array.from(all).filter(el => {
-                    // Must be visible
-                    const style = window.getComputedStyle(el);
-                    if (style.display === 'none' || style.visibility === 'hidden') {
-                        return false;
-                    }
+    if pool.cache is not None:
+        pool.cache.put(key, result['css'])
+    return result['css']
 
-                    // Must be in viewport
-                    return isInViewport(el);
-                });
-            };
 
-            // Check if a CSS rule applies to any visible element
-            const ruleAppliesToVisibleElement = (rule, visibleElements) => {
-                if (!rule.selector) {
-                    // Non-selector rules (like @media, @keyframes, etc.)
-                    return true;  // Keep all non-selector rules for now
-                }
+def report_settle_stats(settle: dict):
+    """Print the timings returned by WAIT_FOR_SETTLE_JS."""
+    state = "stable layout" if settle['stable'] else "timed out"
+    print(
+        f"⏱️  Settled in {settle['totalMs']:.0f} ms ({state} after {settle['frames']} frames, "
+        f"fonts {settle['fontsMs']:.0f} ms)"
+    )
 
-                try {
-                    // Try to match selector against visible elements
-                    for (const elem of visibleElements) {
-                        try {
-                            if (elem.matches && elem.matches(rule.selector)) {
-                                return true;
-                            }
-                        } catch (e) {
-                            // Invalid selector or matching error - keep the rule to be safe
-                            return true;
-                        }
-                    }
-                } catch (e) {
-                    // If matching fails, include the rule to be safe
-                    return true;
-                }
 
-                return false;
-            };
+def report_settle_savings(pool):
+    """Print the total settle wait of a pool against a fixed sleep per page."""
+    if not pool.pages_opened:
+        return
+    fixed_seconds = pool.pages_opened * pool.settle_timeout_ms / 1000
+    print(
+        f"⏱️  Render settle: {pool.settle_seconds:.1f} s over {pool.pages_opened} page loads "
+        f"vs {fixed_seconds:.1f} s with a fixed {pool.settle_timeout_ms} ms sleep "
+        f"(saved {fixed_seconds - pool.settle_seconds:.1f} s)"
+    )
 
-            // Main extraction logic
-            const allCSS = getAllCSS();
-            const visibleElements = getVisibleElements();
 
-            console.log(`Total CSS rules: ${allCSS.length}`);
-            console.log(`Visible elements: ${visibleElements.length}`);
+def report_in_page_stats(stats: dict, viewport_width: int, viewport_height: int):
+    """Print the rule counts and in-page timings returned by EXTRACT_CRITICAL_CSS_JS."""
+    print(
+        f"⏱️  In-page extraction {viewport_width}x{viewport_height}: {stats['totalMs']:.1f} ms "
+        f"(collect {stats['collectMs']:.1f}, visible {stats['visibleMs']:.1f}, "
+        f"match {stats['matchMs']:.1f}) - {stats['criticalRules']}/{stats['rules']} rules, "
+        f"{stats['uniqueSelectors']} unique selectors, {stats['visibleElements']} visible elements"
+    )
 
-            // Filter to only rules that apply to visible elements
-            const criticalRules = allCSS.filter(rule =>
-                ruleAppliesToVisibleElement(rule, visibleElements)
-            );
 
-            console.log(`Critical CSS rules: ${criticalRules.length}`);
+def report_css_size(css: str, label: str = "Critical CSS") -> int:
+    """Print the size of extracted CSS against the budget; returns size in bytes."""
+    css_size = len(css.encode('utf-8'))
+    css_size_kb = css_size / 1024
 
-            // Group by source
-            const bySource = {};
-            for (const rule of criticalRules) {
-                const source = rule.source;
-                if (!bySource[source]) {
-                    bySource[source] = [];
-                }
-                bySource[source].push(rule.cssText);
-            }
+    print(f"✅ {label} size: {css_size_kb:.2f} KB ({css_size} bytes)")
 
-            // Build final CSS output
-            let output = '';
-            for (const [source, rules] of Object.entries(bySource)) {
-                output += `/* Source: ${source} */\\n`;
-                output += rules.join('\\n');
-                output += '\\n\\n';
-            }
+    # Check if under 10KB target
+    if css_size_kb > CRITICAL_CSS_TARGET_KB:
+        print(f"⚠️  Warning: Critical CSS exceeds {CRITICAL_CSS_TARGET_KB}KB target ({css_size_kb:.2f} KB)")
+    else:
+        print(f"✅ Critical CSS is under {CRITICAL_CSS_TARGET_KB}KB target")
 
-            return output;
-        }""")
+    return css_size
 
-        browser.close()
 
-    # Calculate stats
-    css_size = len(critical_css.encode('utf-8'))
-    css_size_kb = css_size / 1024
+def extract_critical_css(
+    url: str,
+    viewport_width: int = 1920,
+    viewport_height: int = 1080,
+    output_path: Path = None,
+    pool: Optional[BrowserPool] = None
+) -> str:
+    """
+    Extract critical CSS for a given URL and viewport size.
 
-    print(f"✅ Critical CSS size: {css_size_kb:.2f} KB ({css_size} bytes)")
+    Args:
+        url: URL to extract critical CSS from (supports file:// URLs)
+        viewport_width: Viewport width in pixels
+        viewport_height: Viewport height in pixels
+        output_path: Optional path to save extracted CSS
+        pool: Optional BrowserPool to reuse; a one-off browser is launched if omitted
 
-    # Check if under 10KB target
-    if css_size_kb > 10:
-        print(f"⚠️  Warning: Critical CSS exceeds 10KB target ({css_size_kb:.2f} KB)")
+    Returns:
+        Extracted critical CSS as string
+    """
+    print(f"Extracting critical CSS for {url}")
+    print(f"Viewport: {viewport_width}x{viewport_height}")
+
+    # Prepare file:// URLs by inlining external stylesheets (or routing them)
+    prepared_url = prepare_url(url, pool.router if pool is not None else None)
+    if prepared_url != url:
+        print(f"Using prepared URL: {prepared_url}")
+
+    if pool is None:
+        with BrowserPool() as one_off:
+            critical_css = _extract_from_page(one_off, prepared_url, viewport_width, viewport_height)
     else:
-        print(f"✅ Critical CSS is under 10KB target")
+        critical_css = _extract_from_page(pool, prepared_url, viewport_width, viewport_height)
+
+    report_css_size(critical_css)
 
     # Save to file if output path specified
     if output_path:
@@ -313,16 +629,89 @@ def extract_critical_css(
     return critical_css
 
 
+def extract_many(
+    urls: Iterable[str],
+    viewports: Sequence[Tuple[int, int]] = DEFAULT_VIEWPORTS,
+    pool: Optional[BrowserPool] = None
+) -> Dict[str, Dict[Tuple[int, int], str]]:
+    """
+    Extract critical CSS for every URL at every viewport in one browser session.
+
+    Each URL is prepared once (see prepare_url) and then loaded once per
+    viewport in pooled contexts.
+
+    Args:
+        urls: URLs to extract from
+        viewports: (width, height) pairs
+        pool: Optional BrowserPool to reuse; one is started and closed here if omitted
+
+    Returns:
+        Mapping of url -> {(width, height): critical CSS}
+    """
+    urls = list(urls)
+    own_pool = pool is None
+    if own_pool:
+        pool = BrowserPool()
+
+    results = {}
+    try:
+        for url_number, url in enumerate(urls, 1):
+            print(f"\n[{url_number}/{len(urls)}] {url}")
+            prepared_url = prepare_url(url, pool.router)
+            results[url] = {}
+            for width, height in viewports:
+                print(f"Viewport: {width}x{height}")
+                results[url][(width, height)] = _extract_from_page(pool, prepared_url, width, height)
+    finally:
+        if own_pool:
+            pool.close()
+
+    print(
+        f"\n⏱️  {pool.pages_opened} page loads in one browser session "
+        f"(launch: {pool.launch_seconds * 1000:.0f} ms)"
+    )
+    report_settle_savings(pool)
+    return results
+
+
+def merge_viewport_css(desktop_css: str, mobile_css: str) -> str:
+    """
+    Combine desktop and mobile critical CSS into one minified stylesheet.
+
+    Shared rules are kept once and viewport-specific rules are wrapped in
+    @media blocks (see merge.merge_viewport_rules).
+    """
+    merged_css, stats = merge_viewport_rules(desktop_css, mobile_css)
+    print(
+        f"Merged {stats['desktop_rules']} desktop + {stats['mobile_rules']} mobile rules: "
+        f"{stats['shared_rules']} shared, {stats['desktop_only_rules']} desktop-only, "
+        f"{stats['mobile_only_rules']} mobile-only"
+    )
+    saved_percentage = (
+        stats['saved_bytes'] / stats['concatenated_size'] * 100 if stats['concatenated_size'] else 0
+    )
+    print(
+        f"📉 {stats['merged_size']} bytes vs {stats['concatenated_size']} concatenated "
+        f"(saved {stats['saved_bytes']} bytes, {saved_percentage:.0f}%)"
+    )
+    return merged_css
+
+
 def extract_critical_css_multi_viewport(
     url: str,
-    output_path: Path = None
+    output_path: Path = None,
+    pool: Optional[BrowserPool] = None
 ) -> str:
     """
     Extract critical CSS for both desktop and mobile viewports, then merge.
 
+    Both viewports are loaded in the same browser (pass a pool to share it
+    with other extractions too).
+
     Args:
         url: URL to extract critical CSS from
         output_path: Optional path to save merged CSS
+        pool: Optional BrowserPool to reuse
 
     Returns:
         Merged critical CSS for all viewports
@@ -331,49 +720,403 @@ def extract_critical_css_multi_viewport(
     print("Extracting critical CSS for multiple viewports")
     print("=" * 60)
 
-    # Extract for desktop (1920x1080)
-    print("\n[1/2] Desktop viewport (1920x1080)")
-    print("-" * 60)
-    desktop_css = extract_critical_css(url, 1920, 1080)
-
-    # Extract for mobile (375x667)
-    print("\n[2/2] Mobile viewport (375x667)")
-    print("-" * 60)
-    mobile_css = extract_critical_css(url, 375, 667)
+    by_viewport = extract_many([url], DEFAULT_VIEWPORTS, pool)[url]
 
-    # Merge (simple approach: combine both)
     print("\n" + "=" * 60)
     print("Merging viewport CSS")
     print("=" * 60)
 
-    merged_css = f"""/* Critical CSS - Generated for multiple viewports */
-/* Desktop: 1920x1080, Mobile: 375x667 */
+    merged_css = merge_viewport_css(by_viewport[DESKTOP_VIEWPORT], by_viewport[MOBILE_VIEWPORT])
+    report_css_size(merged_css, "Merged critical CSS")
 
-/* ===== Desktop Viewport ===== */
-{desktop_css}
+    # Save to file if output path specified
+    if output_path:
+        output_path.write_text(merged_css)
+        print(f"✅ Saved merged CSS to: {output_path}")
 
-/* ===== Mobile Viewport ===== */
-{mobile_css}
-"""
+    return merged_css
 
-    # Calculate final stats
-    merged_size = len(merged_css.encode('utf-8'))
-    merged_size_kb = merged_size / 1024
 
-    print(f"✅ Merged critical CSS size: {merged_size_kb:.2f} KB ({merged_size} bytes)")
+def combined_css(by_viewport: Dict[Tuple[int, int], str], viewports: Sequence[Tuple[int, int]]) -> str:
+    """One stylesheet from per-viewport results (desktop + mobile are merged)."""
+    if list(viewports) == DEFAULT_VIEWPORTS:
+        return merge_viewport_css(by_viewport[DESKTOP_VIEWPORT], by_viewport[MOBILE_VIEWPORT])
+    return '\n'.join(by_viewport[viewport] for viewport in viewports)
 
-    # Check if under 10KB target
-    if merged_size_kb > 10:
-        print(f"⚠️  Warning: Critical CSS exceeds 10KB target ({merged_size_kb:.2f} KB)")
+
+def page_groups(site_dir: Path, group_by: str = "cluster") -> Dict[str, dict]:
+    """
+    Group site pages that can share critical CSS.
+
+    group_by 'cluster' groups by layout skeleton (clusters.cluster_pages);
+    'section' by Hugo section and list/single page (manifest.template_groups).
+
+    Returns:
+        Mapping of group name -> {'pages': [site-relative paths], and 'pattern'
+        for section groups}; the first page of each group is its representative
+    """
+    if group_by == "section":
+        return template_groups(site_dir)
+    if group_by == "cluster":
+        return {
+            f"cluster-{fingerprint}": {'pages': pages}
+            for fingerprint, pages in cluster_pages(site_dir).items()
+        }
+    raise ValueError(f"Unknown page grouping: {group_by}")
+
+
+def extract_template_manifest(
+    site_dir: Path,
+    output_dir: Path,
+    viewports: Sequence[Tuple[int, int]] = DEFAULT_VIEWPORTS,
+    pool: Optional[BrowserPool] = None,
+    group_by: str = "cluster",
+    concurrency: Optional[int] = None
+) -> Path:
+    """
+    Extract critical CSS once per page layout and write an inline.py manifest.
+
+    Pages are grouped by page_groups(); only the representative (first) page
+    of each group is loaded in the browser, and its CSS, written to
+    <group>.css, is reused for the rest of the group. A clustering report
+    (clusters.json) with the group sizes and the estimated browser time
+    saved is written next to the manifest.
+
+    With concurrency, the representatives x viewports are loaded that many
+    at a time by an AsyncBrowserPool with pool's cache, router and settle
+    settings, instead of one after the other in pool.
+
+    Returns:
+        Path of the written manifest.json
+    """
+    start = time.perf_counter()
+    groups = page_groups(site_dir, group_by)
+    cluster_seconds = time.perf_counter() - start
+    page_count = sum(len(group['pages']) for group in groups.values())
+    samples = {
+        name: (site_dir / group['pages'][0]).resolve().as_uri()
+        for name, group in groups.items()
+    }
+    print(f"🧩 {page_count} pages in {len(groups)} {group_by} groups ({cluster_seconds * 1000:.0f} ms)")
+
+    start = time.perf_counter()
+    if concurrency is None:
+        results = extract_many(samples.values(), viewports, pool)
     else:
-        print(f"✅ Critical CSS is under 10KB target")
+        pool = pool or BrowserPool()
+        results = asyncio.run(extract_many_concurrently(
+            samples.values(), viewports, concurrency, pool.cache, pool.router,
+            pool.settle, pool.settle_timeout_ms
+        ))
+    browser_seconds = time.perf_counter() - start
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    entries = []
+    default = None
+    for name, group in groups.items():
+        css_file = f"{name}.css"
+        css = combined_css(results[samples[name]], viewports)
+        (output_dir / css_file).write_text(css)
+        print(f"✅ {name}: {len(group['pages'])} pages -> {css_file} ({len(css.encode('utf-8'))} bytes)")
+        if name == ROOT_GROUP:
+            default = css_file
+        elif 'pattern' in group:
+            entries.append({'pattern': group['pattern'], 'css': css_file, 'sample': group['pages'][0]})
+        else:
+            entries.append({'pages': group['pages'], 'css': css_file, 'sample': group['pages'][0]})
+
+    manifest_path = write_manifest(output_dir, entries, default)
+    print(f"✅ Saved manifest to: {manifest_path}")
+
+    # Every page skipped would have cost about as much as a representative
+    seconds_per_page = browser_seconds / len(groups) if groups else 0.0
+    saved_seconds = seconds_per_page * (page_count - len(groups))
+    report = {
+        'group_by': group_by,
+        'pages': page_count,
+        'groups': len(groups),
+        'clustering_seconds': cluster_seconds,
+        'browser_seconds': browser_seconds,
+        'estimated_seconds_saved': saved_seconds,
+        'sizes': {name: len(group['pages']) for name, group in groups.items()},
+        'samples': {name: group['pages'][0] for name, group in groups.items()},
+    }
+    (output_dir / "clusters.json").write_text(json.dumps(report, indent=2))
+
+    print(f"\n📊 Clustering: {page_count} pages -> {len(groups)} extractions")
+    print(f"  Browser time: {browser_seconds:.1f} s ({seconds_per_page:.2f} s per representative)")
+    print(f"  Estimated browser time saved: {saved_seconds:.1f} s")
+    return manifest_path
+
+
+class AsyncBrowserPool:
+    """
+    Async counterpart of BrowserPool for concurrent extraction.
 
-    # Save to file if output path specified
-    if output_path:
-        output_path.write_text(merged_css)
-        print(f"✅ Saved merged CSS to: {output_path}")
+    At most `concurrency` pages are open at once; contexts are pooled and
+    reused like in BrowserPool, and Chromium is launched on first use.
+    """
 
-    return merged_css
+    def __init__(
+        self,
+        concurrency: int = 4,
+        cache: Optional[ResultCache] = None,
+        router: Optional[SiteRouter] = None,
+        settle: str = "auto",
+        settle_timeout_ms: int = SETTLE_TIMEOUT_MS
+    ):
+        self.concurrency = concurrency
+        self.cache = cache
+        self.router = router
+        self.settle = settle
+        self.settle_timeout_ms = settle_timeout_ms
+        self.browser = None
+        self.launch_seconds = 0.0
+        self.pages_opened = 0
+        self.settle_seconds = 0.0
+        self._playwright = None
+        self._idle_contexts = []
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._start_lock = asyncio.Lock()
+
+    async def start(self) -> "AsyncBrowserPool":
+        """Launch Chromium if it is not running yet."""
+        async with self._start_lock:
+            if self.browser is None:
+                start = time.perf_counter()
+                self._playwright = await async_playwright().start()
+                self.browser = await self._playwright.chromium.launch(headless=True)
+                self.launch_seconds = time.perf_counter() - start
+                print(f"🚀 Launched headless Chromium ({self.launch_seconds * 1000:.0f} ms)")
+        return self
+
+    async def close(self):
+        """Close pooled contexts, the browser and Playwright."""
+        for context in self._idle_contexts:
+            await context.close()
+        self._idle_contexts.clear()
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @asynccontextmanager
+    async def page(self, viewport_width: int, viewport_height: int):
+        """Open a page with the given viewport once a concurrency slot is free."""
+        async with self._semaphore:
+            await self.start()
+            viewport = {'width': viewport_width, 'height': viewport_height}
+            if self._idle_contexts:
+                context = self._idle_contexts.pop()
+            else:
+                context = await self.browser.new_context(viewport=viewport)
+                if self.router is not None:
+                    await context.route(f"{ORIGIN}/**", self.router.handle_async)
+
+            page = await context.new_page()
+            await page.set_viewport_size(viewport)
+            self.pages_opened += 1
+            reusable = False
+            try:
+                yield page
+                reusable = True
+            finally:
+                await page.close()
+                # A context that saw an error may be in a bad state; don't reuse it
+                if reusable and len(self._idle_contexts) < self.concurrency:
+                    await context.clear_cookies()
+                    self._idle_contexts.append(context)
+                else:
+                    await context.close()
+
+
+async def _extract_from_page_async(
+    pool: AsyncBrowserPool, url: str, viewport_width: int, viewport_height: int
+) -> str:
+    """Async version of _extract_from_page."""
+    key = None
+    if pool.cache is not None:
+        key = _cache_key(pool, url, viewport_width, viewport_height)
+        cached_css = pool.cache.get(key)
+        if cached_css is not None:
+            return cached_css
+
+    async with pool.page(viewport_width, viewport_height) as page:
+        await page.goto(url, wait_until='networkidle')
+
+        # Wait for any dynamic content to settle
+        start = time.perf_counter()
+        if pool.settle == "auto":
+            await page.evaluate(WAIT_FOR_SETTLE_JS, pool.settle_timeout_ms)
+        else:
+            await page.wait_for_timeout(pool.settle_timeout_ms)
+        pool.settle_seconds += time.perf_counter() - start
+
+        result = await page.evaluate(EXTRACT_CRITICAL_CSS_JS)
+        report_in_page_stats(result['stats'], viewport_width, viewport_height)
+
+    if pool.cache is not None:
+        pool.cache.put(key, result['css'])
+    return result['css']
+
+
+async def extract_many_async(
+    urls: Iterable[str],
+    viewports: Sequence[Tuple[int, int]],
+    output_dir: Path,
+    concurrency: int = 4,
+    site_dir: Optional[Path] = None,
+    cache: Optional[ResultCache] = None,
+    router: Optional[SiteRouter] = None,
+    settle: str = "auto",
+    settle_timeout_ms: int = SETTLE_TIMEOUT_MS
+) -> Dict[str, Dict[Tuple[int, int], Path]]:
+    """
+    Extract critical CSS for N URLs x M viewports concurrently.
+
+    Each result is written to its own file in output_dir as soon as it is
+    ready (<page>.<hash>.<width>x<height>.css, see css_name_for_url), so a long run
+    can be inspected or resumed while it is going. A failing page is
+    reported and skipped; the other pages keep going.
+
+    Args:
+        urls: URLs to extract from
+        viewports: (width, height) pairs
+        output_dir: Directory for the per-page, per-viewport CSS files
+        concurrency: Maximum number of pages loading at the same time
+        site_dir: Optional site root, for naming file:// pages by their site path
+        cache: Optional result cache; cached pages skip the browser
+        router: Optional SiteRouter serving file:// pages without temp files
+        settle: 'auto' to wait for the page to settle, 'fixed' to sleep
+        settle_timeout_ms: Upper bound of the settle wait (the sleep when fixed)
+
+    Returns:
+        Mapping of url -> {(width, height): written CSS file} for successful extractions
+    """
+    urls = list(urls)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    total = len(urls) * len(viewports)
+    results = {}
+    failures = []
+    done = 0
+    start = time.perf_counter()
+
+    async with AsyncBrowserPool(concurrency, cache, router, settle, settle_timeout_ms) as pool:
+        async def extract_viewport(url, prepared_url, viewport):
+            nonlocal done
+            width, height = viewport
+            try:
+                css = await _extract_from_page_async(pool, prepared_url, width, height)
+            except Exception as e:
+                failures.append((url, viewport, e))
+                print(f"❌ {url} @ {width}x{height}: {e}", file=sys.stderr)
+                return
+            output_path = output_dir / css_name_for_url(url, site_dir, viewport)
+            output_path.write_text(css)
+            results.setdefault(url, {})[viewport] = output_path
+            done += 1
+            print(f"✅ [{done}/{total}] {output_path.name} ({len(css.encode('utf-8'))} bytes)")
+
+        async def extract_url(url):
+            # Stylesheet inlining is blocking file I/O and parsing
+            prepared_url = await asyncio.to_thread(prepare_url, url, router)
+            await asyncio.gather(*(
+                extract_viewport(url, prepared_url, viewport) for viewport in viewports
+            ))
+
+        await asyncio.gather(*(extract_url(url) for url in urls))
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"\n⏱️  {done}/{total} extractions in {elapsed:.1f} s "
+        f"(concurrency {concurrency}, launch: {pool.launch_seconds * 1000:.0f} ms)"
+    )
+    report_settle_savings(pool)
+    if failures:
+        print(f"⚠️  {len(failures)} extraction(s) failed", file=sys.stderr)
+    return results
+
+
+async def extract_many_concurrently(
+    urls: Iterable[str],
+    viewports: Sequence[Tuple[int, int]],
+    concurrency: int = 4,
+    cache: Optional[ResultCache] = None,
+    router: Optional[SiteRouter] = None,
+    settle: str = "auto",
+    settle_timeout_ms: int = SETTLE_TIMEOUT_MS
+) -> Dict[str, Dict[Tuple[int, int], str]]:
+    """
+    Concurrent extract_many: every result in memory, or the first failure.
+
+    For callers that need all of them (e.g. a manifest); see
+    extract_many_async for the per-file variant that skips failing pages.
+    """
+    urls = list(urls)
+
+    async with AsyncBrowserPool(concurrency, cache, router, settle, settle_timeout_ms) as pool:
+        async def extract_url(url):
+            # Stylesheet inlining is blocking file I/O and parsing
+            prepared_url = await asyncio.to_thread(prepare_url, url, router)
+            css_by_viewport = await asyncio.gather(*(
+                _extract_from_page_async(pool, prepared_url, width, height)
+                for width, height in viewports
+            ))
+            return dict(zip(viewports, css_by_viewport))
+
+        by_url = await asyncio.gather(*(extract_url(url) for url in urls))
+    results = dict(zip(urls, by_url))
+
+    print(
+        f"\n⏱️  {pool.pages_opened} page loads, {concurrency} at a time "
+        f"(launch: {pool.launch_seconds * 1000:.0f} ms)"
+    )
+    report_settle_savings(pool)
+    return results
+
+
+def site_page_urls(site_dir: Path, pattern: str = "**/*.html") -> List[str]:
+    """file:// URLs of every page in a generated site, sorted by path."""
+    return [path.resolve().as_uri() for path in sorted(site_dir.glob(pattern))]
+
+
+def css_name_for_url(
+    url: str,
+    site_dir: Optional[Path] = None,
+    viewport: Optional[Tuple[int, int]] = None
+) -> str:
+    """
+    Output file name for a URL's critical CSS.
+
+    e.g. blog/post/index.html -> blog-post-index.<hash>.css, or
+    blog-post-index.<hash>.375x667.css with a viewport, where <hash> is a
+    short hash of the page path: the readable part alone is ambiguous
+    (a-b/index.html and a/b/index.html), and a collision would overwrite
+    another page's CSS. file:// URLs are named by their path relative to
+    site_dir when given.
+    """
+    parsed = urlparse(url)
+    path = parsed.path
+    if site_dir is not None and parsed.scheme == 'file':
+        try:
+            path = Path(path).relative_to(site_dir.resolve()).as_posix()
+        except ValueError:
+            pass
+    path = path.strip('/')
+    stem = path[:-len('.html')] if path.endswith('.html') else path
+    digest = hashlib.blake2b(path.encode('utf-8'), digest_size=4).hexdigest()
+    stem = f"{stem.replace('/', '-') or 'index'}.{digest}"
+    if viewport is not None:
+        stem += f".{viewport[0]}x{viewport[1]}"
+    return stem + '.css'
 
 
 def main():
@@ -381,17 +1124,52 @@ def main():
     parser = argparse.ArgumentParser(
         description="Extract critical CSS from a URL using Playwright"
     )
-    parser.add_argument("url", help="URL to extract critical CSS from")
+    parser.add_argument("urls", nargs="*", metavar="url", help="URL(s) to extract critical CSS from")
+    parser.add_argument(
+        "--site-dir",
+        type=Path,
+        help="Also extract every HTML page under this generated site directory"
+    )
     parser.add_argument(
         "-o", "--output",
         type=Path,
-        help="Output file path for critical CSS"
+        help="Output file path for critical CSS (single URL)"
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        help="Output directory for several URLs, one CSS file per URL"
     )
     parser.add_argument(
         "--multi-viewport",
         action="store_true",
         help="Extract for both desktop and mobile viewports"
     )
+    parser.add_argument(
+        "--manifest",
+        action="store_true",
+        help="With --site-dir: extract once per page layout and write "
+             "manifest.json for inline.py into --output-dir"
+    )
+    parser.add_argument(
+        "--group-by",
+        choices=["cluster", "section"],
+        default="cluster",
+        help="How --manifest groups pages: by DOM skeleton (default) or Hugo section"
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Extract pages x viewports concurrently, one CSS file per page and viewport "
+             "(requires --output-dir); with --manifest, the group representatives"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Pages loading at the same time with --async (default: 4)"
+    )
     parser.add_argument(
         "--width",
         type=int,
@@ -404,19 +1182,128 @@ def main():
         default=1080,
         help="Viewport height (default: 1080)"
     )
+    parser.add_argument(
+        "--serve",
+        choices=["inline", "route"],
+        default="inline",
+        help="How file:// pages get their stylesheets: inline them into a temp copy "
+             "of each page (default), or serve the site from memory via request routing"
+    )
+    parser.add_argument(
+        "--settle",
+        choices=["auto", "fixed"],
+        default="auto",
+        help="After networkidle, wait until fonts are loaded and the layout is stable "
+             "(default), or sleep for --settle-timeout-ms"
+    )
+    parser.add_argument(
+        "--settle-timeout-ms",
+        type=int,
+        default=SETTLE_TIMEOUT_MS,
+        help=f"Upper bound of the settle wait in ms (default: {SETTLE_TIMEOUT_MS})"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        help="Result cache directory (default: $CRITICAL_CSS_CACHE_DIR or ~/.cache/critical-css)"
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=DEFAULT_MAX_BYTES / (1 << 20),
+        help=f"Result cache size cap in MB (default: {DEFAULT_MAX_BYTES >> 20})"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always extract in the browser, without reading or writing the result cache"
+    )
 
     args = parser.parse_args()
 
-    try:
-        if args.multi_viewport:
-            extract_critical_css_multi_viewport(args.url, args.output)
-        else:
-            extract_critical_css(
-                args.url,
-                args.width,
-                args.height,
-                args.output
+    viewports = DEFAULT_VIEWPORTS if args.multi_viewport else [(args.width, args.height)]
+
+    urls = list(args.urls)
+    if args.manifest:
+        if not args.site_dir or not args.output_dir:
+            parser.error("--manifest requires --site-dir and --output-dir")
+    else:
+        if args.site_dir:
+            urls.extend(site_page_urls(args.site_dir))
+        if not urls:
+            parser.error("no URLs given (pass URLs and/or --site-dir)")
+        if (len(urls) > 1 or args.use_async) and not args.output_dir:
+            parser.error("--output-dir is required when extracting several URLs or with --async")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.settle_timeout_ms < 0:
+        parser.error("--settle-timeout-ms must not be negative")
+
+    cache = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir or default_cache_dir()
+        try:
+            cache = ResultCache(
+                cache_dir,
+                f"{EXTRACTOR_VERSION}:{browser_version()}:{args.settle}",
+                int(args.cache_max_mb * (1 << 20))
             )
+        except OSError as e:
+            print(f"⚠️  Warning: Result cache disabled, cannot use {cache_dir}: {e}")
+
+    router = None
+    if args.serve == "route":
+        # Root-relative links resolve against the site, or the first page's directory
+        site_root = args.site_dir
+        if site_root is None and urlparse(urls[0]).scheme == 'file':
+            site_root = Path(urlparse(urls[0]).path).parent
+        if site_root is not None:
+            router = SiteRouter(site_root)
+
+    def browser_pool():
+        return BrowserPool(
+            cache=cache, router=router, settle=args.settle, settle_timeout_ms=args.settle_timeout_ms
+        )
+
+    try:
+        if args.manifest:
+            with browser_pool() as pool:
+                extract_template_manifest(
+                    args.site_dir, args.output_dir, viewports, pool, args.group_by,
+                    args.concurrency if args.use_async else None
+                )
+            return 0
+
+        if args.use_async:
+            results = asyncio.run(extract_many_async(
+                urls, viewports, args.output_dir, args.concurrency, args.site_dir, cache, router,
+                args.settle, args.settle_timeout_ms
+            ))
+            extracted = sum(len(by_viewport) for by_viewport in results.values())
+            return 0 if extracted == len(urls) * len(viewports) else 1
+
+        with browser_pool() as pool:
+            if len(urls) == 1 and not args.output_dir:
+                if args.multi_viewport:
+                    extract_critical_css_multi_viewport(urls[0], args.output, pool)
+                else:
+                    extract_critical_css(
+                        urls[0],
+                        args.width,
+                        args.height,
+                        args.output,
+                        pool
+                    )
+                return 0
+
+            results = extract_many(urls, viewports, pool)
+
+            args.output_dir.mkdir(parents=True, exist_ok=True)
+            for url, by_viewport in results.items():
+                css = combined_css(by_viewport, viewports)
+                output_path = args.output_dir / css_name_for_url(url, args.site_dir)
+                output_path.write_text(css)
+                print(f"✅ {url} -> {output_path} ({len(css.encode('utf-8'))} bytes)")
 
         return 0
 
@@ -426,6 +1313,12 @@ def main():
         traceback.print_exc()
         return 1
 
+    finally:
+        if router is not None:
+            router.report()
+        if cache is not None:
+            cache.report()
+
 
 if __name__ == "__main__":
     sys.exit(main())
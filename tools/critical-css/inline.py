@@ -6,39 +6,551 @@ This script takes an HTML file and critical CSS, then:
 1. Injects critical CSS as <style> in <head>
 2. Converts <link rel="stylesheet"> to async loading
 3. Moves stylesheet loading to end of <body> for better performance
+
+How the full stylesheets load is the --strategy:
+- defer: media="print" links at the end of <body>, switched to their real
+  media on load (the default)
+- preload: <link rel=preload as=style> in place in <head>, so the full CSS
+  is fetched early without blocking rendering
+- auto: per page, preload when the critical CSS covers only a small part of
+  the full CSS (the rest of the page depends on it), else defer
+Either way the original media query of each link is kept, and print-only
+stylesheets (which never block rendering) are left untouched. Stylesheets
+are split by media query: those for every screen (no media, "all" or
+"screen") are what the first render needs, so the largest of them gets
+fetchpriority="high" and only they count towards the full CSS size for
+auto; conditional ones (e.g. "(min-width: 1200px)") get
+fetchpriority="low" and are applied with their own query once loaded.
+Links stay in document order so the cascade is unchanged.
+
+By default pages are rewritten by a streaming tokenizer that splices the
+changes in at their offsets and copies every other byte through verbatim;
+--parser bs4 uses the original BeautifulSoup rewrite, which reserializes
+(and normalizes) the whole document.
+
+The inlined block carries a hash of its CSS (data-hash) and the strategy
+the page's stylesheets were rewritten with (data-strategy). Pages whose
+block already has both are left alone and a block with a different hash is
+replaced in place. On a strategy change (another --strategy or
+--preload-ratio) the original links are restored from their <noscript>
+fallbacks and rewritten again. Files are only rewritten (via an atomic
+rename) when their bytes change, so re-runs and --in-place runs over an
+already processed site are cheap.
+
+--hybrid also writes each critical CSS to a shared critical.<hash>.css and
+wraps the inlined block in an nginx SSI conditional: a first visit gets the
+CSS inline plus a small loader that fetches the shared file into the HTTP
+cache and sets a ccss_<hash> cookie, and later pages requested with that
+cookie get a <link> to the cached file instead of the inline copy. Only the
+hybrid nginx image (//:nginx_container_hybrid, deployment hybrid.conf)
+enables SSI; it sends pages with Vary: Cookie and must not sit behind a
+cache that ignores that. Elsewhere, e.g. on Cloudflare Pages, the directives are plain
+comments, the <link> only exists inside one of them, and the page behaves
+like a non-hybrid one.
 """
 
+import os
+import re
 import sys
+import html
+import json
+import stat
+import hashlib
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional
-from bs4 import BeautifulSoup
+from typing import Dict, List, Optional, Tuple
 
+from manifest import CriticalCSSManifest
 
-def inline_critical_css(
-    html_path: Path,
+
+# Work chunks per worker process; more than one so a few large pages don't
+# stall a worker
+CHUNKS_PER_JOB = 4
+
+STRATEGIES = ("defer", "preload", "auto")
+
+# auto: preload the full CSS when the critical CSS is less than this
+# fraction of it
+PRELOAD_RATIO = 0.25
+
+# Quick scan for the stylesheet links of a page, to pick a strategy before
+# rewriting
+LINK_TAG_PATTERN = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+
+# An inlined critical CSS block's opening tag, as written by this script
+# (pages from before data-strategy was recorded have no strategy group)
+CRITICAL_CSS_MARKER_PATTERN = re.compile(
+    r'<style id="critical-css" data-hash="([0-9a-f]+)"(?: data-strategy="([a-z]+)")?>'
+)
+
+# A stylesheet link as rewritten by _stylesheet_markup: the preload
+# ("preload") or media="print" ("stylesheet") link and its noscript fallback,
+# which is the original link
+GENERATED_STYLESHEET_PATTERN = re.compile(
+    r'<link rel="(preload|stylesheet)" href="[^"]*"[^>]*? onload="this\.[^"]*"/>'
+    r'<noscript>(<link rel="stylesheet" href="[^"]*"(?: media="[^"]*")?/>)</noscript>'
+)
+
+# Start of a --hybrid block (an nginx SSI conditional on the ccss_<hash> cookie)
+HYBRID_BLOCK_START = '<!--# if expr="$cookie_ccss_'
+HYBRID_BLOCK_END = '<!--# endif -->'
+
+# How long the hybrid cookie lives; matches the expiry nginx sets on CSS
+HYBRID_COOKIE_MAX_AGE = 30 * 24 * 3600
+
+# One HTML token: a comment, or a start/end tag with its attributes (quoted
+# attribute values may contain '>'). Text between tokens is skipped.
+TOKEN_PATTERN = re.compile(
+    r'''<!--.*?(?:-->|\Z)|<(/?)([a-zA-Z][a-zA-Z0-9:-]*)((?:[^>"']|"[^"]*"|'[^']*')*)>''',
+    re.DOTALL
+)
+ATTR_PATTERN = re.compile(r'''([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?''')
+
+# Elements whose content is text, not markup (as in Python's html.parser)
+RAW_TEXT_END_PATTERNS = {
+    name: re.compile(rf'</{name}\s*>', re.IGNORECASE) for name in ('script', 'style')
+}
+
+
+def critical_css_hash(critical_css: str) -> str:
+    """Content hash recorded in the data-hash attribute of the inlined block."""
+    return hashlib.blake2b(critical_css.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _critical_style(critical_css: str, strategy: str) -> str:
+    return (
+        f'<style id="critical-css" data-hash="{critical_css_hash(critical_css)}" '
+        f'data-strategy="{strategy}">\n{critical_css}\n</style>'
+    )
+
+
+def shared_css_name(critical_css: str) -> str:
+    """File name of the shared copy of critical CSS written by --hybrid."""
+    return f"critical.{critical_css_hash(critical_css)}.css"
+
+
+def _hybrid_link(shared_href: str) -> str:
+    """The markup nginx outputs for a --hybrid block on a repeat view."""
+    return f'<link rel="stylesheet" href="{shared_href}"/>'
+
+
+def _hybrid_parts(
+    critical_css: str, shared_href: str, strategy: str
+) -> Tuple[str, str, str, str, str]:
+    """
+    (if, repeat view, else, first view, endif) pieces of a --hybrid block.
+
+    The first view inlines the CSS, then once the page has loaded fetches
+    the shared file (so it is in the HTTP cache) and sets the cookie that
+    makes nginx serve the repeat view, a plain <link> to that file. The
+    link is set and echoed by SSI directives, so without SSI it is inside
+    comments and only the first view applies.
+    """
+    cookie = f"ccss_{critical_css_hash(critical_css)}"
+    loader = (
+        "<script>addEventListener('load',function(){"
+        f"fetch('{shared_href}').then(function(r){{if(r.ok)document.cookie="
+        f"'{cookie}=1;path=/;max-age={HYBRID_COOKIE_MAX_AGE};samesite=lax'}})"
+        "})</script>"
+    )
+    return (
+        f'<!--# if expr="$cookie_{cookie}" -->',
+        f"<!--# set var=\"ccss_link\" value='{_hybrid_link(shared_href)}' -->"
+        '<!--# echo var="ccss_link" encoding="none" -->',
+        '<!--# else -->',
+        _critical_style(critical_css, strategy) + loader,
+        HYBRID_BLOCK_END,
+    )
+
+
+def _critical_block(critical_css: str, strategy: str, shared_href: Optional[str] = None) -> str:
+    """The inlined <style> block, or the --hybrid block if shared_href is set."""
+    if shared_href is None:
+        return _critical_style(critical_css, strategy)
+    return ''.join(_hybrid_parts(critical_css, shared_href, strategy))
+
+
+def _critical_block_span(html_content: str, marker: re.Match) -> Tuple[int, int]:
+    """Offsets of the critical CSS block whose <style> tag marker matched."""
+    close = RAW_TEXT_END_PATTERNS['style'].search(html_content, marker.end())
+    start, end = marker.start(), close.end() if close else len(html_content)
+    hybrid_start = html_content.rfind(HYBRID_BLOCK_START, 0, start)
+    if hybrid_start != -1 and html_content.find(HYBRID_BLOCK_END, hybrid_start) > start:
+        start = hybrid_start
+        end = html_content.find(HYBRID_BLOCK_END, end) + len(HYBRID_BLOCK_END)
+    return start, end
+
+
+def _restore_stylesheets(html_content: str, block_start: int, block_end: int) -> str:
+    """
+    Undo an earlier run: drop its critical CSS block and restore the links.
+
+    Each rewritten stylesheet becomes its noscript fallback again, in place
+    for preloads and, for links deferred to the end of <body>, where the
+    block was, so they are back in <head> in their original order.
+    """
+    edits = []
+    deferred = []
+    for match in GENERATED_STYLESHEET_PATTERN.finditer(html_content):
+        if match.group(1) == 'stylesheet':
+            deferred.append(match.group(2))
+            edits.append((match.start(), match.end(), ''))
+        else:
+            edits.append((match.start(), match.end(), match.group(2)))
+    edits.append((block_start, block_end, ''.join(deferred)))
+    edits.sort(key=lambda edit: edit[0])
+
+    pieces = []
+    copied_to = 0
+    for start, end, replacement in edits:
+        pieces.append(html_content[copied_to:start])
+        pieces.append(replacement)
+        copied_to = end
+    pieces.append(html_content[copied_to:])
+    return ''.join(pieces)
+
+
+def hybrid_view_bytes(
+    html_bytes: int, critical_css: str, shared_href: str, strategy: str
+) -> Tuple[int, int]:
+    """
+    HTML bytes nginx sends for a --hybrid page on a first and a repeat view.
+
+    Args:
+        html_bytes: Size of the page on disk (with the hybrid block)
+        strategy: Strategy recorded in the block
+    """
+    sizes = [
+        len(part.encode('utf-8')) for part in _hybrid_parts(critical_css, shared_href, strategy)
+    ]
+    directives = sizes[0] + sizes[1] + sizes[2] + sizes[4]
+    link = len(_hybrid_link(shared_href).encode('utf-8'))
+    return html_bytes - directives, html_bytes - directives - sizes[3] + link
+
+
+# Shared critical CSS files already written, per process
+_shared_css_written = set()
+
+
+def write_shared_css(directory: Path, critical_css: str) -> str:
+    """Write critical.<hash>.css into directory (once per process); returns its name."""
+    name = shared_css_name(critical_css)
+    path = directory / name
+    if path not in _shared_css_written:
+        if write_if_changed(path, critical_css):
+            print(f"✅ Saved shared critical CSS to: {path}")
+        _shared_css_written.add(path)
+    return name
+
+
+def _attributes(attr_text: str) -> dict:
+    """Raw (still entity-encoded) attribute values of a tag, by lowercase name."""
+    attrs = {}
+    for name, *values in ATTR_PATTERN.findall(attr_text):
+        # Only one of the value groups matched; the others are empty
+        attrs.setdefault(name.lower(), ''.join(values))
+    return attrs
+
+
+def _is_stylesheet(attrs: dict) -> bool:
+    return 'stylesheet' in attrs.get('rel', '').lower().split()
+
+
+def _is_print_only(attrs: dict) -> bool:
+    return attrs.get('media', '').strip().lower() == 'print'
+
+
+def _is_conditional(raw_media: str) -> bool:
+    """Whether a media attribute applies to only some screens (a media query)."""
+    return raw_media.strip().lower() not in ('', 'all', 'screen')
+
+
+def _stylesheet_markup(raw_href: str, raw_media: str, strategy: str, main: bool) -> str:
+    """
+    Non-blocking link for a stylesheet plus its noscript fallback.
+
+    Args:
+        raw_href: href as written in the page (entity-encoded)
+        raw_media: media attribute as written in the page, or ''
+        strategy: 'defer' or 'preload'
+        main: Whether this is the page's main stylesheet (fetchpriority="high");
+            other conditional-media stylesheets get fetchpriority="low"
+    """
+    href = raw_href.replace('"', '&quot;')
+    media = raw_media.replace('"', '&quot;')
+    media_attr = f' media="{media}"' if media else ''
+    fallback = f'<noscript><link rel="stylesheet" href="{href}"{media_attr}/></noscript>'
+    if strategy == "preload":
+        priority = "high" if main else "low"
+        return (
+            f'<link rel="preload" href="{href}" as="style"{media_attr} fetchpriority="{priority}" '
+            f'onload="this.onload=null;this.rel=\'stylesheet\'"/>' + fallback
+        )
+    if main:
+        priority_attr = ' fetchpriority="high"'
+    elif _is_conditional(raw_media):
+        priority_attr = ' fetchpriority="low"'
+    else:
+        priority_attr = ''
+    applied_media = (media or 'all').replace("'", "\\'")
+    return (
+        f'<link rel="stylesheet" href="{href}" media="print"{priority_attr} '
+        f'onload="this.media=\'{applied_media}\'"/>' + fallback
+    )
+
+
+def page_stylesheets(html_content: str) -> List[dict]:
+    """Attributes of the <link rel="stylesheet"> tags of a page (quick scan)."""
+    stylesheets = []
+    for tag in LINK_TAG_PATTERN.finditer(html_content):
+        attrs = _attributes(tag.group(0)[len('<link'):])
+        if _is_stylesheet(attrs):
+            stylesheets.append(attrs)
+    return stylesheets
+
+
+# Stylesheet file -> size in bytes (None if missing), per process
+_stylesheet_sizes: Dict[Path, Optional[int]] = {}
+
+
+def stylesheet_size(raw_href: str, html_path: Path, site_root: Path) -> Optional[int]:
+    """Size of a local stylesheet; root-relative hrefs resolve against site_root."""
+    href = html.unescape(raw_href).split('#')[0].split('?')[0]
+    if not href or '//' in href:
+        return None
+    if href.startswith('/'):
+        path = site_root / href.lstrip('/')
+    else:
+        path = html_path.parent / href
+    if path not in _stylesheet_sizes:
+        try:
+            _stylesheet_sizes[path] = path.stat().st_size
+        except OSError:
+            _stylesheet_sizes[path] = None
+    return _stylesheet_sizes[path]
+
+
+def choose_strategy(
+    strategy: str,
+    critical_bytes: int,
+    full_bytes: int,
+    preload_ratio: float = PRELOAD_RATIO
+) -> str:
+    """
+    Resolve 'auto' to 'defer' or 'preload' for one page.
+
+    When the critical CSS is only a small part of the page's full CSS, most
+    of the page depends on the full stylesheets, so they are preloaded from
+    <head>; otherwise they are deferred to the end of <body>. Pages whose
+    full CSS size is unknown (remote stylesheets) are deferred.
+    """
+    if strategy != "auto":
+        return strategy
+    if full_bytes <= 0:
+        return "defer"
+    return "preload" if critical_bytes / full_bytes < preload_ratio else "defer"
+
+
+def rewrite_html(
+    html_content: str,
     critical_css: str,
-    output_path: Optional[Path] = None
+    strategy: str = "defer",
+    main_href: Optional[str] = None,
+    shared_href: Optional[str] = None
 ) -> str:
     """
-    Inline critical CSS into an HTML file.
+    Inline critical CSS and defer stylesheets without parsing into a tree.
 
-    Args:
-        html_path: Path to HTML file to process
-        critical_css: Critical CSS string to inline
-        output_path: Optional path to save modified HTML
+    Tokenizes the page once, then splices the <style id="critical-css">
+    block in after the viewport (or charset) meta tag and makes each
+    <link rel="stylesheet"> non-blocking: with 'defer' it is removed and its
+    deferred form appended before </body>, with 'preload' it is replaced in
+    place. Everything else is copied through unchanged. Produces the same
+    markup as the BeautifulSoup rewrite for the inserted elements.
 
-    Returns:
-        Modified HTML as string
+    main_href (raw href) is the stylesheet to fetch with high priority;
+    defaults to the first one. With shared_href (the URL of the page's
+    critical.<hash>.css) the --hybrid block is inserted instead of the plain
+    <style>.
+
+    A page that already has a critical CSS block (an earlier run, plain or
+    hybrid) only gets that block replaced if it records the same strategy;
+    otherwise its original links are restored and rewritten.
     """
-    print(f"Processing HTML: {html_path}")
+    html_open_end = None
+    head_open_end = None
+    in_head = False
+    viewport_meta_end = None
+    charset_meta_end = None
+    has_body = False
+    body_close = None
+    html_close = None
+    links: List[Tuple[int, int, dict]] = []
+    existing_block = None
+    hybrid_start = None
 
-    # Read HTML file
-    html_content = html_path.read_text()
+    pos = 0
+    while True:
+        match = TOKEN_PATTERN.search(html_content, pos)
+        if match is None:
+            break
+        pos = match.end()
+        name = match.group(2)
+        if name is None:
+            # Comment; hybrid blocks are delimited by SSI comments
+            comment = match.group(0)
+            if comment.startswith(HYBRID_BLOCK_START) and existing_block is None:
+                hybrid_start = match.start()
+            elif comment == HYBRID_BLOCK_END and hybrid_start is not None:
+                if existing_block is not None and existing_block[0] > hybrid_start:
+                    existing_block = (hybrid_start, match.end())
+                hybrid_start = None
+            continue
+        name = name.lower()
+
+        if match.group(1):
+            # End tag
+            if name == 'head':
+                in_head = False
+            elif name == 'body':
+                body_close = match.start()
+            elif name == 'html':
+                html_close = match.start()
+            continue
+
+        if name in RAW_TEXT_END_PATTERNS:
+            close = RAW_TEXT_END_PATTERNS[name].search(html_content, pos)
+            pos = close.end() if close else len(html_content)
+            if (
+                name == 'style' and existing_block is None
+                and _attributes(match.group(3)).get('id') == 'critical-css'
+            ):
+                existing_block = (match.start(), pos)
+            continue
+
+        if name == 'html' and html_open_end is None:
+            html_open_end = match.end()
+        elif name == 'head' and head_open_end is None:
+            head_open_end = match.end()
+            in_head = True
+        elif name == 'body':
+            in_head = False
+            has_body = True
+        elif name == 'meta' and in_head:
+            attrs = _attributes(match.group(3))
+            if viewport_meta_end is None and attrs.get('name') == 'viewport':
+                viewport_meta_end = match.end()
+            if charset_meta_end is None and 'charset' in attrs:
+                charset_meta_end = match.end()
+        elif name == 'link':
+            attrs = _attributes(match.group(3))
+            if _is_stylesheet(attrs) and not _is_print_only(attrs):
+                links.append((match.start(), match.end(), attrs))
+
+    critical_style = _critical_block(critical_css, strategy, shared_href)
+    if existing_block is not None:
+        start, end = existing_block
+        marker = CRITICAL_CSS_MARKER_PATTERN.search(html_content, start, end)
+        if marker is None or marker.group(2) != strategy:
+            print("✅ Restored stylesheets rewritten with another strategy")
+            return rewrite_html(
+                _restore_stylesheets(html_content, start, end),
+                critical_css, strategy, main_href, shared_href
+            )
+        print("✅ Replaced existing critical CSS block")
+        return html_content[:start] + critical_style + html_content[end:]
+
+    print(f"Found {len(links)} stylesheet links")
+    if not links:
+        print("⚠️  No stylesheet links found in HTML")
+        return html_content
+
+    # (start, end, replacement) splices, applied in offset order
+    edits = []
+    if head_open_end is None:
+        print("Warning: No <head> tag found, creating one")
+        edits.append((html_open_end or 0, html_open_end or 0, f"<head>{critical_style}</head>"))
+    else:
+        insert_at = viewport_meta_end or charset_meta_end or head_open_end
+        edits.append((insert_at, insert_at, critical_style))
+    print("✅ Injected critical CSS into <head>")
+
+    if main_href is None:
+        main_href = links[0][2].get('href', '')
+
+    def markup(attrs):
+        href = attrs.get('href', '')
+        return _stylesheet_markup(href, attrs.get('media', ''), strategy, href == main_href)
+
+    if strategy == "preload":
+        for start, end, attrs in links:
+            edits.append((start, end, markup(attrs)))
+        print(f"✅ Preloading {len(links)} stylesheets from <head>")
+    elif not has_body:
+        print("Warning: No <body> tag found, stylesheet deferral skipped")
+    else:
+        for start, end, _ in links:
+            edits.append((start, end, ''))
+        if body_close is not None:
+            append_at = body_close
+        elif html_close is not None:
+            append_at = html_close
+        else:
+            append_at = len(html_content)
+        deferred = ''.join(markup(attrs) for _, _, attrs in links)
+        edits.append((append_at, append_at, deferred))
+        print(f"✅ Moved {len(links)} stylesheets to async load at end of <body>")
+
+    # Insertions never fall inside a removed link, so offset order is enough
+    edits.sort(key=lambda edit: edit[0])
+    pieces = []
+    copied_to = 0
+    for start, end, replacement in edits:
+        pieces.append(html_content[copied_to:start])
+        pieces.append(replacement)
+        copied_to = max(copied_to, end)
+    pieces.append(html_content[copied_to:])
+    return ''.join(pieces)
+
+
+def rewrite_html_with_soup(
+    html_content: str,
+    critical_css: str,
+    strategy: str = "defer",
+    main_href: Optional[str] = None
+) -> str:
+    """
+    Inline critical CSS and defer stylesheets via a BeautifulSoup tree.
+
+    Same arguments as rewrite_html, except that hybrid blocks are not
+    supported; slower, and reserializes the whole document.
+    """
+    from bs4 import BeautifulSoup
+
+    marker = CRITICAL_CSS_MARKER_PATTERN.search(html_content)
+    if marker is not None and marker.group(2) != strategy:
+        print("✅ Restored stylesheets rewritten with another strategy")
+        html_content = _restore_stylesheets(html_content, *_critical_block_span(html_content, marker))
 
-    # Parse HTML with BeautifulSoup
     soup = BeautifulSoup(html_content, 'html.parser')
 
+    # Create critical CSS style tag
+    critical_style = soup.new_tag('style')
+    critical_style['id'] = 'critical-css'
+    critical_style['data-hash'] = critical_css_hash(critical_css)
+    critical_style['data-strategy'] = strategy
+    critical_style.string = f"\n{critical_css}\n"
+
+    # Page processed by an earlier run with this strategy: its stylesheets
+    # are already rewritten
+    existing_style = soup.find('style', id='critical-css')
+    if existing_style:
+        existing_style.replace_with(critical_style)
+        print("✅ Replaced existing critical CSS block")
+        return str(soup)
+
     # Find or create <head>
     head = soup.find('head')
     if not head:
@@ -52,16 +564,14 @@ def inline_critical_css(
             soup.insert(0, html_tag)
             html_tag.insert(0, head)
 
-    # Find all stylesheet links
-    stylesheet_links = soup.find_all('link', rel='stylesheet')
+    # Find all stylesheet links; print-only ones never block rendering
+    stylesheet_links = [
+        link for link in soup.find_all('link', rel='stylesheet')
+        if link.get('media', '').strip().lower() != 'print'
+    ]
     print(f"Found {len(stylesheet_links)} stylesheet links")
 
     if stylesheet_links:
-        # Create critical CSS style tag
-        critical_style = soup.new_tag('style')
-        critical_style['id'] = 'critical-css'
-        critical_style.string = f"\n{critical_css}\n"
-
         # Insert critical CSS at the beginning of <head>
         # (after charset/viewport but before other content)
         charset_meta = head.find('meta', charset=True)
@@ -76,37 +586,34 @@ def inline_critical_css(
 
         print("✅ Injected critical CSS into <head>")
 
+        if main_href is None:
+            main_href = stylesheet_links[0].get('href', '')
+        else:
+            main_href = html.unescape(main_href)
+
+        def markup(link):
+            # Same markup as rewrite_html, parsed into a fragment
+            href = link.get('href', '')
+            return BeautifulSoup(_stylesheet_markup(
+                html.escape(href), html.escape(link.get('media', '')), strategy, href == main_href
+            ), 'html.parser')
+
         # Find or create <body>
         body = soup.find('body')
-        if not body:
+        if strategy == "preload":
+            # Replace each link in place with a preload
+            for link in stylesheet_links:
+                link.replace_with(markup(link))
+            print(f"✅ Preloading {len(stylesheet_links)} stylesheets from <head>")
+        elif not body:
             print("Warning: No <body> tag found, stylesheet deferral skipped")
         else:
             # Convert stylesheet links to async loading
-            # and move to end of body
+            # (media="print" trick) and move to end of body
             for link in stylesheet_links:
-                href = link.get('href', '')
-
-                # Create async loading script
-                # Using media="print" trick for async CSS loading
-                async_link = soup.new_tag('link')
-                async_link['rel'] = 'stylesheet'
-                async_link['href'] = href
-                async_link['media'] = 'print'
-                async_link['onload'] = "this.media='all'"
-
-                # Add noscript fallback
-                noscript = soup.new_tag('noscript')
-                fallback_link = soup.new_tag('link')
-                fallback_link['rel'] = 'stylesheet'
-                fallback_link['href'] = href
-                noscript.append(fallback_link)
-
-                # Remove original link from head
+                deferred = markup(link)
                 link.decompose()
-
-                # Append async link and fallback to end of body
-                body.append(async_link)
-                body.append(noscript)
+                body.append(deferred)
 
             print(f"✅ Moved {len(stylesheet_links)} stylesheets to async load at end of <body>")
 
@@ -114,33 +621,270 @@ def inline_critical_css(
         print("⚠️  No stylesheet links found in HTML")
 
     # Convert back to string
-    # Use formatter=None to preserve original formatting as much as possible
-    modified_html = str(soup)
+    return str(soup)
+
 
-    # Calculate size stats
+def write_if_changed(path: Path, content: str) -> bool:
+    """
+    Write content to path unless the file already holds exactly these bytes.
+
+    The new file is written next to the old one and renamed over it, so a
+    reader never sees a partial page; an existing file's permissions are kept.
+
+    Returns:
+        True if the file was written
+    """
+    data = content.encode('utf-8')
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+        mode = stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        mode = None
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        tmp_path.write_bytes(data)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return True
+
+
+def _inline_file(
+    html_path: Path,
+    critical_css: str,
+    output_path: Optional[Path],
+    parser: str,
+    strategy: str = "defer",
+    site_root: Optional[Path] = None,
+    preload_ratio: float = PRELOAD_RATIO,
+    shared_href: Optional[str] = None
+) -> Tuple[str, str, int, str]:
+    """
+    Inline critical CSS into an HTML file (see inline_critical_css).
+
+    Returns:
+        (modified HTML, status, original size in bytes, strategy used);
+        status is 'skipped' if the page already has this critical CSS and
+        strategy,
+        'unchanged' if the output file already held the result, 'written'
+        otherwise (or 'not saved' without an output path)
+    """
+    print(f"Processing HTML: {html_path}")
+
+    # Read HTML file
+    html_content = html_path.read_text()
     original_size = len(html_content.encode('utf-8'))
-    modified_size = len(modified_html.encode('utf-8'))
-    size_increase = modified_size - original_size
 
-    print(f"Original size: {original_size} bytes")
-    print(f"Modified size: {modified_size} bytes")
-    print(f"Size increase: {size_increase} bytes (+{size_increase/original_size*100:.1f}%)")
+    # The largest local stylesheet for every screen is the page's main one;
+    # conditional media stylesheets only count if there is no other. On a
+    # processed page the <noscript> fallbacks are the original links, and
+    # the rewritten ones are print-only or preloads, so they don't count.
+    stylesheets = [attrs for attrs in page_stylesheets(html_content) if not _is_print_only(attrs)]
+    stylesheets = (
+        [attrs for attrs in stylesheets if not _is_conditional(attrs.get('media', ''))]
+        or stylesheets
+    )
+    sizes = [
+        stylesheet_size(attrs.get('href', ''), html_path, site_root or html_path.parent) or 0
+        for attrs in stylesheets
+    ]
+    main_href = None
+    if stylesheets:
+        main_href = stylesheets[sizes.index(max(sizes))].get('href', '')
+    critical_bytes = len(critical_css.encode('utf-8'))
+    strategy = choose_strategy(strategy, critical_bytes, sum(sizes), preload_ratio)
+    print(f"Strategy: {strategy} (critical {critical_bytes} bytes, full {sum(sizes)} bytes)")
 
-    # Save to file if output path specified
-    if output_path:
-        output_path.write_text(modified_html)
-        print(f"✅ Saved to: {output_path}")
+    existing = CRITICAL_CSS_MARKER_PATTERN.search(html_content)
+    if (
+        existing and existing.group(1) == critical_css_hash(critical_css)
+        and existing.group(2) == strategy
+        and (HYBRID_BLOCK_START in html_content) == (shared_href is not None)
+    ):
+        print("⏭️  Critical CSS is up to date, skipping rewrite")
+        modified_html = html_content
+        status = "skipped"
     else:
+        if parser == "bs4":
+            modified_html = rewrite_html_with_soup(html_content, critical_css, strategy, main_href)
+        else:
+            modified_html = rewrite_html(html_content, critical_css, strategy, main_href, shared_href)
+        status = "written"
+
+        # Calculate size stats
+        modified_size = len(modified_html.encode('utf-8'))
+        size_increase = modified_size - original_size
+
+        print(f"Original size: {original_size} bytes")
+        print(f"Modified size: {modified_size} bytes")
+        print(f"Size increase: {size_increase} bytes (+{size_increase/original_size*100:.1f}%)")
+
+    # Save to file if output path specified
+    if not output_path:
         print("⚠️  No output path specified, not saving")
+        return modified_html, "not saved", original_size, strategy
+    if status == "skipped" and output_path.resolve() == html_path.resolve():
+        return modified_html, status, original_size, strategy
+    if write_if_changed(output_path, modified_html):
+        print(f"✅ Saved to: {output_path}")
+        status = "written"
+    elif status != "skipped":
+        print(f"✅ Unchanged: {output_path}")
+        status = "unchanged"
+    return modified_html, status, original_size, strategy
+
 
+def inline_critical_css(
+    html_path: Path,
+    critical_css: str,
+    output_path: Optional[Path] = None,
+    parser: str = "stream",
+    strategy: str = "defer",
+    site_root: Optional[Path] = None,
+    preload_ratio: float = PRELOAD_RATIO,
+    shared_href: Optional[str] = None
+) -> str:
+    """
+    Inline critical CSS into an HTML file.
+
+    Args:
+        html_path: Path to HTML file to process
+        critical_css: Critical CSS string to inline
+        output_path: Optional path to save modified HTML; may be html_path
+            itself, and is only written if its bytes change
+        parser: 'stream' (rewrite_html) or 'bs4' (rewrite_html_with_soup)
+        strategy: How the full stylesheets load: 'defer', 'preload' or 'auto'
+            (see choose_strategy)
+        site_root: Directory that root-relative stylesheet hrefs resolve
+            against when sizing them (default: the page's directory)
+        preload_ratio: Critical/full CSS size ratio below which 'auto'
+            preloads
+        shared_href: URL of the page's critical.<hash>.css (see
+            write_shared_css) to insert a --hybrid block instead of a plain
+            <style>; stream parser only
+
+    Returns:
+        Modified HTML as string
+    """
+    modified_html, _, _, _ = _inline_file(
+        html_path, critical_css, output_path, parser, strategy, site_root, preload_ratio,
+        shared_href
+    )
     return modified_html
 
 
+def _inline_page(
+    html_file: Path,
+    html_dir: Path,
+    output_dir: Path,
+    critical_css: str,
+    manifest: Optional[CriticalCSSManifest],
+    parser: str,
+    strategy: str = "defer",
+    preload_ratio: float = PRELOAD_RATIO,
+    hybrid: bool = False
+) -> dict:
+    """
+    Inline critical CSS into one page of a directory.
+
+    Returns:
+        Per-file stats: site-relative 'path', the 'css' source used and its
+        'css_bytes', 'original_bytes', 'modified_bytes', the write 'status'
+        (see _inline_file) and the 'strategy' used, plus with hybrid the
+        'first_view_bytes' and 'repeat_view_bytes' nginx sends; failures
+        carry an 'error' string instead of the output size
+    """
+    rel_path = html_file.relative_to(html_dir)
+    output_file = output_dir / rel_path
+
+    page_css = critical_css
+    css_source = "default"
+    result = {'path': rel_path.as_posix(), 'css': css_source}
+    try:
+        if manifest is not None:
+            css_file = manifest.css_file_for(rel_path.as_posix())
+            if css_file is not None:
+                page_css = manifest.css_for(rel_path.as_posix())
+                css_source = css_file
+        result['css'] = css_source
+        result['css_bytes'] = len(page_css.encode('utf-8'))
+        print(f"Critical CSS: {css_source} ({result['css_bytes']} bytes)")
+
+        shared_href = None
+        if hybrid:
+            shared_href = '/' + write_shared_css(output_dir, page_css)
+
+        # Create parent directory if needed
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        modified_html, status, original_size, used_strategy = _inline_file(
+            html_file, page_css, output_file, parser, strategy, html_dir, preload_ratio,
+            shared_href
+        )
+        result['original_bytes'] = original_size
+        result['modified_bytes'] = len(modified_html.encode('utf-8'))
+        result['status'] = status
+        result['strategy'] = used_strategy
+        if shared_href is not None:
+            first_view, repeat_view = hybrid_view_bytes(
+                result['modified_bytes'], page_css, shared_href, used_strategy
+            )
+            result['first_view_bytes'] = first_view
+            result['repeat_view_bytes'] = repeat_view
+            print(
+                f"Hybrid: {first_view} bytes first view, {repeat_view} bytes repeat views "
+                f"({first_view - repeat_view} saved)"
+            )
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+# Per-worker state set by _init_worker, so the critical CSS and manifest are
+# sent to each worker process once instead of with every file
+_worker = {}
+
+
+def _init_worker(html_dir, output_dir, critical_css, manifest, parser, strategy, preload_ratio, hybrid):
+    _worker.update(
+        html_dir=html_dir, output_dir=output_dir, critical_css=critical_css,
+        manifest=manifest, parser=parser, strategy=strategy, preload_ratio=preload_ratio,
+        hybrid=hybrid,
+    )
+    # Per-file logs would interleave across workers; results come back as data
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _inline_page_in_worker(html_file: Path) -> dict:
+    return _inline_page(
+        html_file, _worker['html_dir'], _worker['output_dir'], _worker['critical_css'],
+        _worker['manifest'], _worker['parser'], _worker['strategy'], _worker['preload_ratio'],
+        _worker['hybrid'],
+    )
+
+
+def resolve_jobs(jobs: int) -> int:
+    """Map a --jobs value to a worker count (0 or less means one per CPU)."""
+    if jobs < 1:
+        return os.cpu_count() or 1
+    return jobs
+
+
 def process_directory(
     html_dir: Path,
     critical_css: str,
     output_dir: Path,
-    pattern: str = "**/*.html"
+    pattern: str = "**/*.html",
+    manifest: Optional[CriticalCSSManifest] = None,
+    parser: str = "stream",
+    jobs: int = 1,
+    report_path: Optional[Path] = None,
+    strategy: str = "defer",
+    preload_ratio: float = PRELOAD_RATIO,
+    hybrid: bool = False
 ) -> int:
     """
     Process all HTML files in a directory.
@@ -148,20 +892,37 @@ def process_directory(
     Args:
         html_dir: Directory containing HTML files
         critical_css: Critical CSS to inline
-        output_dir: Directory to save modified HTML files
+        output_dir: Directory to save modified HTML files; html_dir itself
+            rewrites the pages in place
         pattern: Glob pattern for HTML files (default: **/*.html)
+        manifest: Optional per-page critical CSS map; pages it doesn't
+            cover get critical_css
+        parser: HTML rewriter, see inline_critical_css
+        jobs: Worker processes (0 means one per CPU); with more than one,
+            per-file logs are dropped and only the summary is printed
+        report_path: Optional JSON file for the per-file stats and failures
+        strategy: How the full stylesheets load, see inline_critical_css;
+            root-relative hrefs resolve against html_dir
+        preload_ratio: Critical/full CSS size ratio below which 'auto'
+            preloads
+        hybrid: Write each critical CSS to output_dir/critical.<hash>.css and
+            insert --hybrid blocks (stream parser only)
 
     Returns:
         Number of files processed
     """
+    jobs = resolve_jobs(jobs)
     print("=" * 60)
     print(f"Processing directory: {html_dir}")
     print(f"Output directory: {output_dir}")
     print(f"Pattern: {pattern}")
+    print(f"Jobs: {jobs}")
+    print(f"Strategy: {strategy}")
+    print(f"Hybrid: {'yes' if hybrid else 'no'}")
     print("=" * 60)
 
     # Find all HTML files
-    html_files = list(html_dir.glob(pattern))
+    html_files = sorted(html_dir.glob(pattern))
     print(f"\nFound {len(html_files)} HTML files")
 
     if not html_files:
@@ -171,31 +932,94 @@ def process_directory(
     # Create output directory if needed
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Process each file
-    processed = 0
-    for html_file in html_files:
-        print(f"\n[{processed + 1}/{len(html_files)}] Processing: {html_file.name}")
-        print("-" * 60)
+    start = time.perf_counter()
+    jobs = min(jobs, len(html_files))
+    if jobs <= 1:
+        results = []
+        for file_number, html_file in enumerate(html_files, 1):
+            print(f"\n[{file_number}/{len(html_files)}] Processing: {html_file.name}")
+            print("-" * 60)
+            result = _inline_page(
+                html_file, html_dir, output_dir, critical_css, manifest, parser, strategy,
+                preload_ratio, hybrid
+            )
+            if 'error' in result:
+                print(f"❌ Error processing {html_file}: {result['error']}")
+            results.append(result)
+    else:
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(
+                html_dir, output_dir, critical_css, manifest, parser, strategy, preload_ratio, hybrid
+            ),
+        ) as pool:
+            chunksize = max(1, len(html_files) // (jobs * CHUNKS_PER_JOB))
+            results = list(pool.map(_inline_page_in_worker, html_files, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
 
-        # Calculate relative path and output path
-        rel_path = html_file.relative_to(html_dir)
-        output_file = output_dir / rel_path
+    failures = [result for result in results if 'error' in result]
+    succeeded = [result for result in results if 'error' not in result]
+    processed = len(succeeded)
 
-        # Create parent directory if needed
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-
-        try:
-            inline_critical_css(html_file, critical_css, output_file)
-            processed += 1
-        except Exception as e:
-            print(f"❌ Error processing {html_file}: {e}")
-            import traceback
-            traceback.print_exc()
+    css_usage = {}
+    for result in succeeded:
+        pages, inlined_bytes = css_usage.get(result['css'], (0, 0))
+        css_usage[result['css']] = (pages + 1, inlined_bytes + result['css_bytes'])
+    original_bytes = sum(result['original_bytes'] for result in succeeded)
+    modified_bytes = sum(result['modified_bytes'] for result in succeeded)
+    statuses = {}
+    strategies = {}
+    for result in succeeded:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        strategies[result['strategy']] = strategies.get(result['strategy'], 0) + 1
 
     print("\n" + "=" * 60)
-    print(f"✅ Processed {processed}/{len(html_files)} files")
+    print(f"✅ Processed {processed}/{len(html_files)} files in {elapsed:.2f} s ({jobs} jobs)")
+    print(f"  HTML: {original_bytes:,} -> {modified_bytes:,} bytes")
+    print(
+        f"  Files: {statuses.get('written', 0)} written, {statuses.get('unchanged', 0)} unchanged, "
+        f"{statuses.get('skipped', 0)} skipped (critical CSS and strategy matched)"
+    )
+    print("  Strategies: " + ", ".join(
+        f"{name} {count}" for name, count in sorted(strategies.items())
+    ))
+    if hybrid and succeeded:
+        first_view_bytes = sum(result['first_view_bytes'] for result in succeeded)
+        repeat_view_bytes = sum(result['repeat_view_bytes'] for result in succeeded)
+        saved = first_view_bytes - repeat_view_bytes
+        print(
+            f"🔁 Hybrid HTML per page: {first_view_bytes / processed:,.0f} bytes first view, "
+            f"{repeat_view_bytes / processed:,.0f} bytes repeat views "
+            f"({saved / processed:,.0f} saved, -{saved / max(first_view_bytes, 1) * 100:.1f}%; "
+            f"{saved:,} bytes across {processed} pages)"
+        )
+    if manifest is not None:
+        print("📊 Critical CSS per page:")
+        for css_source, (pages, inlined_bytes) in sorted(css_usage.items()):
+            print(f"  {css_source}: {pages} pages, {inlined_bytes / max(pages, 1):.0f} bytes each")
+        total_inlined = sum(inlined_bytes for _, inlined_bytes in css_usage.values())
+        print(f"  Total inlined: {total_inlined:,} bytes")
+    if failures:
+        print(f"❌ {len(failures)} file(s) failed:")
+        for failure in failures:
+            print(f"  {failure['path']}: {failure['error']}")
     print("=" * 60)
 
+    if report_path:
+        report = {
+            'processed': processed,
+            'failed': len(failures),
+            'seconds': elapsed,
+            'jobs': jobs,
+            'statuses': statuses,
+            'strategies': strategies,
+            'hybrid': hybrid,
+            'files': results,
+        }
+        report_path.write_text(json.dumps(report, indent=2))
+        print(f"✅ Saved report to: {report_path}")
+
     return processed
 
 
@@ -217,9 +1041,58 @@ def main():
     parser.add_argument(
         "-o", "--output",
         type=Path,
-        required=True,
         help="Output file or directory"
     )
+    parser.add_argument(
+        "--in-place",
+        action="store_true",
+        help="Rewrite the input file or directory instead of writing to --output"
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help="manifest.json from extract.py --manifest; pages it doesn't match "
+             "get the critical_css file (directory mode only)"
+    )
+    parser.add_argument(
+        "--parser",
+        choices=["stream", "bs4"],
+        default="stream",
+        help="HTML rewriter: streaming splice that keeps the original formatting "
+             "(default) or BeautifulSoup"
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=STRATEGIES,
+        default="defer",
+        help="How the full stylesheets load: media=print links at the end of <body> "
+             "(default), rel=preload in <head>, or auto-picked per page by critical/full "
+             "CSS size"
+    )
+    parser.add_argument(
+        "--preload-ratio",
+        type=float,
+        default=PRELOAD_RATIO,
+        help=f"--strategy auto preloads when the critical CSS is below this fraction "
+             f"of the full CSS (default: {PRELOAD_RATIO})"
+    )
+    parser.add_argument(
+        "--hybrid",
+        action="store_true",
+        help="Also write critical.<hash>.css and serve it instead of the inline copy "
+             "on repeat views (needs nginx SSI, see deployment hybrid.conf)"
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for directory mode (0 = one per CPU, default: 1)"
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="Write per-file stats and failures as JSON (directory mode only)"
+    )
     parser.add_argument(
         "--pattern",
         default="**/*.html",
@@ -228,28 +1101,54 @@ def main():
 
     args = parser.parse_args()
 
+    if args.in_place == bool(args.output):
+        parser.error("exactly one of --output and --in-place is required")
+    if args.hybrid and args.parser != "stream":
+        parser.error("--hybrid requires --parser stream")
+    output = args.html_input if args.in_place else args.output
+
     try:
         # Read critical CSS
         critical_css = args.critical_css.read_text()
         print(f"Loaded critical CSS: {len(critical_css)} bytes")
         print()
 
+        manifest = None
+        if args.manifest:
+            manifest = CriticalCSSManifest(args.manifest)
+            print(f"Loaded manifest: {len(manifest.entries)} page patterns")
+
         # Check if input is a directory or file
         if args.html_input.is_dir():
             # Process directory
             processed = process_directory(
                 args.html_input,
                 critical_css,
-                args.output,
-                args.pattern
+                output,
+                args.pattern,
+                manifest,
+                args.parser,
+                args.jobs,
+                args.report,
+                args.strategy,
+                args.preload_ratio,
+                args.hybrid
             )
             return 0 if processed > 0 else 1
         else:
-            # Process single file
+            # Process single file; a hybrid page's shared CSS goes next to it
+            shared_href = None
+            if args.hybrid:
+                output.parent.mkdir(parents=True, exist_ok=True)
+                shared_href = write_shared_css(output.parent, critical_css)
             inline_critical_css(
                 args.html_input,
                 critical_css,
-                args.output
+                output,
+                args.parser,
+                args.strategy,
+                preload_ratio=args.preload_ratio,
+                shared_href=shared_href
             )
             return 0
 
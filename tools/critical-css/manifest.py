@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Critical CSS manifest shared by extract.py and inline.py.
+
+The manifest maps pages to critical CSS files, so each kind of page gets
+CSS extracted from a page built with the same template. An entry lists
+either exact site-relative "pages" (layout clusters) or a glob "pattern"
+(sections); exact pages are checked first, then patterns in order:
+
+    {
+      "version": 1,
+      "default": "root.css",
+      "pages": [
+        {"pattern": "blog/index.html", "css": "blog.list.css", "sample": "blog/index.html"},
+        {"pattern": "blog/*", "css": "blog.single.css", "sample": "blog/first-post/index.html"},
+        {"pages": ["gallery/a/index.html", ...], "css": "cluster-1f2e.css", "sample": "gallery/a/index.html"}
+      ]
+    }
+
+CSS paths are relative to the manifest file.
+"""
+
+import json
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+# Template group for pages at the top level of the site (index.html, 404.html)
+ROOT_GROUP = "root"
+
+
+def template_groups(site_dir: Path, pattern: str = "**/*.html") -> Dict[str, dict]:
+    """
+    Group site pages by the Hugo template that most likely rendered them.
+
+    Top-level pages form the root group; in each section, the section's own
+    index.html is its list page and everything below it a single page.
+
+    Returns:
+        Ordered mapping of group name -> {'pattern': glob, 'pages': [paths]};
+        more specific groups come first
+    """
+    groups = {}
+    for path in sorted(site_dir.glob(pattern)):
+        rel_path = path.relative_to(site_dir)
+        if len(rel_path.parts) == 1:
+            continue
+        section = rel_path.parts[0]
+        if len(rel_path.parts) == 2 and rel_path.name == "index.html":
+            name, glob = f"{section}.list", f"{section}/index.html"
+        else:
+            name, glob = f"{section}.single", f"{section}/*"
+        groups.setdefault(name, {'pattern': glob, 'pages': []})['pages'].append(rel_path.as_posix())
+
+    # List pages must be matched before their section's catch-all glob
+    ordered = dict(sorted(groups.items(), key=lambda item: not item[0].endswith('.list')))
+    root_pages = [
+        path.relative_to(site_dir).as_posix()
+        for path in sorted(site_dir.glob("*.html"))
+    ]
+    if root_pages:
+        # index.html first, so it is the sample for the root group
+        root_pages.sort(key=lambda page: page != "index.html")
+        ordered[ROOT_GROUP] = {'pattern': "*", 'pages': root_pages}
+    return ordered
+
+
+def write_manifest(output_dir: Path, entries: List[dict], default: Optional[str] = None) -> Path:
+    """Write manifest.json with the given page entries into output_dir."""
+    manifest_path = output_dir / MANIFEST_NAME
+    data = {'version': MANIFEST_VERSION, 'default': default, 'pages': entries}
+    manifest_path.write_text(json.dumps(data, indent=2))
+    return manifest_path
+
+
+class CriticalCSSManifest:
+    """Page -> critical CSS lookup backed by a manifest file."""
+
+    def __init__(self, manifest_path: Path):
+        data = json.loads(manifest_path.read_text())
+        if data.get('version') != MANIFEST_VERSION:
+            raise ValueError(
+                f"Unsupported manifest version in {manifest_path}: {data.get('version')!r}"
+            )
+        self.base_dir = manifest_path.parent
+        self.entries = data.get('pages', [])
+        self.default = data.get('default')
+        self._exact = {
+            page: entry['css'] for entry in self.entries for page in entry.get('pages', ())
+        }
+        self._patterns = [entry for entry in self.entries if 'pattern' in entry]
+        self._css = {}
+
+    def css_file_for(self, rel_path: str) -> Optional[str]:
+        """Manifest CSS file for a site-relative page path, or None."""
+        if rel_path in self._exact:
+            return self._exact[rel_path]
+        for entry in self._patterns:
+            if fnmatchcase(rel_path, entry['pattern']):
+                return entry['css']
+        return self.default
+
+    def css_for(self, rel_path: str) -> Optional[str]:
+        """Critical CSS for a site-relative page path, or None if nothing matches."""
+        css_file = self.css_file_for(rel_path)
+        if css_file is None:
+            return None
+        if css_file not in self._css:
+            self._css[css_file] = (self.base_dir / css_file).read_text()
+        return self._css[css_file]
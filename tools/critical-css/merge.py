@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Merge per-viewport critical CSS into one minified stylesheet.
+
+extract.py produces one list of rules per viewport (serialized by the
+browser, so identical rules have identical text). Rules found at both
+viewports are kept once; rules found only at the desktop or only at the
+mobile viewport are wrapped in a min-width / max-width @media block around
+a breakpoint. Rule order is preserved with a sequence diff, so the cascade
+is unchanged for either form factor.
+"""
+
+import difflib
+from typing import List, Tuple
+
+
+# Semantic UI's tablet breakpoint: mobile is up to 767px
+MOBILE_BREAKPOINT = 768
+
+# At-rules whose blocks contain rules (or keyframes) rather than declarations
+GROUPING_AT_RULES = (
+    '@media', '@supports', '@document', '@-moz-document', '@layer', '@container',
+    '@scope', '@keyframes', '@-webkit-keyframes',
+)
+
+# At-rules that have to stay at the top level, before other rules
+HOISTED_AT_RULES = ('@charset', '@import', '@namespace')
+
+
+def _skip_string(css: str, start: int) -> int:
+    """Index just past the string literal starting at start."""
+    quote = css[start]
+    i = start + 1
+    while i < len(css):
+        if css[i] == '\\':
+            i += 2
+            continue
+        if css[i] == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def split_rules(css: str) -> List[str]:
+    """
+    Split a stylesheet into its top-level rules, dropping comments.
+
+    Handles nested blocks, strings and comments; statement at-rules
+    (@import ...;) end at their semicolon.
+    """
+    rules = []
+    depth = 0
+    start = None
+    i = 0
+    n = len(css)
+    while i < n:
+        char = css[i]
+        if char == '/' and css.startswith('/*', i):
+            # Comments between rules are dropped; inside a rule they stay
+            # part of its text
+            end = css.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        if start is None:
+            if char.isspace():
+                i += 1
+                continue
+            start = i
+        if char in '"\'':
+            i = _skip_string(css, i)
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth <= 0:
+                depth = 0
+                rules.append(css[start:i + 1].strip())
+                start = None
+        elif char == ';' and depth == 0:
+            rules.append(css[start:i + 1].strip())
+            start = None
+        i += 1
+    if start is not None and css[start:].strip():
+        rules.append(css[start:].strip())
+    return rules
+
+
+def minify_css(css: str) -> str:
+    """
+    Whitespace-minify CSS without changing its meaning.
+
+    Collapses whitespace, drops it around braces, semicolons and commas and
+    after the colon of declarations, and removes the last semicolon of each
+    block. Comments are removed; strings are copied verbatim.
+    """
+    out = []
+    # One entry per open block: True for declaration blocks
+    blocks = []
+    prelude_start = 0
+    pending_space = False
+    i = 0
+    n = len(css)
+    while i < n:
+        char = css[i]
+        if char == '/' and css.startswith('/*', i):
+            end = css.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            pending_space = True
+            continue
+        if char.isspace():
+            pending_space = True
+            i += 1
+            continue
+
+        if char in '{};,':
+            pending_space = False
+            if char == '}' and out and out[-1] == ';':
+                out.pop()
+            if char == '{':
+                prelude = ''.join(out[prelude_start:]).strip().lower()
+                blocks.append(not prelude.startswith(GROUPING_AT_RULES))
+            elif char == '}' and blocks:
+                blocks.pop()
+            out.append(char)
+            if char in '{};':
+                prelude_start = len(out)
+            i += 1
+            continue
+
+        if pending_space and out and out[-1] not in '{};,' and not (
+            out[-1] == ':' and blocks and blocks[-1]
+        ):
+            out.append(' ')
+        pending_space = False
+
+        if char in '"\'':
+            end = _skip_string(css, i)
+            out.append(css[i:end])
+            i = end
+            continue
+
+        out.append(char)
+        i += 1
+    return ''.join(out).strip()
+
+
+def merge_viewport_rules(
+    desktop_css: str,
+    mobile_css: str,
+    breakpoint: int = MOBILE_BREAKPOINT
+) -> Tuple[str, dict]:
+    """
+    Merge desktop and mobile critical CSS, deduplicating shared rules.
+
+    Args:
+        desktop_css: Critical CSS extracted at the desktop viewport
+        mobile_css: Critical CSS extracted at the mobile viewport
+        breakpoint: Width in px from which the desktop-only rules apply;
+            mobile-only rules apply below it
+
+    Returns:
+        (minified merged CSS, stats dict with rule counts and the sizes of
+        the merged and the plain concatenated CSS)
+    """
+    desktop_rules = split_rules(desktop_css)
+    mobile_rules = split_rules(mobile_css)
+    desktop_media = f"@media (min-width:{breakpoint}px)"
+    mobile_media = f"@media (max-width:{breakpoint - 1}px)"
+
+    hoisted = []
+    pieces = []
+
+    def add_only(rules, media):
+        wrapped = []
+        for rule in rules:
+            if rule.lower().startswith(HOISTED_AT_RULES):
+                if rule not in hoisted:
+                    hoisted.append(rule)
+            else:
+                wrapped.append(rule)
+        if wrapped:
+            pieces.append(media + '{' + '\n'.join(wrapped) + '}')
+
+    matcher = difflib.SequenceMatcher(None, desktop_rules, mobile_rules, autojunk=False)
+    shared = 0
+    for tag, d_start, d_end, m_start, m_end in matcher.get_opcodes():
+        if tag == 'equal':
+            for rule in desktop_rules[d_start:d_end]:
+                if rule.lower().startswith(HOISTED_AT_RULES):
+                    if rule not in hoisted:
+                        hoisted.append(rule)
+                else:
+                    pieces.append(rule)
+            shared += d_end - d_start
+            continue
+        add_only(desktop_rules[d_start:d_end], desktop_media)
+        add_only(mobile_rules[m_start:m_end], mobile_media)
+
+    merged = minify_css('\n'.join(hoisted + pieces))
+    concatenated_size = len(desktop_css.encode('utf-8')) + len(mobile_css.encode('utf-8'))
+    merged_size = len(merged.encode('utf-8'))
+    stats = {
+        'desktop_rules': len(desktop_rules),
+        'mobile_rules': len(mobile_rules),
+        'shared_rules': shared,
+        'desktop_only_rules': len(desktop_rules) - shared,
+        'mobile_only_rules': len(mobile_rules) - shared,
+        'concatenated_size': concatenated_size,
+        'merged_size': merged_size,
+        'saved_bytes': concatenated_size - merged_size,
+    }
+    return merged, stats
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Serve a built site to Playwright from memory, without temp files.
+
+Pages are loaded from a fake http origin whose requests are fulfilled by
+Playwright request routing straight from the site directory. Because the
+page and its stylesheets share one origin, the stylesheets' rules are
+readable in the page without rewriting the HTML (compare
+extract.prepare_file_url_with_inlined_styles, which inlines them into a temp
+file). Stylesheets and other assets are read from disk once and kept in
+memory for every page and viewport.
+"""
+
+import re
+import hashlib
+import mimetypes
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote, urljoin, urlparse
+
+
+ORIGIN = "http://critical-css.local"
+
+LINK_TAG_PATTERN = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+ATTR_PATTERN = re.compile(r'''([a-zA-Z-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''')
+
+
+def _stylesheet_hrefs(html: str):
+    """hrefs of the <link rel="stylesheet"> tags in a page, in order."""
+    for tag in LINK_TAG_PATTERN.finditer(html):
+        attrs = {
+            # Only one of the value groups matched; the others are empty
+            name.lower(): ''.join(values)
+            for name, *values in ATTR_PATTERN.findall(tag.group(0))
+        }
+        if 'stylesheet' in attrs.get('rel', '').lower().split() and attrs.get('href'):
+            yield attrs['href']
+
+
+class SiteRouter:
+    """
+    Request handler serving site_dir under ORIGIN.
+
+    Usage:
+        router = SiteRouter(site_dir)
+        context.route(f"{ORIGIN}/**", router.handle)
+        page.goto(router.url_for(file_url))
+    """
+
+    def __init__(self, site_dir: Path):
+        self.site_dir = Path(site_dir).resolve()
+        self.requests = 0
+        self.disk_reads = 0
+        self._assets: Dict[Path, Optional[bytes]] = {}
+
+    def url_for(self, file_url: str) -> Optional[str]:
+        """Routed URL for a file:// URL inside the site, or None."""
+        parsed = urlparse(file_url)
+        if parsed.scheme != 'file':
+            return None
+        try:
+            rel_path = Path(unquote(parsed.path)).resolve().relative_to(self.site_dir)
+        except ValueError:
+            return None
+        return f"{ORIGIN}/{rel_path.as_posix()}"
+
+    def _resolve(self, url: str) -> Optional[Path]:
+        """Site file for a routed URL (directories map to their index.html)."""
+        path = (self.site_dir / unquote(urlparse(url).path).lstrip('/')).resolve()
+        if path != self.site_dir and self.site_dir not in path.parents:
+            return None
+        if path.is_dir():
+            path = path / "index.html"
+        return path
+
+    def read(self, url: str) -> Optional[bytes]:
+        """Body for a routed URL; anything but HTML is read once and cached."""
+        path = self._resolve(url)
+        if path is None:
+            return None
+        if path in self._assets:
+            return self._assets[path]
+        try:
+            body = path.read_bytes()
+        except OSError:
+            body = None
+        self.disk_reads += 1
+        if path.suffix != '.html':
+            self._assets[path] = body
+        return body
+
+    def response(self, url: str) -> Tuple[int, Dict[str, str], bytes]:
+        """(status, headers, body) for a routed request."""
+        self.requests += 1
+        body = self.read(url)
+        if body is None:
+            return 404, {'content-type': 'text/plain'}, b"Not found"
+        content_type = mimetypes.guess_type(self._resolve(url).name)[0] or 'application/octet-stream'
+        return 200, {'content-type': content_type}, body
+
+    def handle(self, route):
+        """Sync Playwright route handler."""
+        status, headers, body = self.response(route.request.url)
+        route.fulfill(status=status, headers=headers, body=body)
+
+    async def handle_async(self, route):
+        """Async Playwright route handler."""
+        status, headers, body = self.response(route.request.url)
+        await route.fulfill(status=status, headers=headers, body=body)
+
+    def content_digest(self, url: str) -> Optional[bytes]:
+        """
+        Hash of a routed page and its same-origin stylesheets.
+
+        Used as the result cache key in place of the inlined temp file.
+        Returns None if the page cannot be read.
+        """
+        html = self.read(url)
+        if html is None:
+            return None
+        digest = hashlib.blake2b(html, digest_size=20)
+        for href in _stylesheet_hrefs(html.decode('utf-8', errors='replace')):
+            stylesheet_url = urljoin(url, href)
+            if not stylesheet_url.startswith(ORIGIN + '/'):
+                # Remote stylesheets are not part of the key
+                digest.update(stylesheet_url.encode('utf-8'))
+                continue
+            digest.update(b'\0' + (self.read(stylesheet_url) or b''))
+        return digest.digest()
+
+    def report(self):
+        """Print request and disk read counts."""
+        print(
+            f"📂 Served {self.requests} requests from {self.site_dir} "
+            f"with {self.disk_reads} disk reads ({len(self._assets)} assets cached in memory)"
+        )
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Compare critical CSS loading strategies on a local nginx container.
+
+For each strategy, a copy of the built site is rewritten by inline.py and
+served by nginx:latest (the base of the Dockerfile's final stage; see
+--image) with the production nginx.conf and default.conf from
+deployment/personal-website/files mounted in. Each page is then loaded in headless
+Chromium with Lighthouse's mobile throttling (150 ms RTT, 1.6 Mbps down, 4x
+CPU slowdown, Moto G Power viewport), and the median paint and load timings
+over several cold runs are reported per strategy. The unmodified site is
+measured as the 'original' baseline.
+
+Requires docker and Playwright's Chromium (see install_browsers.py).
+"""
+
+import io
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import contextlib
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from playwright.sync_api import sync_playwright
+
+from inline import STRATEGIES, PRELOAD_RATIO, process_directory
+from manifest import CriticalCSSManifest
+
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+NGINX_FILES = REPO_ROOT / "deployment" / "personal-website" / "files"
+
+# Lighthouse's default mobile settings
+VIEWPORT = {'width': 412, 'height': 823}
+RTT_MS = 150
+DOWNLOAD_KBPS = 1638.4
+UPLOAD_KBPS = 675
+CPU_SLOWDOWN = 4
+
+METRICS = ('fcp', 'lcp', 'cls', 'dcl', 'load', 'css_end')
+
+# Reads the timings of the loaded page; observers are buffered, so entries
+# from before the call are included
+COLLECT_METRICS_JS = """() => new Promise(resolve => {
+    let lcp = null;
+    let cls = 0;
+    new PerformanceObserver(list => {
+        const entries = list.getEntries();
+        lcp = entries[entries.length - 1].startTime;
+    }).observe({type: 'largest-contentful-paint', buffered: true});
+    new PerformanceObserver(list => {
+        for (const entry of list.getEntries()) {
+            if (!entry.hadRecentInput) cls += entry.value;
+        }
+    }).observe({type: 'layout-shift', buffered: true});
+
+    // Buffered entries are delivered asynchronously
+    requestAnimationFrame(() => setTimeout(() => {
+        const nav = performance.getEntriesByType('navigation')[0];
+        const fcp = performance.getEntriesByName('first-contentful-paint')[0];
+        const css = performance.getEntriesByType('resource')
+            .filter(entry => /\\.css(\\?|#|$)/.test(entry.name))
+            .map(entry => entry.responseEnd);
+        resolve({
+            fcp: fcp ? fcp.startTime : null,
+            lcp: lcp,
+            cls: cls,
+            dcl: nav.domContentLoadedEventEnd,
+            load: nav.loadEventEnd,
+            css_end: css.length ? Math.max(...css) : null,
+        });
+    }, 0));
+})"""
+
+
+def free_port() -> int:
+    """A free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def nginx_container(site_dir: Path, image: str, nginx_dir: Path = NGINX_FILES, timeout: float = 30):
+    """
+    Serve site_dir with the nginx.conf and default.conf in nginx_dir; yields
+    the base URL.
+    """
+    port = free_port()
+    container_id = subprocess.run(
+        [
+            "docker", "run", "-d", "--rm",
+            "-p", f"127.0.0.1:{port}:80",
+            "-v", f"{site_dir.resolve()}:/usr/share/nginx/html:ro",
+            "-v", f"{nginx_dir.resolve() / 'nginx.conf'}:/etc/nginx/nginx.conf:ro",
+            "-v", f"{nginx_dir.resolve() / 'default.conf'}:/etc/nginx/conf.d/default.conf:ro",
+            image,
+        ],
+        check=True, capture_output=True, text=True
+    ).stdout.strip()
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with urllib.request.urlopen(f"{base_url}/healthz", timeout=1):
+                    break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"nginx did not become healthy within {timeout:.0f} s")
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        subprocess.run(["docker", "stop", container_id], capture_output=True)
+
+
+def measure_page(browser, url: str) -> Dict[str, Optional[float]]:
+    """Timings of one cold, throttled load of url."""
+    context = browser.new_context(viewport=VIEWPORT, is_mobile=True, has_touch=True)
+    try:
+        page = context.new_page()
+        cdp = context.new_cdp_session(page)
+        cdp.send("Network.enable")
+        cdp.send("Network.setCacheDisabled", {'cacheDisabled': True})
+        cdp.send("Network.emulateNetworkConditions", {
+            'offline': False,
+            'latency': RTT_MS,
+            'downloadThroughput': DOWNLOAD_KBPS * 1024 / 8,
+            'uploadThroughput': UPLOAD_KBPS * 1024 / 8,
+        })
+        cdp.send("Emulation.setCPUThrottlingRate", {'rate': CPU_SLOWDOWN})
+        page.goto(url, wait_until="load")
+        page.wait_for_load_state("networkidle")
+        return page.evaluate(COLLECT_METRICS_JS)
+    finally:
+        context.close()
+
+
+def median(values: List[Optional[float]]) -> Optional[float]:
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def prepare_variant(
+    site_dir: Path,
+    variant_dir: Path,
+    strategy: str,
+    critical_css: str,
+    manifest: Optional[CriticalCSSManifest],
+    preload_ratio: float
+):
+    """Copy the site and inline critical CSS into it with one strategy."""
+    shutil.copytree(site_dir, variant_dir)
+    if strategy == "original":
+        return
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        processed = process_directory(
+            variant_dir, critical_css, variant_dir, manifest=manifest,
+            strategy=strategy, preload_ratio=preload_ratio
+        )
+    if processed == 0:
+        raise RuntimeError(f"inline.py processed no pages for {strategy}:\n{log.getvalue()}")
+
+
+def run_timings(
+    site_dir: Path,
+    critical_css: str,
+    pages: List[str],
+    strategies: List[str],
+    runs: int,
+    image: str,
+    manifest: Optional[CriticalCSSManifest] = None,
+    preload_ratio: float = PRELOAD_RATIO,
+    nginx_dir: Path = NGINX_FILES
+) -> dict:
+    """
+    Measure each page under each strategy.
+
+    Returns:
+        {strategy: {page: {metric: median ms (cls: score), 'runs': [...]}}}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="critical-css-timing-") as work_dir, \
+            sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        try:
+            for strategy in strategies:
+                print(f"\n⏱️  {strategy}")
+                variant_dir = Path(work_dir) / strategy
+                prepare_variant(site_dir, variant_dir, strategy, critical_css, manifest, preload_ratio)
+                results[strategy] = {}
+                with nginx_container(variant_dir, image, nginx_dir) as base_url:
+                    for page_path in pages:
+                        url = base_url + '/' + page_path.lstrip('/')
+                        samples = []
+                        for run in range(runs):
+                            samples.append(measure_page(browser, url))
+                            print(f"  {page_path} run {run + 1}/{runs}: FCP {samples[-1]['fcp']} ms")
+                        summary = {
+                            metric: median([sample[metric] for sample in samples])
+                            for metric in METRICS
+                        }
+                        summary['runs'] = samples
+                        results[strategy][page_path] = summary
+        finally:
+            browser.close()
+    return results
+
+
+def print_table(results: dict):
+    """Print median timings per page and strategy."""
+    def cell(value, digits=0):
+        return "-" if value is None else f"{value:.{digits}f}"
+
+    print("\n" + "=" * 60)
+    print("Median timings (ms; CLS unitless)")
+    print("=" * 60)
+    pages = next(iter(results.values())).keys()
+    for page_path in pages:
+        print(f"\n{page_path}")
+        print(f"  {'strategy':<10} {'FCP':>7} {'LCP':>7} {'CLS':>6} {'DCL':>7} {'load':>7} {'CSS end':>8}")
+        for strategy, page_results in results.items():
+            summary = page_results[page_path]
+            print(
+                f"  {strategy:<10} {cell(summary['fcp']):>7} {cell(summary['lcp']):>7} "
+                f"{cell(summary['cls'], 3):>6} {cell(summary['dcl']):>7} "
+                f"{cell(summary['load']):>7} {cell(summary['css_end']):>8}"
+            )
+    print("=" * 60)
+
+
+def main():
+    """CLI entry point."""
+    parser = argparse.ArgumentParser(
+        description="Compare critical CSS loading strategies on a throttled local nginx"
+    )
+    parser.add_argument(
+        "site_dir",
+        type=Path,
+        help="Built site without critical CSS (e.g. public/)"
+    )
+    parser.add_argument(
+        "critical_css",
+        type=Path,
+        help="File containing critical CSS to inline"
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help="manifest.json from extract.py --manifest"
+    )
+    parser.add_argument(
+        "--page",
+        action="append",
+        dest="pages",
+        help="Site path to measure; may be repeated (default: /)"
+    )
+    parser.add_argument(
+        "--strategy",
+        action="append",
+        dest="strategies",
+        choices=("original",) + STRATEGIES,
+        help="Variant to measure; may be repeated (default: all, plus the original site)"
+    )
+    parser.add_argument(
+        "--preload-ratio",
+        type=float,
+        default=PRELOAD_RATIO,
+        help=f"Ratio for --strategy auto, see inline.py (default: {PRELOAD_RATIO})"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Cold loads per page and strategy; medians are reported (default: 5)"
+    )
+    parser.add_argument(
+        "--image",
+        default="nginx:latest",
+        help="nginx image to serve the site with (default: nginx:latest, which the "
+             "production image is built on)"
+    )
+    parser.add_argument(
+        "--nginx-dir",
+        type=Path,
+        default=NGINX_FILES,
+        help="Directory with the nginx.conf and default.conf to serve with "
+             "(default: deployment/personal-website/files)"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        type=Path,
+        help="Write all samples and medians as JSON"
+    )
+
+    args = parser.parse_args()
+
+    if not args.site_dir.is_dir():
+        parser.error(f"site_dir is not a directory: {args.site_dir}")
+    if args.runs < 1:
+        parser.error("--runs must be at least 1")
+
+    try:
+        critical_css = args.critical_css.read_text()
+        manifest = CriticalCSSManifest(args.manifest) if args.manifest else None
+        results = run_timings(
+            args.site_dir,
+            critical_css,
+            args.pages or ["/"],
+            args.strategies or ["original", *STRATEGIES],
+            args.runs,
+            args.image,
+            manifest,
+            args.preload_ratio,
+            args.nginx_dir
+        )
+        print_table(results)
+        if args.output:
+            args.output.write_text(json.dumps(results, indent=2))
+            print(f"✅ Saved timings to: {args.output}")
+        return 0
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,10 +8,33 @@ Generates report and safelist for dynamic classes.
 
 import re
 import sys
+import csv
+import time
+import argparse
 from pathlib import Path
 from collections import defaultdict
 import json
 
+from css_parser import COMMENT_PATTERN
+from dom_index import build_dom_index
+from safelist import SAFELIST_FILE, SafelistMatcher, load_safelist
+from rule_index import GROUP, LICENSE, NO_PARENT, RULE, RuleIndex, selector_requirements
+from scan import find_site_files, scan_files
+from token_index import TokenIndex
+from usage import (
+    MATCH_MODES, collect_script_tokens, collect_used_selectors, dom_selector_matches,
+)
+
+
+# Semantic UI / Fomantic-UI component headers, e.g. "# Semantic UI 2.4.2 - Button"
+COMPONENT_HEADER_PATTERN = re.compile(
+    r'#\s*(?:Semantic UI|Fomantic-UI)\b[^\n]*?-\s*([A-Za-z][\w ]*?)\s*$',
+    re.MULTILINE,
+)
+NO_COMPONENT = '(none)'
+TOP_LEVEL = '(top level)'
+RULE_STATUSES = ('used', 'unused', 'safelisted')
+
 
 def extract_html_classes_and_ids(html_content):
     """Extract all class names and IDs from HTML content."""
@@ -31,274 +54,252 @@ def extract_html_classes_and_ids(html_content):
     return classes, ids
 
 
-def extract_css_selectors(css_content):
-    """Extract CSS selectors from CSS content."""
+def extract_css_selectors(css_content, index):
+    """Extract complete CSS selectors (whitespace-normalized) from CSS content."""
     selectors = set()
-
-    # Remove comments
-    css_content = re.sub(r'/\*.*?\*/', '', css_content, flags=re.DOTALL)
-
-    # Extract selectors (simple approach - matches most common patterns)
-    # Matches: .class, #id, element, .class:hover, etc.
-    selector_pattern = r'([.#]?[\w\-_]+(?::[\w\-_]+)?(?:\[[\w\-_="]+\])?)\s*[,{]'
-
-    for match in re.finditer(selector_pattern, css_content):
-        selector = match.group(1).strip()
-        if selector and not selector.startswith('@'):
-            selectors.add(selector)
-
+    for node_id in index.rule_node:
+        prelude = css_content[index.node_start[node_id]:index.node_block_start[node_id]]
+        if '/*' in prelude:
+            prelude = COMMENT_PATTERN.sub('', prelude)
+        for selector in prelude.split(','):
+            selector = ' '.join(selector.split())
+            if selector and not selector.startswith('@'):
+                selectors.add(selector)
     return selectors
 
 
-def analyze_site(site_dir):
-    """Analyze site directory and return usage statistics."""
+def selector_is_kept(selector, used_classes, used_ids, safelist, selector_matches=None):
+    """
+    Whether prune.py keeps a single selector: every class/ID it needs is used
+    or safelisted and, with --match dom, it passes selector_matches too.
+    """
+    required = selector_requirements(selector)
+    if required is None:
+        return True
+    for token in required:
+        used = used_classes if token[0] == '.' else used_ids
+        if token[1:] not in used and not safelist.matches(token[1:]):
+            return False
+    return selector_matches is None or selector_matches(selector)
+
+
+class ByteAttribution:
+    """
+    Per-rule byte sizes in columnar form.
+
+    String columns are dictionary-encoded (a list of distinct values plus one
+    integer code per rule) to keep the JSON output compact.
+    """
+
+    STRING_COLUMNS = ('file', 'at_rule', 'component', 'status')
+
+    def __init__(self):
+        self.dictionaries = {column: [] for column in self.STRING_COLUMNS}
+        self._codes = {column: {} for column in self.STRING_COLUMNS}
+        self.columns = {column: [] for column in self.STRING_COLUMNS + ('selector', 'bytes')}
+
+    def _encode(self, column, value):
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.dictionaries[column])
+            self.dictionaries[column].append(value)
+        return code
+
+    def add(self, file, at_rule, component, status, selector, size):
+        for column, value in zip(self.STRING_COLUMNS, (file, at_rule, component, status)):
+            self.columns[column].append(self._encode(column, value))
+        self.columns['selector'].append(selector)
+        self.columns['bytes'].append(size)
+
+    def __len__(self):
+        return len(self.columns['bytes'])
+
+    def totals(self, column):
+        """Bytes per status for each value of a string column."""
+        names = self.dictionaries[column]
+        statuses = self.dictionaries['status']
+        totals = {name: dict.fromkeys(RULE_STATUSES, 0) for name in names}
+        for code, status, size in zip(self.columns[column], self.columns['status'], self.columns['bytes']):
+            totals[names[code]][statuses[status]] += size
+        return totals
+
+    def to_dict(self):
+        return {'rows': len(self), 'dictionaries': self.dictionaries, 'columns': self.columns}
+
+    def write(self, path):
+        """Write as CSV (one row per rule) if path ends in .csv, else columnar JSON."""
+        path = Path(path)
+        if path.suffix.lower() == '.csv':
+            with path.open('w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(self.STRING_COLUMNS + ('selector', 'bytes'))
+                for row in range(len(self)):
+                    writer.writerow(
+                        [self.dictionaries[c][self.columns[c][row]] for c in self.STRING_COLUMNS]
+                        + [self.columns['selector'][row], self.columns['bytes'][row]]
+                    )
+        else:
+            path.write_text(json.dumps(self.to_dict(), separators=(',', ':')), encoding='utf-8')
+
+
+def attribute_css_bytes(
+    css_file, css_content, index, used_classes, used_ids, safelist, attribution,
+    used_matches=None, kept_matches=None,
+):
+    """
+    Record every style rule in a stylesheet with its exact size and status.
+
+    index is the RuleIndex built from css_content.
+    Status is 'unused' for rules prune.py drops, 'safelisted' for rules it
+    only keeps because of the safelist, and 'used' otherwise. used_classes
+    and used_ids are prune's token sets (usage.collect_used_selectors);
+    kept_matches is prune's selector_matches and used_matches the same check
+    without the safelist (see usage.dom_selector_matches), both None for
+    --match tokens. Rules are grouped by their enclosing @media/@supports
+    chain and by the Semantic UI component header comment that precedes
+    them in the file.
+    """
+    used = index.evaluate(used_classes, used_ids, SafelistMatcher([]), css_content, used_matches)
+    kept = index.evaluate(used_classes, used_ids, safelist, css_content, kept_matches)
+
+    at_rules = {NO_PARENT: TOP_LEVEL}
+    component = NO_COMPONENT
+    rule_id = 0
+    for node_id, kind in enumerate(index.node_kind):
+        start = index.node_start[node_id]
+        if kind == LICENSE:
+            header = COMPONENT_HEADER_PATTERN.search(css_content, start, index.node_end[node_id])
+            if header:
+                component = header.group(1)
+        elif kind == GROUP:
+            parent = at_rules[index.node_parent[node_id]]
+            prelude = ' '.join(css_content[start:index.node_block_start[node_id]].split())
+            at_rules[node_id] = prelude if parent == TOP_LEVEL else f"{parent} > {prelude}"
+        elif kind == RULE:
+            if used[rule_id]:
+                status = 'used'
+            elif kept[rule_id]:
+                status = 'safelisted'
+            else:
+                status = 'unused'
+            selector = ' '.join(css_content[start:index.node_block_start[node_id]].split())
+            size = len(css_content[start:index.node_end[node_id]].encode('utf-8'))
+            attribution.add(
+                css_file, at_rules[index.node_parent[node_id]], component, status, selector, size
+            )
+            rule_id += 1
+
+
+# Token index namespace; bump when extract_html_classes_and_ids changes
+HTML_NAMESPACE = 'analyze.extract_html_classes_and_ids/v1'
+
+
+def _scan_html_file(html_file):
+    """Extract classes and IDs from one HTML file (process pool worker entry point)."""
+    return extract_html_classes_and_ids(html_file.read_text(encoding='utf-8'))
+
+
+def analyze_site(site_dir, jobs=1, token_index=None, safelist=None, match='tokens'):
+    """
+    Analyze site directory and return usage statistics.
+
+    safelist is a SafelistMatcher; the default is the shared safelist.json
+    that prune.py uses. match is prune.py's --match mode ('tokens' or 'dom');
+    selectors and rule bytes count as used exactly when prune would keep them.
+
+    jobs > 1 scans HTML files in a process pool (0 means one worker per CPU).
+    With a TokenIndex, only HTML files that changed are re-scanned.
+    """
     site_path = Path(site_dir)
+    timings = {}
+    if safelist is None:
+        safelist = load_safelist()
 
     # Collect all used classes and IDs from HTML
-    all_classes = set()
-    all_ids = set()
-    html_files = list(site_path.rglob('*.html'))
+    start = time.perf_counter()
+    html_files = find_site_files(site_path, ['*.html'])
 
     print(f"Analyzing {len(html_files)} HTML files...")
-    for html_file in html_files:
-        try:
-            content = html_file.read_text(encoding='utf-8')
-            classes, ids = extract_html_classes_and_ids(content)
-            all_classes.update(classes)
-            all_ids.update(ids)
-        except Exception as e:
-            print(f"Warning: Could not read {html_file}: {e}", file=sys.stderr)
+    if token_index is not None:
+        result, index_stats = token_index.scan(
+            site_path, html_files, _scan_html_file, HTML_NAMESPACE, fields=2, jobs=jobs
+        )
+        print(
+            f"Token index: {index_stats['reused']} files reused, "
+            f"{index_stats['rescanned']} rescanned, {index_stats['removed']} removed"
+        )
+    else:
+        result = scan_files(html_files, _scan_html_file, jobs)
+    all_classes, all_ids = result if result else (set(), set())
+    timings['html_scan'] = time.perf_counter() - start
 
     print(f"Found {len(all_classes)} unique classes and {len(all_ids)} unique IDs")
 
+    # prune.py's tokens: everything in HTML and JS counts as a class and an ID
+    start = time.perf_counter()
+    used_classes, used_ids = collect_used_selectors(site_path, jobs, token_index)
+    timings['token_scan'] = time.perf_counter() - start
+
+    # Same selector check as prune.py --match dom; with and without the
+    # safelist to tell used from safelisted rules
+    kept_matches = used_matches = None
+    if match == 'dom':
+        start = time.perf_counter()
+        dom_index = build_dom_index(site_path, jobs, token_index)
+        script_tokens = collect_script_tokens(site_path, jobs)
+        kept_matches = dom_selector_matches(dom_index, script_tokens, safelist)
+        used_matches = dom_selector_matches(dom_index, script_tokens, SafelistMatcher([]))
+        timings['dom_index'] = time.perf_counter() - start
+        print(f"Found {len(dom_index.signatures)} distinct element class/ID combinations")
+
     # Collect all CSS selectors
+    start = time.perf_counter()
     all_selectors = set()
     css_files = list(site_path.rglob('*.css'))
 
     print(f"Analyzing {len(css_files)} CSS files...")
     total_css_size = 0
+    css_contents = {}
 
     for css_file in css_files:
         try:
             content = css_file.read_text(encoding='utf-8')
-            selectors = extract_css_selectors(content)
-            all_selectors.update(selectors)
-            total_css_size += len(content)
+            index = RuleIndex.build(content)
+            all_selectors.update(extract_css_selectors(content, index))
+            total_css_size += len(content.encode('utf-8'))
+            css_contents[css_file.relative_to(site_path).as_posix()] = (content, index)
         except Exception as e:
             print(f"Warning: Could not read {css_file}: {e}", file=sys.stderr)
 
+    timings['css_parse'] = time.perf_counter() - start
     print(f"Found {len(all_selectors)} CSS selectors")
     print(f"Total CSS size: {total_css_size:,} bytes ({total_css_size/1024:.1f} KB)")
 
     # Analyze usage
+    start = time.perf_counter()
     used_selectors = set()
     unused_selectors = set()
 
     for selector in all_selectors:
-        # Check if selector matches any used class or ID
-        is_used = False
-
-        if selector.startswith('.'):
-            # Class selector
-            class_name = selector[1:].split(':')[0].split('[')[0]
-            if class_name in all_classes:
-                is_used = True
-        elif selector.startswith('#'):
-            # ID selector
-            id_name = selector[1:].split(':')[0].split('[')[0]
-            if id_name in all_ids:
-                is_used = True
-        else:
-            # Element selector or pseudo-selector - assume used
-            is_used = True
-
-        if is_used:
+        # Selectors without classes or IDs count as used
+        if selector_is_kept(selector, used_classes, used_ids, safelist, kept_matches):
             used_selectors.add(selector)
         else:
             unused_selectors.add(selector)
 
-    # Generate dynamic class safelist patterns - comprehensive Semantic UI support
-    safelist_patterns = [
-        # Generic state classes
-        r'^is-.*',
-        r'^has-.*',
-        r'^active$',
-        r'^disabled$',
-        r'^nav-.*',
-
-        # Semantic UI base components
-        r'^ui$',
-        r'^button$',
-        r'^buttons$',
-        r'^menu$',
-        r'^dropdown$',
-        r'^modal$',
-        r'^segment$',
-        r'^segments$',
-        r'^card$',
-        r'^cards$',
-        r'^form$',
-        r'^input$',
-        r'^label$',
-        r'^labels$',
-        r'^message$',
-        r'^messages$',
-        r'^icon$',
-        r'^icons$',
-        r'^image$',
-        r'^images$',
-        r'^container$',
-        r'^grid$',
-        r'^column$',
-        r'^row$',
-        r'^header$',
-        r'^divider$',
-        r'^list$',
-        r'^item$',
-        r'^items$',
-        r'^content$',
-        r'^description$',
-        r'^meta$',
-        r'^extra$',
-        r'^field$',
-        r'^fields$',
-        r'^accordion$',
-        r'^checkbox$',
-        r'^dimmer$',
-        r'^embed$',
-        r'^progress$',
-        r'^rating$',
-        r'^search$',
-        r'^sidebar$',
-        r'^sticky$',
-        r'^tab$',
-        r'^transition$',
-        r'^popup$',
-        r'^toast$',
-
-        # Semantic UI size modifiers
-        r'^mini$',
-        r'^tiny$',
-        r'^small$',
-        r'^medium$',
-        r'^large$',
-        r'^big$',
-        r'^huge$',
-        r'^massive$',
-
-        # Semantic UI color modifiers
-        r'^red$',
-        r'^orange$',
-        r'^yellow$',
-        r'^olive$',
-        r'^green$',
-        r'^teal$',
-        r'^blue$',
-        r'^violet$',
-        r'^purple$',
-        r'^pink$',
-        r'^brown$',
-        r'^grey$',
-        r'^gray$',
-        r'^black$',
-        r'^white$',
-        r'^primary$',
-        r'^secondary$',
-        r'^positive$',
-        r'^negative$',
-
-        # Semantic UI state modifiers
-        r'^loading$',
-        r'^hidden$',
-        r'^visible$',
-        r'^error$',
-        r'^warning$',
-        r'^success$',
-        r'^info$',
-        r'^animating$',
-        r'^transition$',
-        r'^hoverable$',
-        r'^selected$',
-        r'^read$',
-        r'^unread$',
-
-        # Semantic UI alignment & positioning
-        r'^left$',
-        r'^center$',
-        r'^right$',
-        r'^justified$',
-        r'^top$',
-        r'^middle$',
-        r'^bottom$',
-        r'^floated$',
-        r'^aligned$',
-        r'^attached$',
-
-        # Semantic UI layout modifiers
-        r'^fluid$',
-        r'^fitted$',
-        r'^padded$',
-        r'^compact$',
-        r'^relaxed$',
-        r'^divided$',
-        r'^celled$',
-        r'^inverted$',
-        r'^basic$',
-        r'^clearing$',
-        r'^stackable$',
-        r'^doubling$',
-        r'^stretched$',
-        r'^equal$',
-
-        # Semantic UI width classes (grid system)
-        r'^wide$',
-        r'^one$',
-        r'^two$',
-        r'^three$',
-        r'^four$',
-        r'^five$',
-        r'^six$',
-        r'^seven$',
-        r'^eight$',
-        r'^nine$',
-        r'^ten$',
-        r'^eleven$',
-        r'^twelve$',
-        r'^thirteen$',
-        r'^fourteen$',
-        r'^fifteen$',
-        r'^sixteen$',
-
-        # Semantic UI orientation & direction
-        r'^vertical$',
-        r'^horizontal$',
-        r'^pointing$',
-        r'^inline$',
-        r'^block$',
-
-        # Semantic UI image modifiers
-        r'^avatar$',
-        r'^bordered$',
-        r'^circular$',
-        r'^rounded$',
-        r'^spaced$',
-
-        # Semantic UI text modifiers
-        r'^truncate$',
-        r'^fitted$',
-
-        # Semantic UI responsive classes
-        r'^mobile$',
-        r'^tablet$',
-        r'^computer$',
-        r'^largescreen$',
-        r'^widescreen$',
-        r'^only$',
-
-        # Semantic UI utility patterns (prefix-based)
-        r'^ui-.*',
-        r'^semantic-.*',
-    ]
+    timings['match'] = time.perf_counter() - start
+
+    # Attribute exact rule bytes to files, at-rules and components
+    start = time.perf_counter()
+    attribution = ByteAttribution()
+    for css_file, (content, index) in css_contents.items():
+        attribute_css_bytes(
+            css_file, content, index, used_classes, used_ids, safelist, attribution,
+            used_matches, kept_matches,
+        )
+    by_status = attribution.totals('status')
+    timings['attribution'] = time.perf_counter() - start
 
     # Calculate statistics
     used_count = len(used_selectors)
@@ -317,27 +318,79 @@ def analyze_site(site_dir):
         'used_selectors': used_count,
         'unused_selectors': unused_count,
         'unused_percentage': unused_percentage,
-        'safelist_patterns': safelist_patterns,
+        'match': match,
+        'safelist_patterns': safelist.patterns,
         'sample_unused': sorted(list(unused_selectors))[:20],
+        'rule_bytes': {status: sum(by_status.get(status, {}).values()) for status in RULE_STATUSES},
+        'bytes_by_file': attribution.totals('file'),
+        'bytes_by_at_rule': attribution.totals('at_rule'),
+        'bytes_by_component': attribution.totals('component'),
+        'attribution': attribution,
+        'timings': timings,
     }
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: analyze.py <site_directory>", file=sys.stderr)
-        sys.exit(1)
-
-    site_dir = sys.argv[1]
+    parser = argparse.ArgumentParser(
+        description="Analyze Hugo site output for used vs unused CSS selectors"
+    )
+    parser.add_argument("site_dir", help="Generated site directory to analyze")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for the HTML scan (0 = one per CPU, default: 1)"
+    )
+    parser.add_argument(
+        "--token-index",
+        type=Path,
+        help="SQLite token index; unchanged files reuse their cached tokens"
+    )
+    parser.add_argument(
+        "--safelist",
+        type=Path,
+        default=SAFELIST_FILE,
+        help="Safelist file of dynamic class patterns (default: safelist.json)"
+    )
+    parser.add_argument(
+        "--safelist-cache",
+        type=Path,
+        help="Directory to cache the compiled safelist in (default: compile it every run)"
+    )
+    parser.add_argument(
+        "--match",
+        choices=MATCH_MODES,
+        default="tokens",
+        help="Count selectors as used the way prune.py --match does (default: tokens)"
+    )
+    parser.add_argument(
+        "--attribution",
+        type=Path,
+        help="Write per-rule byte attribution (.csv, otherwise columnar JSON)"
+    )
+    args = parser.parse_args()
+
+    site_dir = args.site_dir
 
     if not Path(site_dir).exists():
         print(f"Error: Directory {site_dir} does not exist", file=sys.stderr)
         sys.exit(1)
 
+    try:
+        safelist = load_safelist(args.safelist, args.safelist_cache)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not load safelist {args.safelist}: {e}", file=sys.stderr)
+        sys.exit(1)
+
     print("=" * 60)
     print("PurgeCSS Analysis Report")
     print("=" * 60)
 
-    stats = analyze_site(site_dir)
+    if args.token_index:
+        with TokenIndex(args.token_index) as token_index:
+            stats = analyze_site(site_dir, args.jobs, token_index, safelist, args.match)
+    else:
+        stats = analyze_site(site_dir, args.jobs, safelist=safelist, match=args.match)
 
     print("\n📊 Statistics:")
     print(f"  HTML files analyzed: {stats['html_files']}")
@@ -345,14 +398,31 @@ def main():
     print(f"  Total CSS size: {stats['total_css_kb']:.1f} KB")
     print(f"  Classes found in HTML: {stats['classes_found']}")
     print(f"  IDs found in HTML: {stats['ids_found']}")
+    print(f"  Match mode: {stats['match']}")
     print(f"  Total CSS selectors: {stats['total_selectors']}")
     print(f"  Used selectors: {stats['used_selectors']}")
     print(f"  Unused selectors: {stats['unused_selectors']}")
     print(f"  Unused percentage: {stats['unused_percentage']:.1f}%")
 
-    if stats['unused_percentage'] > 30:
-        potential_savings = stats['total_css_kb'] * (stats['unused_percentage'] / 100)
-        print(f"\n💡 Potential savings: ~{potential_savings:.1f} KB ({stats['unused_percentage']:.0f}% reduction)")
+    rule_bytes = stats['rule_bytes']
+    print("\n📦 Rule bytes:")
+    for status in RULE_STATUSES:
+        print(f"  {status.capitalize()}: {rule_bytes[status]:,} bytes ({rule_bytes[status]/1024:.1f} KB)")
+
+    if rule_bytes['unused']:
+        unused_share = rule_bytes['unused'] / stats['total_css_size'] * 100 if stats['total_css_size'] else 0
+        print(f"\n💡 Potential savings: {rule_bytes['unused']/1024:.1f} KB ({unused_share:.0f}% reduction)")
+
+    print("\n🧩 Most unused bytes by component:")
+    components = sorted(
+        stats['bytes_by_component'].items(), key=lambda item: item[1]['unused'], reverse=True
+    )
+    for component, totals in components[:10]:
+        print(f"  {component}: {totals['unused']:,} unused / {sum(totals.values()):,} bytes")
+
+    print("\n⏱️  Timings:")
+    for phase, seconds in stats['timings'].items():
+        print(f"  {phase.replace('_', ' ').capitalize()}: {seconds * 1000:.1f} ms")
 
     print("\n🔒 Safelist patterns (for dynamic classes):")
     for pattern in stats['safelist_patterns']:
@@ -362,6 +432,11 @@ def main():
     for selector in stats['sample_unused']:
         print(f"  {selector}")
 
+    attribution = stats.pop('attribution')
+    if args.attribution:
+        attribution.write(args.attribution)
+        print(f"\n✅ Byte attribution ({len(attribution)} rules) saved to: {args.attribution}")
+
     # Output JSON for programmatic use
     output_file = Path("purgecss_analysis.json")
     with output_file.open('w') as f:
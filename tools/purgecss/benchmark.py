@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+PurgeCSS Benchmarks
+
+Micro-benchmarks for the pruning pipeline on synthetic, Semantic UI-like input.
+
+Usage:
+    benchmark.py safelist [--size-mb 1]
+    benchmark.py parser [--size-mb 4]
+    benchmark.py bundle [--size-mb 50]
+    benchmark.py index [--size-mb 2] [--prunes 10]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+from prune import prune_css
+from usage import extract_tokens, extract_file_tokens
+from rule_index import RuleIndex
+from safelist import SafelistMatcher, read_patterns
+from css_parser import parse_stylesheet, iter_rules
+
+
+SAFELIST_PATTERNS = read_patterns()
+
+
+# Vocabulary mixing safelisted Semantic UI names with site-specific ones
+SEMANTIC_WORDS = [
+    'ui', 'menu', 'item', 'button', 'segment', 'grid', 'column', 'inverted',
+    'large', 'red', 'active', 'header', 'content', 'ui-icon', 'is-open',
+    'nav-link', 'semantic-widget', 'stackable', 'sixteen', 'wide',
+]
+SITE_WORDS = [
+    'post', 'summary', 'gallery', 'project', 'card-body', 'footer', 'hero',
+    'tag', 'excerpt', 'meta-date', 'sidebar-nav', 'cv', 'timeline',
+]
+
+
+def _random_name(rng):
+    if rng.random() < 0.6:
+        return rng.choice(SEMANTIC_WORDS)
+    return f"{rng.choice(SITE_WORDS)}-{rng.randrange(5000)}"
+
+
+def _random_selector(rng):
+    compounds = []
+    for _ in range(rng.randint(1, 3)):
+        compound = ''.join(f".{_random_name(rng)}" for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.1:
+            compound += f"#{_random_name(rng)}"
+        if rng.random() < 0.2:
+            compound += ':hover'
+        compounds.append(compound)
+    return ' '.join(compounds)
+
+
+def _random_rule(rng):
+    selectors = ',\n'.join(_random_selector(rng) for _ in range(rng.randint(1, 4)))
+    return f"{selectors} {{\n  color: #{rng.randrange(0xffffff):06x};\n  margin: {rng.randrange(40)}px;\n}}\n"
+
+
+def generate_css(size_bytes, seed=0, nested=False):
+    """
+    Generate a synthetic stylesheet of roughly size_bytes characters.
+
+    With nested=True, some rules are wrapped in @media blocks and some of
+    those in a further @supports block, like Semantic UI's responsive rules.
+    """
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size_bytes:
+        roll = rng.random() if nested else 1.0
+        if roll < 0.1:
+            inner = ''.join(_random_rule(rng) for _ in range(rng.randint(2, 6)))
+            chunk = f"@media only screen and (max-width: {rng.randrange(320, 1200)}px) {{\n{inner}}}\n"
+        elif roll < 0.15:
+            inner = ''.join(_random_rule(rng) for _ in range(rng.randint(2, 6)))
+            chunk = (
+                f"@media (min-width: {rng.randrange(320, 1200)}px) {{\n"
+                f"@supports (display: grid) {{\n{inner}}}\n}}\n"
+            )
+        else:
+            chunk = _random_rule(rng)
+        parts.append(chunk)
+        total += len(chunk)
+    return ''.join(parts)
+
+
+# The rule pattern prune_css used before the streaming parser
+RULE_PATTERN = re.compile(r'([^{}]+)\s*\{([^{}]*(?:\{[^{}]*\}[^{}]*)*)\}')
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_safelist(args):
+    """Compare the per-pattern re.match loop with the compiled SafelistMatcher."""
+    css = generate_css(int(args.size_mb * 1024 * 1024))
+    # Same token stream prune_css checks: every class and ID in every selector
+    tokens = re.findall(r'[.#]([a-zA-Z0-9_-]+)', css)
+    print(f"Synthetic CSS: {len(css):,} bytes, {len(tokens):,} class/ID tokens")
+    print(f"Safelist: {len(SAFELIST_PATTERNS)} patterns")
+
+    def naive(tokens):
+        return [any(re.match(p, t) for p in SAFELIST_PATTERNS) for t in tokens]
+
+    def compiled(tokens):
+        matcher = SafelistMatcher(SAFELIST_PATTERNS)
+        return [matcher.matches(t) for t in tokens]
+
+    naive_result, naive_time = _timed(naive, tokens)
+    compiled_result, compiled_time = _timed(compiled, tokens)
+
+    if naive_result != compiled_result:
+        print("❌ Compiled matcher disagrees with re.match loop", file=sys.stderr)
+        return 1
+
+    print(f"  re.match loop:    {naive_time * 1000:10.1f} ms")
+    print(f"  SafelistMatcher:  {compiled_time * 1000:10.1f} ms")
+    print(f"  Speedup:          {naive_time / compiled_time:10.1f}x")
+    return 0
+
+
+def bench_parser(args):
+    """Compare the regex rule finder with the streaming parser in prune_css."""
+    css = generate_css(int(args.size_mb * 1024 * 1024), nested=True)
+    used = set(SEMANTIC_WORDS[:8]) | {f"post-{i}" for i in range(0, 5000, 3)}
+    print(f"Synthetic CSS: {len(css):,} bytes (with nested @media/@supports)")
+
+    # Rule finding alone, without selector evaluation
+    regex_rules, regex_time = _timed(lambda: sum(1 for _ in re.finditer(RULE_PATTERN, css)))
+    tree_rules, tree_time = _timed(lambda: sum(1 for _ in iter_rules(parse_stylesheet(css))))
+    print("Rule finding:")
+    print(f"  regex  {regex_time * 1000:10.1f} ms  {regex_rules:,} rules found")
+    print(f"  tree   {tree_time * 1000:10.1f} ms  {tree_rules:,} rules found")
+
+    print("Full prune_css:")
+    for parser in ('regex', 'tree'):
+        (pruned, stats), elapsed = _timed(prune_css, css, used, used, SAFELIST_PATTERNS, parser)
+        print(
+            f"  {parser:<6} {elapsed * 1000:10.1f} ms  "
+            f"kept {stats['rules_kept']:,} / removed {stats['rules_removed']:,} rules, "
+            f"{stats['pruned_size']:,} bytes out, "
+            f"{pruned.count('@supports')} @supports blocks kept"
+        )
+
+    # The regex treats each outer @media block as one opaque "rule", so it
+    # evaluates fewer selectors and keeps nested rules it never looked at
+    print(f"  Rule finding speedup: {regex_time / tree_time:.1f}x")
+    return 0
+
+
+def generate_js_bundle(path, size_bytes, seed=0):
+    """Write a synthetic minified JS bundle of roughly size_bytes."""
+    rng = random.Random(seed)
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < size_bytes:
+            chunk = ''.join(
+                f'function f{rng.randrange(2000)}(e){{e.classList.add("{_random_name(rng)}");'
+                f'return{{key:"{rng.choice(SITE_WORDS)}",v:{rng.randrange(100)}}}}}'
+                for _ in range(1000)
+            )
+            f.write(chunk)
+            written += len(chunk)
+
+
+def bench_bundle_worker(args):
+    """Scan one file in this (fresh) process and report time and peak RSS."""
+    start = time.perf_counter()
+    if args.mode == 'read_text':
+        tokens = extract_tokens(Path(args.file).read_text(encoding='utf-8'))
+    else:
+        tokens = extract_file_tokens(args.file)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KB on Linux
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'seconds': elapsed, 'max_rss_kb': max_rss_kb, 'tokens': len(tokens)}))
+    return 0
+
+
+def bench_bundle(args):
+    """Compare read_text + str regex with mmap + bytes regex on a large JS bundle."""
+    with tempfile.TemporaryDirectory() as tmp:
+        bundle = Path(tmp) / 'bundle.js'
+        generate_js_bundle(bundle, int(args.size_mb * 1024 * 1024))
+        print(f"Synthetic JS bundle: {bundle.stat().st_size:,} bytes")
+
+        results = {}
+        for mode in ('read_text', 'mmap'):
+            # Fresh interpreter per mode so peak RSS isn't shared
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), 'bundle-worker', mode, str(bundle)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results[mode] = json.loads(output)
+
+    if results['read_text']['tokens'] != results['mmap']['tokens']:
+        print("❌ Token counts differ between scan modes", file=sys.stderr)
+        return 1
+
+    for mode, result in results.items():
+        print(
+            f"  {mode:<10} {result['seconds'] * 1000:10.1f} ms  "
+            f"peak RSS {result['max_rss_kb'] / 1024:8.1f} MB  "
+            f"{result['tokens']:,} tokens"
+        )
+    return 0
+
+
+def bench_index(args):
+    """Repeated prunes of one stylesheet with and without a saved RuleIndex."""
+    css = generate_css(int(args.size_mb * 1024 * 1024), nested=True)
+    rng = random.Random(1)
+    # Different used sets, as for per-page bundles
+    used_sets = [
+        set(rng.sample(SEMANTIC_WORDS, 10)) | {f"{w}-{rng.randrange(5000)}" for w in SITE_WORDS for _ in range(50)}
+        for _ in range(args.prunes)
+    ]
+    safelist = SafelistMatcher(SAFELIST_PATTERNS)
+    print(f"Synthetic CSS: {len(css):,} bytes, {args.prunes} used sets")
+
+    def without_index():
+        return [prune_css(css, used, used, safelist)[0] for used in used_sets]
+
+    def with_index(path):
+        index = RuleIndex.load(path)
+        return [prune_css(css, used, used, safelist, rule_index=index)[0] for used in used_sets]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = Path(tmp) / 'rules.idx.json'
+        _, build_time = _timed(lambda: RuleIndex.build(css).save(index_path))
+        index_size = index_path.stat().st_size
+        plain, plain_time = _timed(without_index)
+        indexed, indexed_time = _timed(with_index, index_path)
+
+    if plain != indexed:
+        print("❌ Indexed prune output differs", file=sys.stderr)
+        return 1
+
+    print(f"  Build + save index: {build_time * 1000:10.1f} ms ({index_size:,} bytes)")
+    print(f"  Re-parse each prune: {plain_time * 1000:9.1f} ms")
+    print(f"  Load index + prunes: {indexed_time * 1000:9.1f} ms")
+    print(f"  Per-prune speedup:   {plain_time / indexed_time:9.1f}x")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PurgeCSS micro-benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    safelist = subparsers.add_parser('safelist', help="Safelist matching throughput")
+    safelist.add_argument('--size-mb', type=float, default=1.0,
+                          help="Synthetic CSS size in MB (default: 1)")
+    safelist.set_defaults(func=bench_safelist)
+
+    css_parser = subparsers.add_parser('parser', help="Regex vs streaming rule parser")
+    css_parser.add_argument('--size-mb', type=float, default=4.0,
+                            help="Synthetic CSS size in MB (default: 4)")
+    css_parser.set_defaults(func=bench_parser)
+
+    bundle = subparsers.add_parser('bundle', help="read_text vs mmap scan of a large JS bundle")
+    bundle.add_argument('--size-mb', type=float, default=50.0,
+                        help="Synthetic bundle size in MB (default: 50)")
+    bundle.set_defaults(func=bench_bundle)
+
+    index = subparsers.add_parser('index', help="Repeated prunes with a saved rule index")
+    index.add_argument('--size-mb', type=float, default=2.0,
+                       help="Synthetic CSS size in MB (default: 2)")
+    index.add_argument('--prunes', type=int, default=10,
+                       help="Number of different used sets (default: 10)")
+    index.set_defaults(func=bench_index)
+
+    # Internal: runs one scan mode in a child process for bench_bundle
+    worker = subparsers.add_parser('bundle-worker')
+    worker.add_argument('mode', choices=['read_text', 'mmap'])
+    worker.add_argument('file')
+    worker.set_defaults(func=bench_bundle_worker)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Per-Page CSS Bundles
+
+Splits a stylesheet into a shared common chunk plus a minimal bundle per
+HTML page or per Hugo section (blog, projects, isu-portfolio, ...), and
+rewrites each page's <link> to the stylesheet to point at its bundles.
+
+Bundles are named by content hash, so identical bundles (e.g. two sections
+that need the same rules) are written once and cached once by the CDN.
+
+The common chunk loads before the page bundle, so a rule is only hoisted
+into it when no rule left in a bundle earlier in the stylesheet sets one of
+the same properties; every equal-specificity override then resolves as
+before. Pages that could not be scanned link to a copy
+of the full stylesheet instead.
+"""
+
+import re
+import sys
+import json
+import hashlib
+from pathlib import Path
+
+from css_parser import COMMENT_PATTERN, STRING_PATTERN
+from scan import extract_each, find_site_files
+from usage import collect_script_tokens
+
+
+LINK_TAG_PATTERN = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+HREF_PATTERN = re.compile(r'''\bhref\s*=\s*(["']?)([^"'\s>]+)\1''', re.IGNORECASE)
+INTEGRITY_PATTERN = re.compile(r'''\s+integrity\s*=\s*(["'])[^"']*\1''', re.IGNORECASE)
+STYLESHEET_REL_PATTERN = re.compile(r'''\brel\s*=\s*["']?stylesheet\b''', re.IGNORECASE)
+# Clones of a replaced <link> must not repeat its id
+ID_ATTRIBUTE_PATTERN = re.compile(r'''\s+id\s*=\s*(["']?)[^"'\s>]*\1''', re.IGNORECASE)
+PROPERTY_PATTERN = re.compile(r'(?:^|[;{])\s*(-?-?[a-zA-Z][\w-]*)\s*:')
+VENDOR_PREFIX_PATTERN = re.compile(r'^-(?:webkit|moz|ms|o)-')
+
+# Group name for pages at the top level of the site (index.html, 404.html)
+ROOT_SECTION = 'root'
+
+
+def page_group(rel_path, mode):
+    """Bundle group for a site-relative HTML path: itself, or its section."""
+    if mode == 'page':
+        return rel_path.as_posix()
+    return rel_path.parts[0] if len(rel_path.parts) > 1 else ROOT_SECTION
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+
+
+def declared_properties(css_content, rule_index, rule_id):
+    """
+    Properties a style rule sets, reduced to their shorthand family.
+
+    margin-top and margin both give 'margin', -webkit-transition gives
+    'transition'; custom properties are kept whole. Coarse on purpose: two
+    rules that share a family are treated as overriding each other.
+    """
+    node_id = rule_index.rule_node[rule_id]
+    body = css_content[rule_index.node_block_start[node_id] + 1:rule_index.node_end[node_id]]
+    if '/*' in body:
+        body = COMMENT_PATTERN.sub('', body)
+    body = STRING_PATTERN.sub('""', body)
+    families = set()
+    for name in PROPERTY_PATTERN.findall(body):
+        name = name.lower()
+        if not name.startswith('--'):
+            name = VENDOR_PREFIX_PATTERN.sub('', name).split('-')[0]
+        families.add(name)
+    return families
+
+
+def rewrite_stylesheet_links(html, css_name, hrefs):
+    """
+    Replace each <link rel="stylesheet"> to css_name with links to hrefs.
+
+    Other attributes are kept, except integrity (it no longer matches) and,
+    when there are several links, id. Returns (new html, number of links
+    replaced).
+    """
+    replaced = 0
+
+    def replace(match):
+        nonlocal replaced
+        tag = match.group()
+        href = HREF_PATTERN.search(tag)
+        if (
+            not STYLESHEET_REL_PATTERN.search(tag)
+            or href is None
+            or href.group(2).split('?')[0].rsplit('/', 1)[-1] != css_name
+        ):
+            return tag
+        replaced += 1
+        tag = INTEGRITY_PATTERN.sub('', tag)
+        if len(hrefs) > 1:
+            tag = ID_ATTRIBUTE_PATTERN.sub('', tag)
+        href = HREF_PATTERN.search(tag)
+        start, end = href.span(2)
+        return ''.join(tag[:start] + new_href + tag[end:] for new_href in hrefs)
+
+    return LINK_TAG_PATTERN.sub(replace, html), replaced
+
+
+def build_bundles(
+    site_dir,
+    css_content,
+    css_name,
+    rule_index,
+    safelist,
+    extract,
+    output_dir,
+    mode='section',
+    url_prefix='/css/',
+    jobs=1,
+    dom_index=None,
+):
+    """
+    Write per-page/section CSS bundles and rewritten HTML pages.
+
+    Args:
+        site_dir: Generated site directory
+        css_content: Full stylesheet the pages currently link to
+        css_name: File name of that stylesheet in <link> hrefs (e.g. all.css)
+        rule_index: RuleIndex built from css_content
+        safelist: SafelistMatcher applied to every bundle
+        extract: Per-file token extractor (see scan.scan_files)
+        output_dir: Where rewritten pages (same relative paths) and the
+            bundle files (under url_prefix) are written
+        mode: 'page' for one bundle per HTML page, 'section' per Hugo section
+        url_prefix: URL path (and output subdirectory) of the bundle files
+        jobs: Worker processes for the per-page scan
+        dom_index: Optional DOMIndex of the site; each group's rules are then
+            also checked against the element signatures of its own pages
+
+    Returns:
+        Report dict with bundle sizes per group and the common chunk size
+    """
+    site_path = Path(site_dir)
+    output_path = Path(output_dir)
+    url_prefix = url_prefix.rstrip('/') + '/'
+    css_dir = output_path / url_prefix.strip('/')
+    css_dir.mkdir(parents=True, exist_ok=True)
+
+    # Classes added by scripts may show up on any page
+    script_tokens = collect_script_tokens(site_path, jobs)
+
+    html_files = find_site_files(site_path, ['*.html'])
+    groups = {}
+    pages = {}
+    for path, (tokens,) in extract_each(html_files, extract, jobs):
+        rel_path = path.relative_to(site_path)
+        group = page_group(rel_path, mode)
+        groups.setdefault(group, set()).update(tokens)
+        pages[rel_path] = group
+
+    # Pages the scan could not read have no token set to bundle for
+    fallback_pages = [
+        path.relative_to(site_path) for path in html_files
+        if path.relative_to(site_path) not in pages
+    ]
+
+    group_pages = {}
+    for rel_path, group in pages.items():
+        group_pages.setdefault(group, []).append(rel_path.as_posix())
+
+    def wildcard(name):
+        return name in script_tokens or safelist.matches(name)
+
+    keep_masks = {}
+    for group, tokens in groups.items():
+        used = tokens | script_tokens
+        selector_matches = None
+        if dom_index is not None:
+            selector_matches = dom_index.matcher(wildcard, dom_index.page_mask(group_pages[group]))
+        keep_masks[group] = rule_index.evaluate(
+            used, used, safelist, css_content, selector_matches
+        )
+
+    # Rules every group keeps go into the shared chunk, along with
+    # @font-face/@keyframes and license comments. The chunk loads first, so
+    # a shared rule stays in the bundles if a rule that remains there comes
+    # before it and sets the same properties: hoisted, it would lose ties it
+    # used to win.
+    common_mask = bytearray(rule_index.rule_count)
+    shared_rules = 0
+    bundled_properties = set()
+    for rule_id, flags in enumerate(zip(*keep_masks.values())):
+        if not any(flags):
+            continue
+        properties = declared_properties(css_content, rule_index, rule_id)
+        if all(flags):
+            shared_rules += 1
+            if properties.isdisjoint(bundled_properties):
+                common_mask[rule_id] = 1
+                continue
+        bundled_properties |= properties
+
+    written = {}
+
+    def write_bundle(prefix, css):
+        name = f"{prefix}.{content_hash(css)}.css"
+        if name not in written:
+            (css_dir / name).write_text(css, encoding='utf-8')
+            written[name] = len(css.encode('utf-8'))
+        return url_prefix + name
+
+    common_href = write_bundle('common', rule_index.render(css_content, common_mask))
+
+    group_hrefs = {}
+    report = {
+        'mode': mode,
+        'common_size': written[common_href.rsplit('/', 1)[-1]],
+        'common_rules': sum(common_mask),
+        'shared_rules': shared_rules,
+        'groups': {},
+    }
+    for group, mask in keep_masks.items():
+        only = bytearray(keep and not shared for keep, shared in zip(mask, common_mask))
+        hrefs = [common_href]
+        if any(only):
+            hrefs.append(write_bundle(
+                'bundle', rule_index.render(css_content, only, include_static=False)
+            ))
+        group_hrefs[group] = hrefs
+        report['groups'][group] = {
+            'bundles': hrefs,
+            'size': sum(written[href.rsplit('/', 1)[-1]] for href in hrefs),
+            'rules': sum(mask),
+        }
+
+    links_rewritten = 0
+    for rel_path, group in pages.items():
+        html = (site_path / rel_path).read_text(encoding='utf-8')
+        html, replaced = rewrite_stylesheet_links(html, css_name, group_hrefs[group])
+        links_rewritten += replaced
+        target = output_path / rel_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(html, encoding='utf-8')
+
+    if fallback_pages:
+        full_href = write_bundle('full', css_content)
+        for rel_path in fallback_pages:
+            # Undecodable bytes (a likely reason the scan failed) are kept as is
+            try:
+                html = (site_path / rel_path).read_text(encoding='utf-8', errors='surrogateescape')
+            except OSError as e:
+                print(f"Warning: Could not rewrite {rel_path}: {e}", file=sys.stderr)
+                continue
+            html, replaced = rewrite_stylesheet_links(html, css_name, [full_href])
+            links_rewritten += replaced
+            target = output_path / rel_path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(html, encoding='utf-8', errors='surrogateescape')
+
+    report['pages'] = len(pages)
+    report['fallback_pages'] = [rel_path.as_posix() for rel_path in fallback_pages]
+    report['links_rewritten'] = links_rewritten
+    report['bundle_files'] = written
+    (css_dir / 'bundles.json').write_text(json.dumps(report, indent=2), encoding='utf-8')
+    return report
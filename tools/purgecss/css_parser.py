@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Streaming CSS Rule Parser
+
+Single-pass tokenizer and rule-tree builder for stylesheets. Only the
+structural characters ({, }, ;) plus comments and strings are tokenized, so
+parsing is linear in the input size and never backtracks.
+
+Every node records offsets into the original text, which lets callers copy
+kept rules through verbatim instead of reformatting them.
+"""
+
+import re
+
+
+# Characters that can start a structural token: the three rule delimiters,
+# comments, and quoted strings (which may contain braces). Inside a
+# declaration block only braces matter, so ';' is not searched for there.
+STRUCTURAL_PATTERN = re.compile(r'[{};"\'/]')
+BLOCK_STRUCTURAL_PATTERN = re.compile(r'[{}"\'/]')
+
+# As in the CSS spec, an unterminated string ends at the newline
+STRING_PATTERN = re.compile(r'"(?:\\.|[^"\\\n])*"?|\'(?:\\.|[^\'\\\n])*\'?')
+
+# At-rules whose block contains nested rules rather than declarations
+GROUPING_AT_RULES = frozenset([
+    'media', 'supports', 'document', '-moz-document', 'layer', 'container', 'scope',
+])
+
+COMMENT_PATTERN = re.compile(r'/\*.*?(?:\*/|\Z)', re.DOTALL)
+AT_KEYWORD_PATTERN = re.compile(r'@([\w-]+)')
+
+
+class CSSNode:
+    """
+    A node in the rule tree.
+
+    kind is one of:
+        'rule'      style rule; prelude is the selector list
+        'at-rule'   at-rule; children is a list for grouping at-rules
+                    (@media, @supports, ...) and None for opaque ones
+                    (@font-face, @keyframes, statement at-rules like @import)
+        'comment'   comment between rules
+
+    start/end delimit the whole node in the source text; block_start is the
+    offset of its '{' (None for statements and comments).
+    """
+
+    __slots__ = ('kind', 'start', 'block_start', 'end', 'children')
+
+    def __init__(self, kind, start, block_start=None, end=None, children=None):
+        self.kind = kind
+        self.start = start
+        self.block_start = block_start
+        self.end = end
+        self.children = children
+
+    def prelude(self, source):
+        """Selector list or at-rule prelude, with comments removed."""
+        stop = self.block_start if self.block_start is not None else self.end
+        text = source[self.start:stop]
+        if '/*' in text:
+            text = COMMENT_PATTERN.sub('', text)
+        return text.strip().rstrip(';').strip()
+
+    def at_keyword(self, source):
+        """Lowercased at-rule name without the '@' (e.g. 'media')."""
+        match = AT_KEYWORD_PATTERN.match(source, self.start)
+        return match.group(1).lower() if match else ''
+
+    def __repr__(self):
+        return f"CSSNode({self.kind!r}, {self.start}, {self.block_start}, {self.end})"
+
+
+def _skip_whitespace(source, pos, stop):
+    while pos < stop and source[pos].isspace():
+        pos += 1
+    return pos
+
+
+def parse_stylesheet(source):
+    """
+    Parse CSS text into a list of top-level CSSNode objects.
+
+    Grouping at-rules keep their nesting; declaration blocks and opaque
+    at-rules are skipped over without being tokenized further than needed to
+    find their closing brace.
+    """
+    root = []
+    # Stack of open grouping at-rules; each entry is (node, children list)
+    stack = [(None, root)]
+    children = root
+    # Start of the text that will become the next node's prelude
+    pos = 0
+    # Brace depth inside a declaration block or opaque at-rule
+    opaque_depth = 0
+    opaque_node = None
+
+    scan = 0
+    while True:
+        pattern = BLOCK_STRUCTURAL_PATTERN if opaque_depth else STRUCTURAL_PATTERN
+        match = pattern.search(source, scan)
+        if match is None:
+            break
+        offset = match.start()
+        first = match.group()
+        scan = offset + 1
+
+        if first == '/':
+            if not source.startswith('*', scan):
+                continue
+            # Unterminated comments run to the end of input
+            close = source.find('*/', scan + 1)
+            scan = close + 2 if close != -1 else len(source)
+            # A comment standing between rules becomes its own node; one
+            # inside a selector is left as part of that prelude
+            if not opaque_depth and not source[pos:offset].strip():
+                children.append(CSSNode('comment', offset, end=scan))
+                pos = scan
+            continue
+
+        if first == '"' or first == "'":
+            scan = STRING_PATTERN.match(source, offset).end()
+            continue
+
+        if opaque_depth:
+            if first == '{':
+                opaque_depth += 1
+            else:
+                opaque_depth -= 1
+                if opaque_depth == 0:
+                    opaque_node.end = scan
+                    opaque_node = None
+                    pos = scan
+            continue
+
+        start = _skip_whitespace(source, pos, offset)
+
+        if first == ';':
+            # Statement at-rule (@import, @charset, ...). Anything else
+            # here is a stray declaration and is dropped.
+            if start < offset and source[start] == '@':
+                children.append(CSSNode('at-rule', start, end=scan))
+            pos = scan
+
+        elif first == '{':
+            if source[start] == '@':
+                node = CSSNode('at-rule', start, block_start=offset)
+                if node.at_keyword(source) in GROUPING_AT_RULES:
+                    children.append(node)
+                    node.children = children = []
+                    stack.append((node, children))
+                    pos = scan
+                    continue
+            else:
+                node = CSSNode('rule', start, block_start=offset)
+            children.append(node)
+            opaque_node = node
+            opaque_depth = 1
+            pos = scan
+
+        else:  # '}'
+            if len(stack) > 1:
+                node, _ = stack.pop()
+                node.end = scan
+                children = stack[-1][1]
+            # Unbalanced '}' at top level is ignored
+            pos = scan
+
+    # Close anything left open by truncated input
+    end = len(source)
+    if opaque_node is not None:
+        opaque_node.end = end
+    for node, _ in stack[1:]:
+        node.end = end
+
+    return root
+
+
+def iter_rules(nodes):
+    """Yield every style rule in document order, descending into at-rules."""
+    for node in nodes:
+        if node.kind == 'rule':
+            yield node
+        elif node.children is not None:
+            yield from iter_rules(node.children)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+DOM Co-occurrence Index
+
+Records, for every HTML page, which combinations of classes and IDs appear
+together on a single element ("element signatures"), so whole selectors can
+be checked instead of single names:
+
+    .ui.inverted.menu .item
+
+is only used if some element carries ui, inverted and menu together and
+some element on the same page carries item.
+
+Combinators are checked at page level: every compound of a selector must
+match an element on the same page, but ancestry and sibling order are not
+verified. That keeps the check linear in site size and never drops a
+selector a real DOM would match.
+
+Signatures are deduplicated across pages (Hugo templates repeat the same
+elements everywhere) and each keeps a bitmask of the pages it appears on.
+"""
+
+import re
+from pathlib import Path
+from functools import lru_cache
+
+from scan import extract_each, find_site_files
+
+
+ELEMENT_TAG_PATTERN = re.compile(r'<[a-zA-Z][^>]*>')
+CLASS_ATTR_PATTERN = re.compile(
+    r'''\sclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.IGNORECASE
+)
+ID_ATTR_PATTERN = re.compile(
+    r'''\sid\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.IGNORECASE
+)
+
+# Selector parsing: same class/ID names as rule_index.REQUIREMENT_PATTERN
+ATTRIBUTE_PATTERN = re.compile(r'\[[^\]]*\]')
+FUNCTIONAL_PSEUDO_PATTERN = re.compile(r':[\w-]+\([^()]*\)')
+PSEUDO_PATTERN = re.compile(r'::?[\w-]+')
+COMBINATOR_PATTERN = re.compile(r'\s*[>+~]\s*|\s+')
+REQUIREMENT_PATTERN = re.compile(r'[.#][a-zA-Z0-9_-]+')
+
+
+def _attr_value(match):
+    return next(group for group in match.groups() if group is not None)
+
+
+def extract_element_signatures(html_content):
+    """
+    Class/ID combinations of each element in an HTML document.
+
+    Each signature is the element's '.class' and '#id' tokens, sorted and
+    space-separated; elements without classes or IDs are skipped.
+    """
+    signatures = set()
+    for tag in ELEMENT_TAG_PATTERN.finditer(html_content):
+        tag = tag.group()
+        if 'class' not in tag and 'id' not in tag:
+            continue
+        tokens = set()
+        match = CLASS_ATTR_PATTERN.search(tag)
+        if match:
+            tokens.update('.' + name for name in _attr_value(match).split())
+        match = ID_ATTR_PATTERN.search(tag)
+        if match and _attr_value(match).strip():
+            tokens.add('#' + _attr_value(match).strip())
+        if tokens:
+            signatures.add(' '.join(sorted(tokens)))
+    return signatures
+
+
+@lru_cache(maxsize=None)
+def parse_selector(selector):
+    """
+    Split a selector into its compounds' class/ID requirements.
+
+    Returns a tuple of frozensets of '.class'/'#id' tokens, one per compound
+    that needs any (type and universal compounds need nothing). Attribute
+    selectors, pseudo-classes and pseudo-elements are ignored, including
+    the arguments of :not()/:is()/:has(), so the result never requires more
+    than the selector does. Returns None for '@'-prefixed selectors.
+    """
+    selector = selector.strip()
+    if selector.startswith('@'):
+        return None
+    if '[' in selector:
+        selector = ATTRIBUTE_PATTERN.sub('', selector)
+    if ':' in selector:
+        previous = None
+        while previous != selector:
+            previous = selector
+            selector = FUNCTIONAL_PSEUDO_PATTERN.sub('', selector)
+        selector = PSEUDO_PATTERN.sub('', selector)
+
+    compounds = []
+    for compound in COMBINATOR_PATTERN.split(selector):
+        tokens = REQUIREMENT_PATTERN.findall(compound)
+        if tokens:
+            compounds.append(frozenset(tokens))
+    return tuple(compounds)
+
+
+class DOMIndex:
+    """Element signatures of a set of pages, with per-token postings."""
+
+    def __init__(self):
+        self.pages = []
+        self.signatures = []
+        self._signature_ids = {}
+        self._signature_pages = []
+        self._token_signatures = {}
+        self._token_pages = {}
+        self._required_pages = {}
+
+    @property
+    def all_pages(self):
+        return (1 << len(self.pages)) - 1
+
+    def add_page(self, page, signatures):
+        """Add one page's element signatures (see extract_element_signatures)."""
+        bit = 1 << len(self.pages)
+        self.pages.append(page)
+        page_tokens = set()
+        for signature in signatures:
+            signature_id = self._signature_ids.get(signature)
+            if signature_id is None:
+                signature_id = self._signature_ids[signature] = len(self.signatures)
+                tokens = frozenset(signature.split())
+                self.signatures.append(tokens)
+                self._signature_pages.append(0)
+                for token in tokens:
+                    self._token_signatures.setdefault(token, set()).add(signature_id)
+            self._signature_pages[signature_id] |= bit
+            page_tokens.update(self.signatures[signature_id])
+        for token in page_tokens:
+            self._token_pages[token] = self._token_pages.get(token, 0) | bit
+        self._required_pages.clear()
+
+    def required_pages(self, required):
+        """Bitmask of pages with an element carrying every token in required."""
+        result = self._required_pages.get(required)
+        if result is not None:
+            return result
+
+        # Pages having every token somewhere bound the result
+        bound = -1
+        for token in required:
+            bound &= self._token_pages.get(token, 0)
+        if len(required) == 1 or not bound:
+            result = bound
+        else:
+            postings = sorted((self._token_signatures[token] for token in required), key=len)
+            result = 0
+            for signature_id in postings[0].intersection(*postings[1:]):
+                result |= self._signature_pages[signature_id]
+                if result == bound:
+                    break
+        self._required_pages[required] = result
+        return result
+
+    def page_mask(self, pages):
+        """Bitmask selecting the given page names."""
+        wanted = set(pages)
+        return sum(1 << bit for bit, page in enumerate(self.pages) if page in wanted)
+
+    def matcher(self, wildcard=None, pages=None):
+        """
+        Build a selector -> bool check against this index.
+
+        Args:
+            wildcard: Optional predicate on bare class/ID names that may be on
+                any element (safelisted names, classes added by scripts)
+            pages: Optional page bitmask (see page_mask) to restrict matching
+                to; defaults to every page
+
+        Returns:
+            Function taking one selector and returning True if some page
+            could match it
+        """
+        page_filter = self.all_pages if pages is None else pages
+        wild = {}
+        compound_pages = {}
+
+        def is_wild(token):
+            result = wild.get(token)
+            if result is None:
+                result = wild[token] = bool(wildcard and wildcard(token[1:]))
+            return result
+
+        def pages_for(compound):
+            result = compound_pages.get(compound)
+            if result is not None:
+                return result
+            required = frozenset(token for token in compound if not is_wild(token))
+            if not required:
+                result = page_filter
+            else:
+                result = self.required_pages(required) & page_filter
+            compound_pages[compound] = result
+            return result
+
+        def matches(selector):
+            compounds = parse_selector(selector)
+            if compounds is None:
+                return True
+            remaining = page_filter
+            for compound in compounds:
+                remaining &= pages_for(compound)
+                if not remaining:
+                    return False
+            return True
+
+        return matches
+
+
+def _scan_signatures(html_file):
+    """Element signatures of one HTML file (process pool worker entry point)."""
+    return (extract_element_signatures(html_file.read_text(encoding='utf-8')),)
+
+
+# Token index namespace; bump when extract_element_signatures changes
+SIGNATURE_NAMESPACE = 'dom_index.extract_element_signatures/v1'
+
+
+def build_dom_index(site_dir, jobs=1, token_index=None):
+    """
+    Index every HTML page under site_dir, keyed by site-relative path.
+
+    With a TokenIndex, only pages whose content changed are re-parsed.
+    """
+    site_path = Path(site_dir)
+    html_files = find_site_files(site_path, ['*.html'])
+    index = DOMIndex()
+
+    if token_index is not None:
+        token_index.scan(site_path, html_files, _scan_signatures, SIGNATURE_NAMESPACE, jobs=jobs)
+        for page, signatures in sorted(token_index.tokens_by_file(SIGNATURE_NAMESPACE).items()):
+            index.add_page(page, signatures)
+    else:
+        for path, (signatures,) in extract_each(html_files, _scan_signatures, jobs):
+            index.add_page(path.relative_to(site_path).as_posix(), signatures)
+    return index
@@ -9,8 +9,21 @@ Uses analysis data to generate optimized CSS files.
 import re
 import sys
 import json
+import time
+import argparse
 from pathlib import Path
 
+from bundles import build_bundles
+from dom_index import build_dom_index
+from rule_index import RuleIndex
+from safelist import SAFELIST_FILE, compile_safelist, load_safelist
+from scan import resolve_jobs
+from token_index import TokenIndex
+from usage import (
+    MATCH_MODES, collect_script_tokens, collect_used_selectors, dom_selector_matches,
+    scan_token_file,
+)
+
 
 def load_analysis(analysis_file):
     """Load analysis results from JSON file."""
@@ -18,32 +31,65 @@ def load_analysis(analysis_file):
         return json.load(f)
 
 
-def extract_tokens(content):
-    """Extract all potential class/id tokens from content using broad regex."""
-    # Broad match for any potential selector name (User provided nuanced regex)
-    # Matches tokens that don't end in a colon (to avoid CSS properties/JS keys)
-    pattern = r'[^<>"\'`\s]*[^<>"\'`\s:]'
-    return set(re.findall(pattern, content))
-
-
-def is_safelisted(selector, safelist_patterns):
-    """Check if selector matches any safelist pattern."""
+def is_safelisted(selector, safelist):
+    """Check if selector matches the safelist (a compiled SafelistMatcher)."""
     # Remove leading . or # for pattern matching
     clean_selector = selector.lstrip('.#').split(':')[0].split('[')[0]
 
-    for pattern in safelist_patterns:
-        if re.match(pattern, clean_selector):
-            return True
-    return False
+    return safelist.matches(clean_selector)
 
 
-def prune_css(css_content, used_classes, used_ids, safelist_patterns):
+def rule_is_used(selectors_str, used_classes, used_ids, safelist):
     """
-    Remove unused CSS rules while preserving structure and comments.
-    Returns pruned CSS and statistics.
+    Check if any selector in a comma-separated selector list is used.
+
+    safelist is a SafelistMatcher; compile it once (see compile_safelist).
     """
-    original_size = len(css_content)
+    for selector in selectors_str.split(','):
+        selector = selector.strip()
 
+        # Skip @-rules, keep them all
+        if selector.startswith('@'):
+            return True
+
+        # Algorithm:
+        # 1. Clean selector of pseudos/attributes
+        # 2. Regex find all classes and IDs
+        # 3. Check if ALL found classes/IDs are used or safelisted
+
+        # Remove attributes [type="..."] to avoid matching inside them
+        clean_selector = re.sub(r'\[.*?\]', '', selector)
+        # Remove pseudo-classes/elements :hover, ::before
+        clean_selector = clean_selector.split(':')[0]
+
+        # Find all classes and IDs
+        found_classes = re.findall(r'\.([a-zA-Z0-9_-]+)', clean_selector)
+        found_ids = re.findall(r'#([a-zA-Z0-9_-]+)', clean_selector)
+
+        # Verify classes
+        classes_ok = True
+        for cls in found_classes:
+            if cls not in used_classes and not is_safelisted(cls, safelist):
+                classes_ok = False
+                break
+
+        # Verify IDs
+        ids_ok = True
+        for id_val in found_ids:
+            if id_val not in used_ids and not is_safelisted(id_val, safelist):
+                ids_ok = False
+                break
+
+        # If all parts of the selector are valid, keep the rule
+        # Note: If no classes/IDs found (e.g. "div", "body"), both flags remain True
+        if classes_ok and ids_ok:
+            return True
+
+    return False
+
+
+def _prune_regex(css_content, keep_rule):
+    """Legacy regex rule finder; supports a single level of nesting."""
     # Extract all CSS rules (simplified parser)
     # Pattern: selector(s) { ... }
     rule_pattern = r'([^{}]+)\s*\{([^{}]*(?:\{[^{}]*\}[^{}]*)*)\}'
@@ -56,52 +102,7 @@ def prune_css(css_content, used_classes, used_ids, safelist_patterns):
         selectors_str = match.group(1).strip()
         declarations = match.group(2).strip()
 
-        # Split multiple selectors (comma-separated)
-        selectors = [s.strip() for s in selectors_str.split(',')]
-
-        # Check if any selector is used
-        keep_rule = False
-        for selector in selectors:
-            # Skip @-rules, keep them all
-            if selector.startswith('@'):
-                keep_rule = True
-                break
-
-            # Algorithm:
-            # 1. Clean selector of pseudos/attributes
-            # 2. Regex find all classes and IDs
-            # 3. Check if ALL found classes/IDs are used or safelisted
-            
-            # Remove attributes [type="..."] to avoid matching inside them
-            clean_selector = re.sub(r'\[.*?\]', '', selector)
-            # Remove pseudo-classes/elements :hover, ::before
-            clean_selector = clean_selector.split(':')[0]
-
-            # Find all classes and IDs
-            found_classes = re.findall(r'\.([a-zA-Z0-9_-]+)', clean_selector)
-            found_ids = re.findall(r'#([a-zA-Z0-9_-]+)', clean_selector)
-
-            # Verify classes
-            classes_ok = True
-            for cls in found_classes:
-                if cls not in used_classes and not is_safelisted(cls, safelist_patterns):
-                    classes_ok = False
-                    break
-            
-            # Verify IDs
-            ids_ok = True
-            for id_val in found_ids:
-                if id_val not in used_ids and not is_safelisted(id_val, safelist_patterns):
-                    ids_ok = False
-                    break
-
-            # If all parts of the selector are valid, keep the rule
-            # Note: If no classes/IDs found (e.g. "div", "body"), both flags remain True
-            if classes_ok and ids_ok:
-                keep_rule = True
-                break
-
-        if keep_rule:
+        if keep_rule(selectors_str):
             pruned_rules.append(f"{selectors_str} {{\n  {declarations}\n}}")
             kept_count += 1
         else:
@@ -116,6 +117,52 @@ def prune_css(css_content, used_classes, used_ids, safelist_patterns):
     if licenses:
         pruned_css = '\n'.join(licenses) + '\n\n' + pruned_css
 
+    return pruned_css, kept_count, removed_count
+
+
+def prune_css(
+    css_content,
+    used_classes,
+    used_ids,
+    safelist_patterns,
+    parser='tree',
+    rule_index=None,
+    selector_matches=None,
+):
+    """
+    Remove unused CSS rules while preserving structure and comments.
+    Returns pruned CSS and statistics.
+
+    parser selects the rule finder: 'tree' (default) uses the streaming
+    parser in css_parser.py, keeps @media/@supports nesting and copies kept
+    rules verbatim; 'regex' is the original single-nesting-level pattern.
+
+    rule_index is an optional prebuilt RuleIndex for css_content (tree parser
+    only); pass one to prune the same CSS repeatedly without re-parsing it.
+
+    selector_matches is an optional whole-selector check (tree parser only),
+    e.g. DOMIndex.matcher(), that kept selectors must also pass.
+    """
+    original_size = len(css_content)
+    safelist = compile_safelist(safelist_patterns)
+
+    if parser == 'regex':
+        def keep_rule(selectors_str):
+            return rule_is_used(selectors_str, used_classes, used_ids, safelist)
+
+        pruned_css, kept_count, removed_count = _prune_regex(css_content, keep_rule)
+    elif parser == 'tree':
+        if rule_index is None:
+            rule_index = RuleIndex.build(css_content)
+        keep = rule_index.evaluate(
+            used_classes, used_ids, safelist, css_content, selector_matches
+        )
+        pruned_css = rule_index.render(css_content, keep)
+        kept_count = sum(keep)
+        removed_count = len(keep) - kept_count
+    else:
+        raise ValueError(f"Unknown CSS parser: {parser}")
+
     pruned_size = len(pruned_css)
     reduction_percentage = ((original_size - pruned_size) / original_size * 100) if original_size > 0 else 0
 
@@ -131,251 +178,136 @@ def prune_css(css_content, used_classes, used_ids, safelist_patterns):
     return pruned_css, stats
 
 
-def collect_used_selectors(site_dir):
-    """Scan site HTML and JS to collect all used classes and IDs."""
-    site_path = Path(site_dir)
-
-    all_classes = set()
-    all_ids = set()
-
-    # Scan both HTML and JS files
-    extensions = ['*.html', '*.js']
-    
-    for ext in extensions:
-        for file_path in site_path.rglob(ext):
-            try:
-                content = file_path.read_text(encoding='utf-8')
-                tokens = extract_tokens(content)
-                
-                # Add all tokens to both classes and IDs sets
-                # This is the "nuanced" approach: treat every token as potentially both
-                all_classes.update(tokens)
-                all_ids.update(tokens)
-            except Exception as e:
-                print(f"Warning: Could not read {file_path}: {e}", file=sys.stderr)
-
-    return all_classes, all_ids
-
-
 def main():
-    if len(sys.argv) < 4:
-        print("Usage: prune.py <site_directory> <css_input_file> <css_output_file>", file=sys.stderr)
+    parser = argparse.ArgumentParser(
+        description="Remove unused CSS selectors while preserving safelisted patterns"
+    )
+    parser.add_argument("site_dir", help="Generated site directory to scan")
+    parser.add_argument("css_input", help="CSS file to prune")
+    parser.add_argument("css_output", help="Output path for pruned CSS")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for the site scan (0 = one per CPU, default: 1)"
+    )
+    parser.add_argument(
+        "--token-index",
+        type=Path,
+        help="SQLite token index; unchanged files reuse their cached tokens"
+    )
+    parser.add_argument(
+        "--rule-index",
+        type=Path,
+        help="Saved selector index for the input CSS; rebuilt when the CSS changes"
+    )
+    parser.add_argument(
+        "--safelist",
+        type=Path,
+        default=SAFELIST_FILE,
+        help="Safelist file of dynamic class patterns (default: safelist.json)"
+    )
+    parser.add_argument(
+        "--safelist-cache",
+        type=Path,
+        help="Directory to cache the compiled safelist in (default: compile it every run)"
+    )
+    parser.add_argument(
+        "--match",
+        choices=MATCH_MODES,
+        default="tokens",
+        help="Keep rules whose class/ID names are all used anywhere (tokens), or "
+             "whose compound selectors match elements on the same page (dom)"
+    )
+    parser.add_argument(
+        "--bundles",
+        choices=["page", "section"],
+        help="Also write a common chunk plus a minimal CSS bundle per page or Hugo section"
+    )
+    parser.add_argument(
+        "--bundle-dir",
+        type=Path,
+        help="Output directory for bundles and the HTML pages rewritten to use them"
+    )
+    parser.add_argument(
+        "--bundle-url-prefix",
+        default="/css/",
+        help="URL path the bundles are served from, also their subdirectory of "
+             "--bundle-dir (default: /css/)"
+    )
+    args = parser.parse_args()
+
+    if args.bundles and not args.bundle_dir:
+        parser.error("--bundles requires --bundle-dir")
+
+    site_dir = args.site_dir
+    css_input = args.css_input
+    css_output = args.css_output
+
+    try:
+        safelist = load_safelist(args.safelist, args.safelist_cache)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not load safelist {args.safelist}: {e}", file=sys.stderr)
         sys.exit(1)
-
-    site_dir = sys.argv[1]
-    css_input = sys.argv[2]
-    css_output = sys.argv[3]
-
-    # Load safelist patterns - comprehensive Semantic UI support
-    safelist_patterns = [
-        # Generic state classes
-        r'^is-.*',
-        r'^has-.*',
-        r'^active$',
-        r'^disabled$',
-        r'^nav-.*',
-
-        # Semantic UI base components
-        r'^ui$',
-        r'^button$',
-        r'^buttons$',
-        r'^menu$',
-        r'^dropdown$',
-        r'^modal$',
-        r'^segment$',
-        r'^segments$',
-        r'^card$',
-        r'^cards$',
-        r'^form$',
-        r'^input$',
-        r'^label$',
-        r'^labels$',
-        r'^labeled$',
-        r'^message$',
-        r'^messages$',
-        r'^icon$',
-        r'^icons$',
-        r'^image$',
-        r'^images$',
-        r'^container$',
-        r'^grid$',
-        r'^column$',
-        r'^row$',
-        r'^header$',
-        r'^divider$',
-        r'^list$',
-        r'^item$',
-        r'^items$',
-        r'^content$',
-        r'^description$',
-        r'^meta$',
-        r'^extra$',
-        r'^field$',
-        r'^fields$',
-        r'^accordion$',
-        r'^checkbox$',
-        r'^dimmer$',
-        r'^embed$',
-        r'^progress$',
-        r'^rating$',
-        r'^search$',
-        r'^sidebar$',
-        r'^pushable$',
-        r'^pusher$',
-        r'^dimmed$',
-        r'^blurring$',
-        r'^scrolling$',
-        r'^sticky$',
-        r'^tab$',
-        r'^transition$',
-        r'^popup$',
-        r'^toast$',
-
-        # Semantic UI size modifiers
-        r'^mini$',
-        r'^tiny$',
-        r'^small$',
-        r'^medium$',
-        r'^large$',
-        r'^big$',
-        r'^huge$',
-        r'^massive$',
-
-        # Semantic UI color modifiers
-        r'^red$',
-        r'^orange$',
-        r'^yellow$',
-        r'^olive$',
-        r'^green$',
-        r'^teal$',
-        r'^blue$',
-        r'^violet$',
-        r'^purple$',
-        r'^pink$',
-        r'^brown$',
-        r'^grey$',
-        r'^gray$',
-        r'^black$',
-        r'^white$',
-        r'^primary$',
-        r'^secondary$',
-        r'^positive$',
-        r'^negative$',
-
-        # Semantic UI state modifiers
-        r'^loading$',
-        r'^hidden$',
-        r'^visible$',
-        r'^error$',
-        r'^warning$',
-        r'^success$',
-        r'^info$',
-        r'^animating$',
-        r'^transition$',
-        r'^hoverable$',
-        r'^selected$',
-        r'^read$',
-        r'^unread$',
-
-        # Semantic UI alignment & positioning
-        r'^left$',
-        r'^center$',
-        r'^right$',
-        r'^justified$',
-        r'^top$',
-        r'^middle$',
-        r'^bottom$',
-        r'^floated$',
-        r'^aligned$',
-        r'^attached$',
-
-        # Semantic UI layout modifiers
-        r'^fluid$',
-        r'^fitted$',
-        r'^padded$',
-        r'^compact$',
-        r'^relaxed$',
-        r'^divided$',
-        r'^celled$',
-        r'^inverted$',
-        r'^basic$',
-        r'^clearing$',
-        r'^stackable$',
-        r'^doubling$',
-        r'^stretched$',
-        r'^equal$',
-
-        # Semantic UI width classes (grid system)
-        r'^wide$',
-        r'^one$',
-        r'^two$',
-        r'^three$',
-        r'^four$',
-        r'^five$',
-        r'^six$',
-        r'^seven$',
-        r'^eight$',
-        r'^nine$',
-        r'^ten$',
-        r'^eleven$',
-        r'^twelve$',
-        r'^thirteen$',
-        r'^fourteen$',
-        r'^fifteen$',
-        r'^sixteen$',
-
-        # Semantic UI orientation & direction
-        r'^vertical$',
-        r'^horizontal$',
-        r'^pointing$',
-        r'^inline$',
-        r'^block$',
-
-        # Semantic UI image modifiers
-        r'^avatar$',
-        r'^bordered$',
-        r'^circular$',
-        r'^rounded$',
-        r'^spaced$',
-
-        # Semantic UI text modifiers
-        r'^truncate$',
-        r'^fitted$',
-
-        # Semantic UI responsive classes
-        r'^mobile$',
-        r'^tablet$',
-        r'^computer$',
-        r'^largescreen$',
-        r'^widescreen$',
-        r'^only$',
-
-        # Semantic UI utility patterns (prefix-based)
-        r'^ui-.*',
-        r'^semantic-.*',
-    ]
+    timings = {}
 
     print("=" * 60)
     print("PurgeCSS Pruning")
     print("=" * 60)
 
     # Collect used selectors
-    print(f"Scanning site: {site_dir}")
-    used_classes, used_ids = collect_used_selectors(site_dir)
+    print(f"Scanning site: {site_dir} (jobs: {resolve_jobs(args.jobs)})")
+    start = time.perf_counter()
+    if args.token_index:
+        with TokenIndex(args.token_index) as token_index:
+            used_classes, used_ids = collect_used_selectors(site_dir, args.jobs, token_index)
+    else:
+        used_classes, used_ids = collect_used_selectors(site_dir, args.jobs)
+    timings['scan'] = time.perf_counter() - start
     print(f"Found {len(used_classes)} used classes and {len(used_ids)} used IDs")
 
+    selector_matches = None
+    dom_index = None
+    if args.match == 'dom':
+        start = time.perf_counter()
+        if args.token_index:
+            with TokenIndex(args.token_index) as token_index:
+                dom_index = build_dom_index(site_dir, args.jobs, token_index)
+        else:
+            dom_index = build_dom_index(site_dir, args.jobs)
+        script_tokens = collect_script_tokens(site_dir, args.jobs)
+        selector_matches = dom_selector_matches(dom_index, script_tokens, safelist)
+        timings['dom_index'] = time.perf_counter() - start
+        print(f"DOM index: {len(dom_index.signatures)} element signatures across {len(dom_index.pages)} pages")
+
     # Read CSS
     print(f"Reading CSS: {css_input}")
+    start = time.perf_counter()
     css_content = Path(css_input).read_text(encoding='utf-8')
+    timings['read'] = time.perf_counter() - start
     print(f"Original size: {len(css_content):,} bytes ({len(css_content)/1024:.1f} KB)")
 
+    rule_index = None
+    if args.rule_index:
+        start = time.perf_counter()
+        rule_index, loaded = RuleIndex.load_or_build(args.rule_index, css_content)
+        timings['index'] = time.perf_counter() - start
+        print(f"Rule index: {'loaded' if loaded else 'built'} {args.rule_index} ({rule_index.rule_count} rules)")
+
     # Prune CSS
     print("Pruning unused CSS...")
-    pruned_css, stats = prune_css(css_content, used_classes, used_ids, safelist_patterns)
+    start = time.perf_counter()
+    pruned_css, stats = prune_css(
+        css_content, used_classes, used_ids, safelist,
+        rule_index=rule_index, selector_matches=selector_matches,
+    )
+    timings['prune'] = time.perf_counter() - start
 
     # Write output
     print(f"Writing pruned CSS: {css_output}")
+    start = time.perf_counter()
     Path(css_output).write_text(pruned_css, encoding='utf-8')
+    timings['write'] = time.perf_counter() - start
 
     print("\n📊 Results:")
     print(f"  Original size: {stats['original_size']:,} bytes ({stats['original_size']/1024:.1f} KB)")
@@ -384,6 +316,41 @@ def main():
     print(f"  Rules kept: {stats['rules_kept']}")
     print(f"  Rules removed: {stats['rules_removed']}")
 
+    if args.bundles:
+        print(f"\nWriting per-{args.bundles} bundles: {args.bundle_dir}")
+        start = time.perf_counter()
+        if rule_index is None:
+            rule_index = RuleIndex.build(css_content)
+        report = build_bundles(
+            site_dir,
+            css_content,
+            Path(css_input).name,
+            rule_index,
+            safelist,
+            scan_token_file,
+            args.bundle_dir,
+            mode=args.bundles,
+            url_prefix=args.bundle_url_prefix,
+            jobs=args.jobs,
+            dom_index=dom_index,
+        )
+        timings['bundles'] = time.perf_counter() - start
+
+        print(f"  Common chunk: {report['common_size']:,} bytes ({report['common_rules']} rules)")
+        if report['shared_rules']:
+            hoisted = report['common_rules'] / report['shared_rules']
+            print(f"  Shared rules hoisted: {report['common_rules']}/{report['shared_rules']} ({hoisted:.0%})")
+        for group, info in sorted(report['groups'].items()):
+            print(f"  {group}: {info['size']:,} bytes ({info['rules']} rules)")
+        print(f"  Unique bundle files: {len(report['bundle_files'])}")
+        print(f"  Links rewritten: {report['links_rewritten']} across {report['pages']} pages")
+        if report['fallback_pages']:
+            print(f"  Warning: {len(report['fallback_pages'])} unreadable pages linked to the full stylesheet")
+
+    print("\n⏱️  Timings:")
+    for phase, seconds in timings.items():
+        print(f"  {phase.capitalize()}: {seconds * 1000:.1f} ms")
+
     print(f"\n✅ Pruned CSS saved to: {css_output}")
 
 
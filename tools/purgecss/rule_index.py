@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Selector Requirement Index
+
+Precomputes, for every style rule in a stylesheet, the class and ID tokens
+each of its selectors needs, and inverts that into a token -> selector
+postings list stored in flat arrays. Deciding which rules to keep for a
+given set of used classes/IDs is then a pass over the distinct tokens and
+their postings, with no selector parsing.
+
+The index is serializable, so repeated prunes of the same CSS with different
+used sets (per-page bundles, alternative safelists) skip parsing entirely.
+"""
+
+import re
+import sys
+import json
+import zlib
+import base64
+import hashlib
+from array import array
+from pathlib import Path
+
+from css_parser import COMMENT_PATTERN, parse_stylesheet
+
+
+FORMAT_VERSION = 1
+
+# Node kinds, in the order they are stored in the kind array
+RULE, GROUP, OPAQUE, LICENSE = range(4)
+
+NO_PARENT = 0xFFFFFFFF
+
+ATTRIBUTE_PATTERN = re.compile(r'\[.*?\]')
+# Same names as prune.rule_is_used's class and ID patterns, keeping the prefix
+REQUIREMENT_PATTERN = re.compile(r'[.#][a-zA-Z0-9_-]+')
+
+
+def css_digest(css_content):
+    """Hash identifying the stylesheet an index was built from."""
+    return hashlib.blake2b(css_content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def selector_requirements(selector):
+    """
+    Class/ID tokens a single selector needs, as '.name' / '#name'.
+
+    Mirrors prune.rule_is_used: attributes and pseudo-classes are ignored, and
+    a selector with no classes or IDs (e.g. 'body') needs nothing. Returns
+    None for '@'-prefixed selectors, which are always kept.
+    """
+    selector = selector.strip()
+    if selector.startswith('@'):
+        return None
+    clean_selector = ATTRIBUTE_PATTERN.sub('', selector) if '[' in selector else selector
+    clean_selector = clean_selector.split(':')[0]
+    return set(REQUIREMENT_PATTERN.findall(clean_selector))
+
+
+class RuleIndex:
+    """
+    Inverted index from class/ID tokens to the rules that need them.
+
+    Arrays (all the same length as the thing they describe):
+        node_kind/parent/start/block_start/end   rule tree, document order
+        rule_node            node id of each style rule
+        selector_rule        rule id of each selector
+        selector_required    number of distinct tokens each selector needs
+        posting_offsets      CSR offsets into postings, one per token (+1)
+        postings             selector ids, grouped by token
+    """
+
+    def __init__(self, source_digest, tokens, arrays):
+        self.source_digest = source_digest
+        self.tokens = tokens
+        for name, values in arrays.items():
+            setattr(self, name, values)
+        self._children = None
+
+    ARRAY_TYPES = {
+        'node_kind': 'B',
+        'node_parent': 'I',
+        'node_start': 'I',
+        'node_block_start': 'I',
+        'node_end': 'I',
+        'rule_node': 'I',
+        'selector_rule': 'I',
+        'selector_required': 'I',
+        'posting_offsets': 'I',
+        'postings': 'I',
+    }
+
+    @classmethod
+    def build(cls, css_content):
+        """Parse a stylesheet and index its selectors."""
+        arrays = {name: array(code) for name, code in cls.ARRAY_TYPES.items()}
+        node_kind = arrays['node_kind']
+        node_parent = arrays['node_parent']
+        node_start = arrays['node_start']
+        node_block_start = arrays['node_block_start']
+        node_end = arrays['node_end']
+        rule_node = arrays['rule_node']
+        selector_rule = arrays['selector_rule']
+        selector_required = arrays['selector_required']
+        token_selectors = {}
+
+        def add_nodes(nodes, parent):
+            for node in nodes:
+                if node.kind == 'comment':
+                    # Only important comments (license, attribution) are kept
+                    if not css_content.startswith('/*!', node.start):
+                        continue
+                    kind = LICENSE
+                elif node.kind == 'rule':
+                    kind = RULE
+                elif node.children is None:
+                    kind = OPAQUE
+                else:
+                    kind = GROUP
+
+                node_id = len(node_kind)
+                node_kind.append(kind)
+                node_parent.append(parent)
+                node_start.append(node.start)
+                node_block_start.append(
+                    node.block_start if node.block_start is not None else node.end
+                )
+                node_end.append(node.end)
+
+                if kind == RULE:
+                    rule_id = len(rule_node)
+                    rule_node.append(node_id)
+                    for selector in node.prelude(css_content).split(','):
+                        required = selector_requirements(selector) or ()
+                        selector_id = len(selector_rule)
+                        selector_rule.append(rule_id)
+                        selector_required.append(len(required))
+                        for token in required:
+                            postings = token_selectors.get(token)
+                            if postings is None:
+                                token_selectors[token] = [selector_id]
+                            else:
+                                postings.append(selector_id)
+                elif kind == GROUP:
+                    add_nodes(node.children, node_id)
+
+        add_nodes(parse_stylesheet(css_content), NO_PARENT)
+
+        tokens = sorted(token_selectors)
+        arrays['posting_offsets'].append(0)
+        for token in tokens:
+            arrays['postings'].extend(token_selectors[token])
+            arrays['posting_offsets'].append(len(arrays['postings']))
+
+        return cls(css_digest(css_content), tokens, arrays)
+
+    @property
+    def rule_count(self):
+        return len(self.rule_node)
+
+    def evaluate(self, used_classes, used_ids, safelist, css_content=None, selector_matches=None):
+        """
+        Decide which rules to keep.
+
+        A selector is satisfied when every token it needs is used or
+        safelisted; a rule is kept when any of its selectors is satisfied.
+
+        Args:
+            used_classes: Set of used class names
+            used_ids: Set of used ID names
+            safelist: SafelistMatcher for dynamic names
+            css_content: Stylesheet the index was built from; only needed
+                with selector_matches
+            selector_matches: Optional stricter check (e.g. a DOMIndex
+                matcher) that selectors satisfied by their tokens must
+                also pass
+
+        Returns:
+            bytearray with 1 for each kept rule, in document order
+        """
+        # Tokens each selector still needs; satisfied when it reaches zero
+        remaining = array('I', self.selector_required)
+        postings = self.postings
+        offsets = self.posting_offsets
+        for token_id, token in enumerate(self.tokens):
+            name = token[1:]
+            used = used_classes if token[0] == '.' else used_ids
+            if name in used or safelist.matches(name):
+                for selector_id in postings[offsets[token_id]:offsets[token_id + 1]]:
+                    remaining[selector_id] -= 1
+
+        keep = bytearray(self.rule_count)
+        selector_rule = self.selector_rule
+        if selector_matches is None:
+            for selector_id, count in enumerate(remaining):
+                if count == 0:
+                    keep[selector_rule[selector_id]] = 1
+            return keep
+
+        # Selectors of a rule have consecutive ids, in prelude order
+        rule_id = None
+        for selector_id, count in enumerate(remaining):
+            if selector_rule[selector_id] != rule_id:
+                rule_id = selector_rule[selector_id]
+                first_selector = selector_id
+                selectors = None
+            if count or keep[rule_id]:
+                continue
+            if selectors is None:
+                node_id = self.rule_node[rule_id]
+                prelude = css_content[self.node_start[node_id]:self.node_block_start[node_id]]
+                if '/*' in prelude:
+                    prelude = COMMENT_PATTERN.sub('', prelude)
+                selectors = prelude.split(',')
+            if selector_matches(selectors[selector_id - first_selector]):
+                keep[rule_id] = 1
+        return keep
+
+    def _child_lists(self):
+        if self._children is None:
+            roots = []
+            children = [[] for _ in self.node_kind]
+            for node_id, parent in enumerate(self.node_parent):
+                (roots if parent == NO_PARENT else children[parent]).append(node_id)
+            self._children = (roots, children)
+        return self._children
+
+    def render(self, css_content, keep, include_static=True):
+        """
+        Copy the kept rules out of the original stylesheet.
+
+        Kept rules, opaque at-rules and license comments are copied verbatim;
+        grouping at-rules are kept only if something inside them is. With
+        include_static=False, opaque at-rules (@font-face, @keyframes, ...)
+        and license comments are left out, e.g. for a chunk that is loaded
+        alongside one that already has them.
+        """
+        if css_digest(css_content) != self.source_digest:
+            raise ValueError("Rule index was built from a different stylesheet")
+
+        roots, children = self._child_lists()
+        rule_ids = {node_id: rule_id for rule_id, node_id in enumerate(self.rule_node)}
+
+        def render_nodes(node_ids):
+            pieces = []
+            for node_id in node_ids:
+                kind = self.node_kind[node_id]
+                start = self.node_start[node_id]
+                end = self.node_end[node_id]
+                if kind == RULE:
+                    if keep[rule_ids[node_id]]:
+                        pieces.append(css_content[start:end])
+                elif kind == GROUP:
+                    inner = render_nodes(children[node_id])
+                    # Drop @media/@supports blocks that end up empty
+                    if inner:
+                        pieces.append(
+                            css_content[start:self.node_block_start[node_id] + 1]
+                            + '\n' + '\n'.join(inner) + '\n}'
+                        )
+                elif include_static:
+                    pieces.append(css_content[start:end])
+            return pieces
+
+        return '\n'.join(render_nodes(roots))
+
+    def save(self, path):
+        """Write the index as JSON with zlib-compressed, base64-encoded arrays."""
+        data = {
+            'version': FORMAT_VERSION,
+            'byteorder': sys.byteorder,
+            'source_digest': self.source_digest,
+            'tokens': self.tokens,
+            'arrays': {
+                name: base64.b64encode(zlib.compress(getattr(self, name).tobytes())).decode('ascii')
+                for name in self.ARRAY_TYPES
+            },
+        }
+        Path(path).write_text(json.dumps(data), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save(); returns None if it is unusable."""
+        try:
+            data = json.loads(Path(path).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != FORMAT_VERSION:
+            return None
+
+        arrays = {}
+        for name, code in cls.ARRAY_TYPES.items():
+            values = array(code)
+            values.frombytes(zlib.decompress(base64.b64decode(data['arrays'][name])))
+            if data['byteorder'] != sys.byteorder:
+                values.byteswap()
+            arrays[name] = values
+        return cls(data['source_digest'], data['tokens'], arrays)
+
+    @classmethod
+    def load_or_build(cls, path, css_content):
+        """
+        Load a saved index for this stylesheet, rebuilding it if missing or stale.
+
+        Returns (index, True if it was loaded from disk).
+        """
+        index = cls.load(path) if Path(path).exists() else None
+        if index is not None and index.source_digest == css_digest(css_content):
+            return index, True
+        index = cls.build(css_content)
+        index.save(path)
+        return index, False
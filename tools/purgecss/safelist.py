@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Shared Safelist
+
+Loads the dynamic-class safelist used by analyze.py and prune.py from a
+versioned JSON file (safelist.json next to this module by default), so both
+tools apply exactly the same patterns.
+
+Patterns are deduplicated and compiled into one SafelistMatcher. Given a
+cache directory (--safelist-cache), the compiled tiers are cached there
+keyed by the file's content hash, so the patterns are only classified again
+after the file changes. Without one nothing is written, e.g. in Bazel
+actions, which must not write outside their outputs.
+"""
+
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+
+
+SAFELIST_FILE = Path(__file__).with_name('safelist.json')
+FORMAT_VERSION = 1
+# Bump when the cached (compiled) form changes
+CACHE_VERSION = 1
+
+_EXACT_PATTERN = re.compile(r'\^?([A-Za-z0-9_-]+)\$')
+_PREFIX_PATTERN = re.compile(r'\^?([A-Za-z0-9_-]+)(?:\.\*)?')
+
+
+class SafelistMatcher:
+    """
+    Precompiled safelist engine.
+
+    Patterns are split once into three tiers so each lookup is a single pass:
+    exact names go into a frozenset, literal prefixes into a character trie,
+    and anything else is merged into one alternation regex. Results are cached
+    per token, since the same class names repeat across thousands of selectors.
+    """
+
+    def __init__(self, patterns):
+        exact = set()
+        prefixes = set()
+        residual = []
+
+        for pattern in patterns:
+            match = _EXACT_PATTERN.fullmatch(pattern)
+            if match:
+                exact.add(match.group(1))
+                continue
+            # re.match only anchors at the start, so a pattern without a
+            # trailing $ is a prefix match
+            match = _PREFIX_PATTERN.fullmatch(pattern)
+            if match:
+                prefixes.add(match.group(1))
+                continue
+            residual.append(pattern)
+
+        self._init_tiers(patterns, exact, prefixes, residual)
+
+    def _init_tiers(self, patterns, exact, prefixes, residual):
+        self.patterns = list(patterns)
+        self._exact = frozenset(exact)
+        self._prefixes = sorted(prefixes)
+        self._residual_patterns = list(residual)
+        self._prefix_trie = {}
+        for prefix in self._prefixes:
+            self._add_prefix(prefix)
+        self._residual = (
+            re.compile('|'.join(f'(?:{p})' for p in residual)) if residual else None
+        )
+        self._cache = {}
+
+    def _add_prefix(self, prefix):
+        node = self._prefix_trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        # Empty-string key marks the end of a prefix
+        node[''] = True
+
+    def _has_prefix(self, name):
+        node = self._prefix_trie
+        for char in name:
+            if '' in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return '' in node
+
+    def matches(self, name):
+        """Check if a bare class/ID name is safelisted."""
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+
+        result = (
+            name in self._exact
+            or self._has_prefix(name)
+            or (self._residual is not None and self._residual.match(name) is not None)
+        )
+        self._cache[name] = result
+        return result
+
+    def to_dict(self):
+        """Compiled tiers, for caching with from_dict()."""
+        return {
+            'patterns': self.patterns,
+            'exact': sorted(self._exact),
+            'prefixes': self._prefixes,
+            'residual': self._residual_patterns,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        matcher = cls.__new__(cls)
+        matcher._init_tiers(data['patterns'], data['exact'], data['prefixes'], data['residual'])
+        return matcher
+
+
+def compile_safelist(safelist_patterns):
+    """Return a SafelistMatcher for a list of patterns (or pass one through)."""
+    if isinstance(safelist_patterns, SafelistMatcher):
+        return safelist_patterns
+    return SafelistMatcher(safelist_patterns)
+
+
+def read_patterns(path=SAFELIST_FILE):
+    """
+    Read the patterns of a safelist file, in file order without duplicates.
+
+    The file is a JSON object {"version": 1, "groups": {name: [pattern, ...]}};
+    groups only organize the file and are flattened here.
+    """
+    data = json.loads(Path(path).read_text(encoding='utf-8'))
+    if data.get('version') != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported safelist version in {path}: {data.get('version')!r} "
+            f"(expected {FORMAT_VERSION})"
+        )
+    patterns = []
+    for group in data['groups'].values():
+        patterns.extend(group)
+    return list(dict.fromkeys(patterns))
+
+
+def load_safelist(path=SAFELIST_FILE, cache_dir=None):
+    """
+    Load a safelist file as a SafelistMatcher.
+
+    Args:
+        path: Safelist JSON file
+        cache_dir: Optional directory for compiled safelists; an unwritable
+            cache is ignored, and without one the file is compiled every time
+
+    Returns:
+        SafelistMatcher with the file's deduplicated patterns
+    """
+    if cache_dir is None:
+        return SafelistMatcher(read_patterns(path))
+
+    raw = Path(path).read_bytes()
+    digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+    cache_file = Path(cache_dir) / f"safelist.{digest}.json"
+
+    try:
+        cached = json.loads(cache_file.read_text(encoding='utf-8'))
+        if cached.get('version') == CACHE_VERSION:
+            return SafelistMatcher.from_dict(cached['matcher'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    matcher = SafelistMatcher(read_patterns(path))
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        tmp_file.write_text(
+            json.dumps({'version': CACHE_VERSION, 'matcher': matcher.to_dict()}),
+            encoding='utf-8',
+        )
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+    return matcher
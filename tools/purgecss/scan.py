@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Site Scanning
+
+Shared file discovery and token collection for analyze.py and prune.py.
+Files can be split across a process pool; each worker builds local token
+sets and the results are merged with a set-union reduce, so the output is
+identical to a serial scan.
+"""
+
+import os
+import sys
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Chunks per worker; more than one so a few large files don't stall a worker
+CHUNKS_PER_JOB = 4
+
+
+def resolve_jobs(jobs):
+    """Map a --jobs value to a worker count (0 or less means one per CPU)."""
+    if jobs is None or jobs < 1:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def find_site_files(site_dir, patterns):
+    """Return all files under site_dir matching any glob pattern, sorted."""
+    site_path = Path(site_dir)
+    files = set()
+    for pattern in patterns:
+        files.update(site_path.rglob(pattern))
+    return sorted(files)
+
+
+def _merge(target, result):
+    for merged, tokens in zip(target, result):
+        merged.update(tokens)
+
+
+def _scan_chunk(extract, paths):
+    """Run extract over each file, merging its token sets locally."""
+    merged = None
+    for path in paths:
+        try:
+            result = extract(path)
+        except Exception as e:
+            print(f"Warning: Could not read {path}: {e}", file=sys.stderr)
+            continue
+        if merged is None:
+            merged = tuple(set() for _ in result)
+        _merge(merged, result)
+    return merged
+
+
+def _extract_chunk(extract, paths):
+    """Run extract over each file, keeping the results per file."""
+    results = []
+    for path in paths:
+        try:
+            results.append((path, extract(path)))
+        except Exception as e:
+            print(f"Warning: Could not read {path}: {e}", file=sys.stderr)
+    return results
+
+
+def _chunk(paths, jobs):
+    chunk_count = jobs * CHUNKS_PER_JOB
+    chunks = [paths[i::chunk_count] for i in range(chunk_count)]
+    return [chunk for chunk in chunks if chunk]
+
+
+def extract_each(paths, extract, jobs=1):
+    """
+    Yield (path, token sets) for each readable file.
+
+    Like scan_files, but keeps per-file results (e.g. for the token index).
+    """
+    paths = list(paths)
+    jobs = min(resolve_jobs(jobs), len(paths)) if paths else 1
+
+    if jobs <= 1:
+        yield from _extract_chunk(extract, paths)
+        return
+
+    chunks = _chunk(paths, jobs)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for results in pool.map(_extract_chunk, [extract] * len(chunks), chunks):
+            yield from results
+
+
+def scan_files(paths, extract, jobs=1):
+    """
+    Collect tokens from files.
+
+    Args:
+        paths: Files to scan
+        extract: Module-level function taking a Path and returning a tuple of
+            token sets (it must be picklable to run in worker processes)
+        jobs: Number of worker processes; 1 scans serially in this process
+
+    Returns:
+        Tuple of merged token sets, or None if no file could be read
+    """
+    paths = list(paths)
+    jobs = min(resolve_jobs(jobs), len(paths)) if paths else 1
+
+    if jobs <= 1:
+        return _scan_chunk(extract, paths)
+
+    chunks = _chunk(paths, jobs)
+    merged = None
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for result in pool.map(_scan_chunk, [extract] * len(chunks), chunks):
+            if result is None:
+                continue
+            if merged is None:
+                merged = tuple(set() for _ in result)
+            _merge(merged, result)
+    return merged
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Persistent Token Index
+
+SQLite-backed cache of the token sets extracted from each site file, keyed
+by path and content hash. Rescans only re-tokenize files whose content
+changed; unchanged files reuse their cached tokens.
+
+The index also keeps file -> token postings (with a token -> file reverse
+index) and per-token file counts, so the merged token set for a whole site
+is read back without touching the postings of unchanged files.
+"""
+
+import hashlib
+import sqlite3
+from pathlib import Path
+
+from scan import extract_each
+
+
+SCHEMA_VERSION = '1'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    path TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    UNIQUE (namespace, path)
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    id INTEGER PRIMARY KEY,
+    token TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS postings (
+    file_id INTEGER NOT NULL,
+    field INTEGER NOT NULL,
+    token_id INTEGER NOT NULL,
+    PRIMARY KEY (file_id, field, token_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_token ON postings (token_id, field);
+CREATE TABLE IF NOT EXISTS token_counts (
+    namespace TEXT NOT NULL,
+    field INTEGER NOT NULL,
+    token_id INTEGER NOT NULL,
+    file_count INTEGER NOT NULL,
+    PRIMARY KEY (namespace, field, token_id)
+) WITHOUT ROWID;
+"""
+
+
+# Read size for hashing, so large bundles are never loaded whole
+DIGEST_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path):
+    """Content hash used to detect changed files."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TokenIndex:
+    """
+    On-disk token index.
+
+    Entries are grouped by namespace, one per extractor (e.g.
+    'prune.extract_tokens/v1'); bump the namespace version when an extractor
+    changes so stale token sets are not reused.
+    """
+
+    def __init__(self, index_path):
+        self.path = Path(index_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.execute('PRAGMA journal_mode = WAL')
+        self._db.execute('PRAGMA synchronous = NORMAL')
+
+        version = None
+        try:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            version = row[0] if row else None
+        except sqlite3.OperationalError:
+            pass
+        if version not in (None, SCHEMA_VERSION):
+            self._reset()
+
+        self._db.executescript(SCHEMA)
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema', ?)", (SCHEMA_VERSION,)
+        )
+        self._db.commit()
+
+    def _reset(self):
+        for table in ('meta', 'files', 'tokens', 'postings', 'token_counts'):
+            self._db.execute(f'DROP TABLE IF EXISTS {table}')
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _remove_file(self, file_id, namespace):
+        db = self._db
+        db.execute(
+            """
+            UPDATE token_counts SET file_count = file_count - 1
+            WHERE namespace = ? AND (field, token_id) IN (
+                SELECT field, token_id FROM postings WHERE file_id = ?
+            )
+            """,
+            (namespace, file_id),
+        )
+        db.execute('DELETE FROM postings WHERE file_id = ?', (file_id,))
+        db.execute('DELETE FROM files WHERE id = ?', (file_id,))
+
+    def _add_file(self, namespace, path, digest, result):
+        db = self._db
+        file_id = db.execute(
+            'INSERT INTO files (namespace, path, digest) VALUES (?, ?, ?)',
+            (namespace, path, digest),
+        ).lastrowid
+        for field, tokens in enumerate(result):
+            db.executemany(
+                'INSERT OR IGNORE INTO tokens (token) VALUES (?)',
+                ((token,) for token in tokens),
+            )
+            db.executemany(
+                'INSERT INTO postings (file_id, field, token_id) '
+                'SELECT ?, ?, id FROM tokens WHERE token = ?',
+                ((file_id, field, token) for token in tokens),
+            )
+        db.execute(
+            """
+            INSERT INTO token_counts (namespace, field, token_id, file_count)
+            SELECT ?, field, token_id, 1 FROM postings WHERE file_id = ?
+            ON CONFLICT (namespace, field, token_id)
+            DO UPDATE SET file_count = file_count + 1
+            """,
+            (namespace, file_id),
+        )
+
+    def scan(self, root, paths, extract, namespace, fields=1, jobs=1):
+        """
+        Incrementally collect tokens for files under root.
+
+        Args:
+            root: Site directory; paths are stored relative to it
+            paths: Files to scan
+            extract: Extractor as accepted by scan.scan_files
+            namespace: Index namespace for this extractor
+            fields: Number of token sets extract returns
+            jobs: Worker processes for re-tokenizing changed files
+
+        Returns:
+            (merged token sets, stats dict with reused/rescanned/removed counts)
+        """
+        root = Path(root)
+        db = self._db
+        known = {
+            path: (file_id, digest)
+            for file_id, path, digest in db.execute(
+                'SELECT id, path, digest FROM files WHERE namespace = ?', (namespace,)
+            )
+        }
+
+        changed = []
+        seen = set()
+        for path in paths:
+            key = path.relative_to(root).as_posix()
+            seen.add(key)
+            try:
+                digest = file_digest(path)
+            except OSError:
+                # Left to the extractor to report
+                digest = None
+            entry = known.get(key)
+            if entry is None or entry[1] != digest:
+                changed.append((path, key, digest))
+
+        stats = {
+            'reused': len(seen) - len(changed),
+            'rescanned': len(changed),
+            'removed': 0,
+        }
+
+        with db:
+            for key, (file_id, _) in known.items():
+                if key not in seen:
+                    self._remove_file(file_id, namespace)
+                    stats['removed'] += 1
+
+            by_path = {path: (key, digest) for path, key, digest in changed}
+            for key, digest in by_path.values():
+                if key in known:
+                    self._remove_file(known[key][0], namespace)
+
+            for path, result in extract_each([path for path, _, _ in changed], extract, jobs):
+                key, digest = by_path[path]
+                if digest is None:
+                    continue
+                self._add_file(namespace, key, digest, result)
+
+            if stats['removed'] or stats['rescanned']:
+                db.execute('DELETE FROM token_counts WHERE file_count <= 0')
+                db.execute(
+                    'DELETE FROM tokens WHERE id NOT IN (SELECT token_id FROM postings)'
+                )
+
+        merged = self._merged_tokens(namespace, fields)
+        return merged, stats
+
+    def _merged_tokens(self, namespace, fields):
+        merged = tuple(set() for _ in range(fields))
+        for field, token in self._db.execute(
+            """
+            SELECT c.field, t.token FROM token_counts c
+            JOIN tokens t ON t.id = c.token_id
+            WHERE c.namespace = ? AND c.field < ?
+            """,
+            (namespace, fields),
+        ):
+            merged[field].add(token)
+        return merged
+
+    def tokens_in_file(self, path, namespace, field=0):
+        """File -> tokens mapping for an indexed (site-relative) path."""
+        return {
+            token for (token,) in self._db.execute(
+                """
+                SELECT t.token FROM files f
+                JOIN postings p ON p.file_id = f.id
+                JOIN tokens t ON t.id = p.token_id
+                WHERE f.namespace = ? AND f.path = ? AND p.field = ?
+                """,
+                (namespace, str(path), field),
+            )
+        }
+
+    def tokens_by_file(self, namespace, field=0):
+        """File -> tokens mapping for every indexed file in a namespace."""
+        files = {}
+        for path, token in self._db.execute(
+            """
+            SELECT f.path, t.token FROM files f
+            JOIN postings p ON p.file_id = f.id
+            JOIN tokens t ON t.id = p.token_id
+            WHERE f.namespace = ? AND p.field = ?
+            """,
+            (namespace, field),
+        ):
+            files.setdefault(path, set()).add(token)
+        return files
+
+    def files_with_token(self, token, namespace, field=0):
+        """Token -> files reverse mapping, as site-relative paths."""
+        return sorted(
+            path for (path,) in self._db.execute(
+                """
+                SELECT f.path FROM tokens t
+                JOIN postings p ON p.token_id = t.id
+                JOIN files f ON f.id = p.file_id
+                WHERE t.token = ? AND p.field = ? AND f.namespace = ?
+                """,
+                (token, field, namespace),
+            )
+        )
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Site Usage
+
+Token collection and selector matching shared by prune.py and analyze.py,
+so both make the same keep/drop decision for every rule:
+
+- tokens: each class/ID a selector names appears somewhere in the site's
+  HTML or JS, or is safelisted
+- dom: additionally, each compound of the selector matches an element on
+  one page (see dom_index.py); classes that scripts (JS files or inline
+  <script>s) may add and safelisted classes can be on any element
+"""
+
+import os
+import re
+import mmap
+
+from scan import find_site_files, scan_files
+
+
+MATCH_MODES = ('tokens', 'dom')
+
+
+# Broad match for any potential selector name (User provided nuanced regex)
+# Matches tokens that don't end in a colon (to avoid CSS properties/JS keys)
+TOKEN_PATTERN = re.compile(r'[^<>"\'`\s]*[^<>"\'`\s:]')
+TOKEN_BYTES_PATTERN = re.compile(rb'[^<>"\'`\s]*[^<>"\'`\s:]')
+TOKEN_DELIMITER_BYTES_PATTERN = re.compile(rb'[<>"\'`\s]')
+
+# Inline <script> bodies; external ones (src=...) have an empty body
+INLINE_SCRIPT_PATTERN = re.compile(
+    r'<script\b[^>]*>(.*?)</script\s*>', re.IGNORECASE | re.DOTALL
+)
+
+# Bytes scanned per window in extract_file_tokens
+SCAN_WINDOW_SIZE = 4 << 20
+
+
+def extract_tokens(content):
+    """Extract all potential class/id tokens from content using broad regex."""
+    return set(TOKEN_PATTERN.findall(content))
+
+
+def extract_file_tokens(file_path):
+    """
+    Extract tokens from a file without decoding it.
+
+    The file is memory-mapped and scanned window by window with the bytes
+    pattern; scanned pages are released and only distinct matches are
+    decoded, so memory stays flat for large JS bundles. Gives the same
+    result as extract_tokens(read_text()) for UTF-8 input.
+    """
+    raw_tokens = set()
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return set()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            pos = 0
+            while pos < size:
+                # End each window on a delimiter so no token spans two windows
+                end = min(pos + SCAN_WINDOW_SIZE, size)
+                if end < size:
+                    delimiter = TOKEN_DELIMITER_BYTES_PATTERN.search(data, end)
+                    end = delimiter.start() if delimiter else size
+                raw_tokens.update(TOKEN_BYTES_PATTERN.findall(data, pos, end))
+                # Drop the scanned pages from this process's resident set
+                page_start = pos - pos % mmap.PAGESIZE
+                page_end = end - end % mmap.PAGESIZE
+                if page_end > page_start:
+                    data.madvise(mmap.MADV_DONTNEED, page_start, page_end - page_start)
+                pos = end
+
+    tokens = set()
+    for raw in raw_tokens:
+        # Delimiters are all ASCII, so a match never splits a UTF-8 sequence
+        # and strict decoding rejects the same files read_text() would
+        token = raw.decode('utf-8')
+        if token.isascii() and token.isprintable():
+            tokens.add(token)
+        else:
+            # Unicode (and ASCII control) whitespace only splits str tokens
+            tokens.update(TOKEN_PATTERN.findall(token))
+    return tokens
+
+
+# Token index namespace; bump when extract_tokens changes
+TOKEN_NAMESPACE = 'prune.extract_tokens/v1'
+
+
+def scan_token_file(file_path):
+    """Tokenize one HTML/JS file (process pool worker entry point)."""
+    return (extract_file_tokens(file_path),)
+
+
+def collect_used_selectors(site_dir, jobs=1, token_index=None):
+    """
+    Scan site HTML and JS to collect all used classes and IDs.
+
+    jobs > 1 splits the files across a process pool (0 means one worker per
+    CPU); the result is identical to a serial scan. With a TokenIndex, only
+    files whose content changed since the last run are re-tokenized.
+    """
+    # Scan both HTML and JS files
+    files = find_site_files(site_dir, ['*.html', '*.js'])
+    if token_index is not None:
+        result, index_stats = token_index.scan(site_dir, files, scan_token_file, TOKEN_NAMESPACE, jobs=jobs)
+        print(
+            f"Token index: {index_stats['reused']} files reused, "
+            f"{index_stats['rescanned']} rescanned, {index_stats['removed']} removed"
+        )
+    else:
+        result = scan_files(files, scan_token_file, jobs)
+    tokens = result[0] if result else set()
+
+    # Add all tokens to both classes and IDs sets
+    # This is the "nuanced" approach: treat every token as potentially both
+    return tokens, set(tokens)
+
+
+def scan_script_file(file_path):
+    """
+    Tokenize the scripts in one file (process pool worker entry point).
+
+    JS files are tokenized whole; for HTML pages only the bodies of inline
+    <script> elements are.
+    """
+    if file_path.suffix != '.html':
+        return scan_token_file(file_path)
+    html = file_path.read_text(encoding='utf-8')
+    tokens = set()
+    for script in INLINE_SCRIPT_PATTERN.findall(html):
+        tokens.update(extract_tokens(script))
+    return (tokens,)
+
+
+def collect_script_tokens(site_dir, jobs=1):
+    """
+    Tokens in the site's JS files and inline scripts: classes scripts may
+    add to any element.
+    """
+    files = find_site_files(site_dir, ['*.js', '*.html'])
+    result = scan_files(files, scan_script_file, jobs)
+    return result[0] if result else set()
+
+
+def dom_selector_matches(dom_index, script_tokens, safelist):
+    """
+    --match dom's whole-selector check, for RuleIndex.evaluate's selector_matches.
+
+    Script tokens and safelisted names count as present on every element.
+    """
+    return dom_index.matcher(lambda name: name in script_tokens or safelist.matches(name))